@@ -0,0 +1,377 @@
+"""
+Benchmarks of stashy against a local stub Bitbucket server.
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --compare results.json --output new.json
+
+Each benchmark runs --repeat times and reports its best run. Results are saved as JSON
+with the environment they were measured in; --compare prints the change against an earlier
+results file and exits with status 1 if any benchmark regressed by more than --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stashy  # noqa: E402
+from stashy.pullrequestdiffs import PullRequestDiff  # noqa: E402
+
+from stub import Dataset, StubServer, diff  # noqa: E402
+
+BENCHMARKS = []
+
+
+def benchmark(name, unit, higher_is_better=True, repeat=True):
+    """
+    Register fn(context) as a benchmark. fn returns the measured value, or a dict of them keyed
+    by variant.
+    """
+    def register(fn):
+        BENCHMARKS.append((name, unit, higher_is_better, repeat, fn))
+        return fn
+    return register
+
+
+class Context(object):
+    def __init__(self, server, dataset):
+        self.server = server
+        self.dataset = dataset
+
+    def stash(self, **options):
+        return stashy.connect(self.server.url, **options)
+
+    def repo(self, stash=None):
+        return (stash or self.stash()).projects['PRJ'].repos['repo']
+
+
+def rate(count, fn):
+    started = time.perf_counter()
+    n = fn()
+    elapsed = time.perf_counter() - started
+    return (n if n is not None else count) / elapsed
+
+
+PAGING_VARIANTS = [
+    ('default', {}),
+    ('limit=1000', {'limit': 1000}),
+    ('limit=1000,prefetch=2', {'limit': 1000, 'prefetch': 2}),
+    ('limit=500,workers=4', {'limit': 500, 'workers': 4}),
+    ('limit=1000,stream', {'limit': 1000, 'stream': True}),
+]
+
+
+@benchmark('paginate', 'items/s')
+def paginate(ctx):
+    stash = ctx.stash()
+    repos = stash.projects['PRJ'].repos
+    results = {}
+    for variant, paging in PAGING_VARIANTS:
+        results[variant] = rate(ctx.dataset.repos, lambda: sum(1 for _ in repos.all(**paging)))
+    return results
+
+
+@benchmark('repository.commits', 'items/s')
+def commits(ctx):
+    repo = ctx.repo()
+    return {
+        'default': rate(ctx.dataset.commits, lambda: sum(1 for _ in repo.commits('master'))),
+        'limit=1000': rate(ctx.dataset.commits, lambda: sum(1 for _ in repo.commits('master', limit=1000))),
+    }
+
+
+@benchmark('repository.files', 'items/s')
+def files(ctx):
+    repo = ctx.repo()
+    return {
+        'default': rate(ctx.dataset.files, lambda: sum(1 for _ in repo.files())),
+        'limit=1000': rate(ctx.dataset.files, lambda: sum(1 for _ in repo.files(limit=1000))),
+    }
+
+
+@benchmark('pull_request.diff', 'diffs/s')
+def pull_request_diff(ctx):
+    stash = ctx.stash()
+    pull_request = ctx.repo(stash).pull_requests[1]
+    data = diff(ctx.dataset.diff_files, ctx.dataset.diff_lines)
+    url = pull_request.url('/diff')
+
+    def build(n):
+        for _ in range(n):
+            PullRequestDiff(url, stash._client, pull_request, data)
+        return n
+
+    def fetch(n):
+        for _ in range(n):
+            pull_request.diff()
+        return n
+
+    def stream(n):
+        for _ in range(n):
+            for _ in pull_request.lazy_diff():
+                pass
+        return n
+
+    def two_files(n):
+        for _ in range(n):
+            diff = pull_request.lazy_diff()
+            diff.files([change for change, _ in zip(diff.changes(), range(2))])
+        return n
+
+    return {
+        'fetch and build': rate(None, lambda: fetch(5)),
+        'lazy, streamed': rate(None, lambda: stream(5)),
+        'lazy, changes and 2 files': rate(None, lambda: two_files(20)),
+        'build': rate(None, lambda: build(20)),
+    }
+
+
+@benchmark('diff stats', 'diffs/s')
+def diff_stats(ctx):
+    stash = ctx.stash()
+    repo = ctx.repo(stash)
+    pull_request = repo.pull_requests[1]
+
+    def counted(n, fn):
+        for _ in range(n):
+            fn()
+        return n
+
+    return {
+        'pull_request.diff().stats': rate(None, lambda: counted(5, lambda: pull_request.diff().stats)),
+        'pull_request.diff_stats()': rate(None, lambda: counted(5, pull_request.diff_stats)),
+        'repository.diff,stats_only': rate(None, lambda: counted(5, lambda: repo.diff('a', 'b', stats_only=True))),
+    }
+
+
+@benchmark('repository.raw', 'MB/s')
+def raw(ctx):
+    raw_file = ctx.repo().raw('assets/big.bin', at='master')
+    megabytes = ctx.dataset.raw_bytes / 1e6
+    target = os.path.join(tempfile.gettempdir(), 'stashy-benchmark-raw')
+    try:
+        return {
+            'save to path': rate(megabytes, lambda: raw_file.save(target) and None),
+            'chunks': rate(megabytes, lambda: sum(1 for _ in raw_file.chunks()) and None),
+            'read 1MB range': rate(1, lambda: len(raw_file.read(1000000, 2000000)) / 1e6),
+        }
+    finally:
+        os.remove(target)
+
+
+@benchmark('repository.archive', 'MB/s')
+def archive(ctx):
+    repo = ctx.repo()
+    megabytes = ctx.dataset.raw_bytes / 1e6
+    target = os.path.join(tempfile.gettempdir(), 'stashy-benchmark-archive.zip')
+
+    half = repo.raw('big.bin').read(end=ctx.dataset.raw_bytes // 2)
+
+    def resumed():
+        # as if an earlier download had been interrupted halfway
+        with open(target + '.part', 'wb') as f:
+            f.write(half)
+        repo.archive(at='master', path=target, size=ctx.dataset.raw_bytes)
+
+    try:
+        return {
+            'save': rate(megabytes, lambda: repo.archive(at='master', path=target) and None),
+            'resume half': rate(megabytes / 2, resumed),
+        }
+    finally:
+        os.remove(target)
+
+
+@benchmark('navigation', 'resources/s')
+def navigation(ctx):
+    stash = ctx.stash()
+    repo = ctx.repo(stash)
+    n = 20000
+
+    def navigate():
+        for i in range(n):
+            stash.projects['PRJ'].repos['repo-%d' % (i % 100)].pull_requests[i].get
+        return n
+
+    def from_repository():
+        for i in range(n):
+            repo.pull_requests[i].get
+        return n
+
+    return {
+        'from stash': rate(n, navigate),
+        'from repository': rate(n, from_repository),
+    }
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def retained_memory(fn):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = fn()
+        retained = tracemalloc.get_traced_memory()[0] - before
+        del kept
+        return retained
+    finally:
+        tracemalloc.stop()
+
+
+@benchmark('diff memory per file', 'bytes', higher_is_better=False, repeat=False)
+def diff_memory(ctx):
+    stash = ctx.stash()
+    pull_request = ctx.repo(stash).pull_requests[1]
+    url = pull_request.url('/diff')
+    files = ctx.dataset.diff_files
+    data = diff(files, ctx.dataset.diff_lines)
+    body = json.dumps(data)
+    return {
+        'objects': retained_memory(lambda: PullRequestDiff(url, stash._client, pull_request, data)) / files,
+        'objects and JSON': retained_memory(
+            lambda: PullRequestDiff(url, stash._client, pull_request, json.loads(body))) / files,
+    }
+
+
+def save_archive(repo):
+    target = os.path.join(tempfile.gettempdir(), 'stashy-benchmark-peak.zip')
+    try:
+        repo.archive(path=target)
+    finally:
+        os.remove(target)
+
+
+@benchmark('peak memory', 'bytes', higher_is_better=False, repeat=False)
+def memory(ctx):
+    stash = ctx.stash()
+    repos = stash.projects['PRJ'].repos
+    pull_request = ctx.repo(stash).pull_requests[1]
+    return {
+        'repos.list': peak_memory(lambda: repos.list(limit=1000)),
+        'repos.all,stream': peak_memory(lambda: sum(1 for _ in repos.all(limit=1000, stream=True))),
+        'pull_request.diff': peak_memory(lambda: pull_request.diff()),
+        'pull_request.lazy_diff,streamed': peak_memory(lambda: sum(1 for _ in pull_request.lazy_diff())),
+        'pull_request.diff_stats': peak_memory(lambda: pull_request.diff_stats()),
+        'repository.raw,save': peak_memory(lambda: ctx.repo(stash).raw('big.bin').save(os.devnull)),
+        'repository.archive,save': peak_memory(lambda: save_archive(ctx.repo(stash))),
+        '10000 pull request handles': peak_memory(lambda: [pull_request._parent[i] for i in range(10000)]),
+    }
+
+
+def run(names=None, repeat=5, scale=1.0):
+    dataset = Dataset().scaled(scale)
+    results = {}
+    with StubServer(dataset) as server:
+        ctx = Context(server, dataset)
+        # the first requests pay for connecting and for the server encoding its pages
+        for variant, paging in PAGING_VARIANTS[:2]:
+            sum(1 for _ in ctx.stash().projects['PRJ'].repos.all(**paging))
+
+        for name, unit, higher_is_better, repeatable, fn in BENCHMARKS:
+            if names and name not in names:
+                continue
+            runs = [fn(ctx) for _ in range(repeat if repeatable else 1)]
+            if not isinstance(runs[0], dict):
+                runs = [{'': value} for value in runs]
+            for variant in runs[0]:
+                values = [r[variant] for r in runs]
+                key = '%s [%s]' % (name, variant) if variant else name
+                results[key] = {
+                    'value': max(values) if higher_is_better else min(values),
+                    'median': statistics.median(values),
+                    'unit': unit,
+                    'higher_is_better': higher_is_better,
+                }
+                print('%-45s %14s %s' % (key, _format(results[key]['value']), unit))
+    return results
+
+
+def environment():
+    try:
+        revision = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                           cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    try:
+        import orjson  # noqa: F401
+        codec = 'orjson'
+    except ImportError:
+        codec = 'json'
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'revision': revision,
+        'codec': codec,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def _format(value):
+    return '{:,.0f}'.format(value) if value >= 100 else '{:,.2f}'.format(value)
+
+
+def compare(old, new, threshold):
+    """
+    Print the change of each benchmark present in both results, returning the names of those
+    that got worse by more than threshold (a fraction).
+    """
+    regressions = []
+    print('\n%-45s %14s %14s %8s' % ('benchmark', 'before', 'after', 'change'))
+    for key, result in new.items():
+        before = old.get(key)
+        if before is None or not before['value']:
+            continue
+        change = result['value'] / before['value'] - 1
+        worse = -change if result['higher_is_better'] else change
+        flag = ''
+        if worse > threshold:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print('%-45s %14s %14s %+7.1f%%%s' % (key, _format(before['value']), _format(result['value']),
+                                             change * 100, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('names', nargs='*', help='benchmarks to run, all by default')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply the size of the synthetic data')
+    parser.add_argument('--output', help='save the results to this JSON file')
+    parser.add_argument('--compare', help='compare with the results saved in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='relative change counted as a regression by --compare (default 0.15)')
+    args = parser.parse_args(argv)
+
+    results = run(args.names, args.repeat, args.scale)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'scale': args.scale, 'results': results}, f, indent=2,
+                      sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        if old.get('scale') != args.scale:
+            print('warning: comparing runs with different --scale')
+        if compare(old['results'], results, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
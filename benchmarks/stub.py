@@ -0,0 +1,243 @@
+"""
+An in-process HTTP server imitating the parts of the Bitbucket Server REST API the
+benchmarks use, serving deterministic synthetic data.
+
+Pages honour start and limit (capped at 1000, as Bitbucket does) and are encoded once and
+kept, so that the server's own cost stays small and constant between runs. Single byte
+ranges are honoured for every response.
+"""
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+MAX_LIMIT = 1000
+DEFAULT_LIMIT = 25
+
+
+class Dataset(object):
+    """
+    The sizes of the synthetic collections.
+    """
+    def __init__(self, projects=50, repos=5000, commits=10000, files=10000, diff_files=200, diff_lines=200,
+                 raw_bytes=32 * 1024 * 1024):
+        self.projects = projects
+        self.repos = repos
+        self.commits = commits
+        self.files = files
+        self.diff_files = diff_files
+        self.diff_lines = diff_lines
+        self.raw_bytes = raw_bytes
+
+    def scaled(self, factor):
+        return Dataset(*[max(1, int(n * factor)) for n in (self.projects, self.repos, self.commits, self.files,
+                                                            self.diff_files, self.diff_lines, self.raw_bytes)])
+
+
+def _hash(n):
+    return ('%040x' % (n * 2654435761 % (1 << 160)))[-40:]
+
+
+def project(n):
+    return {'key': 'PRJ%d' % n, 'id': n, 'name': 'Project %d' % n, 'public': False, 'type': 'NORMAL',
+            'links': {'self': [{'href': 'http://stash.example.com/projects/PRJ%d' % n}]}}
+
+
+def repo(n):
+    slug = 'repo-%d' % n
+    return {'slug': slug, 'id': n, 'name': slug, 'scmId': 'git', 'state': 'AVAILABLE', 'forkable': True,
+            'public': False, 'project': project(n % 50),
+            'links': {'clone': [{'href': 'ssh://git@stash.example.com:7999/prj/%s.git' % slug, 'name': 'ssh'},
+                                {'href': 'http://stash.example.com/scm/prj/%s.git' % slug, 'name': 'http'}],
+                      'self': [{'href': 'http://stash.example.com/projects/PRJ/repos/%s/browse' % slug}]}}
+
+
+def commit(n):
+    author = {'name': 'user%d' % (n % 37), 'emailAddress': 'user%d@example.com' % (n % 37)}
+    return {'id': _hash(n), 'displayId': _hash(n)[:11], 'author': author, 'authorTimestamp': 1500000000000 + n,
+            'committer': author, 'committerTimestamp': 1500000000000 + n,
+            'message': 'Change %d\n\nA longer description of the change number %d.' % (n, n),
+            'parents': [{'id': _hash(n + 1), 'displayId': _hash(n + 1)[:11]}]}
+
+
+def file_path(n):
+    return 'src/module%d/package%d/file%d.py' % (n % 17, n % 101, n)
+
+
+def _file_info(path):
+    components = path.split('/')
+    name = components[-1]
+    return {'components': components, 'parent': '/'.join(components[:-1]), 'name': name,
+            'extension': name.rsplit('.', 1)[-1], 'toString': path}
+
+
+def pull_request(n):
+    return {'id': n, 'version': 0, 'title': 'Pull request %d' % n, 'state': 'OPEN', 'open': True, 'closed': False,
+            'fromRef': {'id': 'refs/heads/feature-%d' % n, 'latestCommit': _hash(n)},
+            'toRef': {'id': 'refs/heads/master', 'latestCommit': _hash(n + 1)}}
+
+
+def change(n):
+    return {'path': _file_info(file_path(n)), 'type': 'MODIFY', 'nodeType': 'FILE', 'executable': False}
+
+
+def file_diff(path, lines):
+    segments = []
+    line = 1
+    for s in range(max(1, lines // 10)):
+        kind = ('CONTEXT', 'REMOVED', 'ADDED')[s % 3]
+        segment_lines = []
+        for i in range(10):
+            segment_lines.append({'source': line, 'destination': line, 'truncated': False,
+                                  'line': '    value_%d = compute(%d, "%s")  # %s' % (i, line, path, kind.lower())})
+            line += 1
+        segments.append({'type': kind, 'lines': segment_lines, 'truncated': False})
+    hunk = {'sourceLine': 1, 'sourceSpan': line - 1, 'destinationLine': 1, 'destinationSpan': line - 1,
+            'segments': segments, 'truncated': False}
+    return {'source': _file_info(path), 'destination': _file_info(path), 'hunks': [hunk], 'truncated': False}
+
+
+def diff(files, lines, paths=None):
+    """
+    A pull request diff of files changed files, each with one hunk of about lines lines, or
+    of the given paths only.
+    """
+    diffs = [file_diff(path, lines) for path in (paths if paths is not None else map(file_path, range(files)))]
+    return {'fromHash': _hash(1), 'toHash': _hash(2), 'contextLines': 10, 'whitespace': 'SHOW', 'diffs': diffs}
+
+
+def raw_content(size):
+    """
+    size bytes of binary content, the same on every call.
+    """
+    block = bytes(range(256)) * 4096
+    return (block * (size // len(block) + 1))[:size]
+
+
+def _page(make, total, start, limit):
+    end = min(start + limit, total)
+    last = end >= total
+    return {'values': [make(n) for n in range(start, end)], 'size': end - start, 'start': start, 'limit': limit,
+            'isLastPage': last, 'nextPageStart': None if last else end}
+
+
+_RANGE = re.compile(r'^bytes=(\d+)-(\d*)$')
+
+REPO = r'^/rest/api/1\.0/projects/[^/]+/repos/[^/]+'
+
+
+class StubServer(object):
+    """
+    Serves a :class:`Dataset` on an ephemeral localhost port::
+
+        with StubServer(Dataset()) as server:
+            stash = stashy.connect(server.url)
+    """
+    def __init__(self, dataset=None):
+        self.dataset = dataset or Dataset()
+        self.requests = 0
+        self._responses = {}
+        self._lock = threading.Lock()
+        d = self.dataset
+        self._routes = [
+            (re.compile(r'^/rest/api/1\.0/projects$'), lambda m, q: self._paged('projects', project, d.projects, q)),
+            (re.compile(r'^/rest/api/1\.0/projects/[^/]+/repos$'), lambda m, q: self._paged('repos', repo, d.repos, q)),
+            (re.compile(REPO + r'/commits$'), lambda m, q: self._paged('commits', commit, d.commits, q)),
+            (re.compile(REPO + r'/files(/.*)?$'), lambda m, q: self._paged('files', file_path, d.files, q)),
+            (re.compile(REPO + r'/pull-requests/(\d+)/changes$'), lambda m, q: self._paged(
+                'changes', change, d.diff_files, q)),
+            (re.compile(REPO + r'/pull-requests/(\d+)/diff/(.+)$'), lambda m, q: self._cached(
+                ('diff', m.group(2)), lambda: diff(1, d.diff_lines, [unquote(m.group(2))]))),
+            (re.compile(REPO + r'/(pull-requests/(\d+)|compare)/diff$'), lambda m, q: self._cached(('diff',), lambda: diff(
+                d.diff_files, d.diff_lines))),
+            (re.compile(REPO + r'/pull-requests/(\d+)$'), lambda m, q: self._cached(('pr', m.group(1)), lambda: (
+                pull_request(int(m.group(1)))))),
+            (re.compile(REPO + r'/archive$'), lambda m, q: self._cached(('raw',), lambda: raw_content(d.raw_bytes))),
+            (re.compile(REPO + r'/raw/.+$'), lambda m, q: self._cached(('raw',), lambda: raw_content(d.raw_bytes))),
+            (re.compile(REPO + r'$'), lambda m, q: self._cached(('repo',), lambda: repo(0))),
+        ]
+
+    def _cached(self, key, build):
+        with self._lock:
+            body = self._responses.get(key)
+        if body is None:
+            body = build()
+            if not isinstance(body, bytes):
+                body = json.dumps(body).encode('utf-8')
+            with self._lock:
+                self._responses[key] = body
+        return body
+
+    def _paged(self, name, make, total, query):
+        start = int(query.get('start', ['0'])[0])
+        limit = min(int(query.get('limit', [str(DEFAULT_LIMIT)])[0]), MAX_LIMIT)
+        return self._cached((name, start, limit), lambda: _page(make, total, start, limit))
+
+    def handle(self, path, query):
+        for pattern, respond in self._routes:
+            match = pattern.match(path)
+            if match is not None:
+                return respond(match, query)
+        return None
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # headers and body are written separately; don't let Nagle hold back the body
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.requests += 1
+                url = urlparse(self.path)
+                body = stub.handle(url.path, parse_qs(url.query))
+                ranged = _RANGE.match(self.headers.get('Range', ''))
+                if body is None:
+                    body = b'{"errors": [{"message": "Not found"}]}'
+                    self.send_response(404)
+                elif ranged is not None:
+                    start = int(ranged.group(1))
+                    end = min(int(ranged.group(2)) + 1 if ranged.group(2) else len(body), len(body))
+                    if start >= len(body):
+                        self.send_response(416)
+                        self.send_header('Content-Range', 'bytes */%d' % len(body))
+                        body = b''
+                    else:
+                        self.send_response(206)
+                        self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end - 1, len(body)))
+                        body = body[start:end]
+                else:
+                    self.send_response(200)
+                self.send_header('Content-Type', 'application/json;charset=UTF-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(body)
+
+            do_HEAD = do_GET
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d/' % self._server.server_port
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
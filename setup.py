@@ -22,17 +22,17 @@ setup(name='stashy',
       packages=['stashy', 'stashy.admin'],
       test_suite = 'tests',
       #scripts=['bin/stash'],
+      python_requires='>=3.7',
       install_requires=readlines('requirements.txt'),
+      extras_require={'async': ['aiohttp>=3.0'], 'fast': ['orjson']},
       classifiers=[
         'Development Status :: 3 - Alpha',
         'License :: OSI Approved :: Apache Software License',
         'Topic :: Software Development :: Libraries',
-        'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.6',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3 :: Only',
         'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
         ]
      )
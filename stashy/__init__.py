@@ -1,13 +1,16 @@
 __version__ = "0.6"
 
 from .client import Stash
+from .aio import AsyncStash
 
-def connect(url, username=None, password=None, verify=True, requests_auth=None):
+def connect(url, username=None, password=None, verify=True, requests_auth=None, **kw):
     """Connect to a Stash instance given a username and password.
 
     This is only recommended via SSL. If you are using self-signed certificates,
     you can use verify=False to ignore SSL verifcation.
+
+    Any other keyword arguments (e.g. prefetch) are passed through to :class:`stashy.client.Stash`.
     """
-    return Stash(url, username, password, verify=verify, requests_auth=requests_auth)
+    return Stash(url, username, password, verify=verify, requests_auth=requests_auth, **kw)
 
-__all__ = ['connect']
+__all__ = ['connect', 'Stash', 'AsyncStash']
@@ -6,6 +6,7 @@ from ..permissions import Permissions
 
 
 class Admin(ResourceBase):
+    __slots__ = ()
     groups = Nested(Groups)
     users = Nested(Users)
     permissions = Nested(Permissions)
@@ -3,6 +3,8 @@ from ..errors import ok_or_error, response_or_error
 from ..compat import update_doc
 
 class Groups(ResourceBase, FilteredIterableResource):
+    __slots__ = ()
+
     @response_or_error
     def add(self, group):
         """
@@ -31,7 +33,7 @@ class Groups(ResourceBase, FilteredIterableResource):
         """
         return self._client.post(self.url("/remove-user"), dict(context=group, itemName=user))
 
-    def more_members(self, group, filter=None):
+    def more_members(self, group, filter=None, **paging):
         """
         Retrieves a list of users that are members of a specified group.
 
@@ -40,9 +42,9 @@ class Groups(ResourceBase, FilteredIterableResource):
         params = dict(context=group)
         if filter:
             params['filter'] = filter
-        return self.paginate("/more-members", params)
+        return self.paginate("/more-members", params, **paging)
 
-    def more_non_members(self, group, filter=None):
+    def more_non_members(self, group, filter=None, **paging):
         """
         Retrieves a list of users that are not members of a specified group.
 
@@ -51,7 +53,7 @@ class Groups(ResourceBase, FilteredIterableResource):
         params = dict(context=group)
         if filter:
             params['filter'] = filter
-        return self.paginate("/more-non-members", params)
+        return self.paginate("/more-non-members", params, **paging)
 
 
 update_doc(Groups.all, """
@@ -3,6 +3,8 @@ from ..errors import ok_or_error, response_or_error
 from ..compat import update_doc
 
 class Users(ResourceBase, FilteredIterableResource):
+    __slots__ = ()
+
     @response_or_error
     def add(self, name, password, displayName, emailAddress, addToDefaultGroup=True):
         """
@@ -62,7 +64,7 @@ class Users(ResourceBase, FilteredIterableResource):
         """
         return self._client.post(self.url("/remove-group"), dict(context=user, itemName=group))
 
-    def more_members(self, user, filter=None):
+    def more_members(self, user, filter=None, **paging):
         """
         Retrieves a list of groups the specified user is a member of.
 
@@ -71,9 +73,9 @@ class Users(ResourceBase, FilteredIterableResource):
         params = dict(context=user)
         if filter:
             params['filter'] = filter
-        return self.paginate("/more-members", params)
+        return self.paginate("/more-members", params, **paging)
 
-    def more_non_members(self, user, filter=None):
+    def more_non_members(self, user, filter=None, **paging):
         """
         Retrieves a list of groups that the specified user is not a member of
 
@@ -82,7 +84,7 @@ class Users(ResourceBase, FilteredIterableResource):
         params = dict(context=user)
         if filter:
             params['filter'] = filter
-        return self.paginate("/more-non-members", params)
+        return self.paginate("/more-non-members", params, **paging)
 
 
 update_doc(Users.all, """
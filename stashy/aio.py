@@ -0,0 +1,246 @@
+"""
+asyncio support for stashy.
+
+AsyncStash exposes the same resource tree as :class:`stashy.client.Stash`, but every
+request method returns an awaitable and every paginated listing is an async iterator::
+
+    async with AsyncStash("https://stash.example.com", token=TOKEN) as stash:
+        async for repo in stash.projects[PROJECT].repos:
+            print(await stash.projects[PROJECT].repos[repo['slug']].get())
+
+Requires the optional aiohttp package (pip install stashy[async]).
+"""
+import asyncio
+import json
+import time
+
+from .client import Stash, StashClient
+from .helpers import add_json_headers
+from .metrics import RequestEvent, body_size, endpoint_template
+
+
+class AsyncResponse(object):
+    """
+    A fully read HTTP response exposing the subset of requests.Response used by stashy.
+    """
+    def __init__(self, status_code, reason, url, headers, content, encoding=None):
+        self.status_code = status_code
+        self.reason = reason
+        self.url = url
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def _encode_params(params):
+    # aiohttp rejects None and bool values that requests would silently drop or stringify
+    if not params:
+        return params
+    return [(key, str(value) if isinstance(value, bool) else value)
+            for key, value in params.items() if value is not None]
+
+
+def _connect_trace():
+    # reports the time spent opening a connection, or 0 for a reused one, in the request's trace context
+    import aiohttp
+
+    async def on_create_start(session, context, params):
+        context.connect_started = time.monotonic()
+
+    async def on_create_end(session, context, params):
+        if context.trace_request_ctx is not None:
+            context.trace_request_ctx['connect'] = time.monotonic() - context.connect_started
+
+    async def on_reuse(session, context, params):
+        if context.trace_request_ctx is not None:
+            context.trace_request_ctx['connect'] = 0.0
+
+    config = aiohttp.TraceConfig()
+    config.on_connection_create_start.append(on_create_start)
+    config.on_connection_create_end.append(on_create_end)
+    config.on_connection_reuseconn.append(on_reuse)
+    return config
+
+
+class AsyncStash(Stash):
+    def __init__(self, base_url, username=None, password=None, verify=True, token=None, session=None, **options):
+        self._client = AsyncStashClient(base_url, username, password, verify=verify, token=token,
+                                        session=session, **options)
+
+    async def close(self):
+        await self._client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class AsyncStashClient(StashClient):
+
+    is_async = True
+
+    def __init__(self, base_url, username=None, password=None, oauth=None, verify=True, token=None, session=None,
+                 requests_auth=None, limit=100, prefetch=0, workers=0, page_size=None, adaptive_paging=False,
+                 max_page_size=1000, keep_alive=True, retry=None, rate_limit=False, codec=None, metrics=None,
+                 tracer=None):
+        """
+        limit: maximum number of simultaneous connections.
+        keep_alive, retry, rate_limit, codec, metrics, tracer: as for :class:`stashy.client.StashClient`.
+            Connection times are only reported when the client creates its own session.
+        """
+        if oauth is not None or requests_auth is not None:
+            raise ValueError("oauth and requests_auth are not supported by the asyncio client")
+
+        self._setup(base_url, prefetch=prefetch, workers=workers, page_size=page_size,
+                    adaptive_paging=adaptive_paging, max_page_size=max_page_size, retry=retry,
+                    rate_limit=rate_limit, codec=codec, metrics=metrics, tracer=tracer)
+
+        self._verify = verify
+        self._limit = limit
+        self._keep_alive = keep_alive
+        self._auth = None
+        self._headers = {'Content-Type': 'application/json'}
+        if username is not None or password is not None:
+            import aiohttp
+            self._auth = aiohttp.BasicAuth(username, password)
+        elif token is not None:
+            self._headers['Authorization'] = 'Bearer {}'.format(token)
+
+        # aiohttp sessions must be created inside a running event loop, so the default one is built on first use
+        self._aiohttp_session = session
+        self._owns_session = session is None
+
+    @property
+    def _session(self):
+        if self._aiohttp_session is None:
+            import aiohttp
+            kw = dict(limit=self._limit, force_close=not self._keep_alive)
+            if not self._verify:
+                kw['ssl'] = False
+            connector = aiohttp.TCPConnector(**kw)
+            trace_configs = [_connect_trace()] if self.metrics else None
+            self._aiohttp_session = aiohttp.ClientSession(connector=connector, auth=self._auth,
+                                                          headers=self._headers, trace_configs=trace_configs)
+        return self._aiohttp_session
+
+    async def close(self):
+        if self._aiohttp_session is not None and self._owns_session:
+            await self._aiohttp_session.close()
+            self._aiohttp_session = None
+
+    async def connect(self):
+        """
+        Send a HEAD request to the API root to pick up session cookies and open a connection.
+        """
+        return await self.head("")
+
+    async def warm_up(self, connections):
+        """
+        Open up to the given number of connections at once, so that the handshakes are done
+        before a bulk job starts. Returns the number of connections opened successfully.
+        """
+        results = await asyncio.gather(*[self.head("") for _ in range(connections)], return_exceptions=True)
+        return len([r for r in results if not isinstance(r, Exception)])
+
+    async def _request(self, method, resource, data=None, params=None, **kw):
+        if self.tracer is not None:
+            with self.tracer.span('%s %s' % (method, endpoint_template(resource)), url=self.url(resource)) as span:
+                response = await self._measured(method, resource, data, params, kw)
+                span.set(status=response.status_code)
+                return response
+        return await self._measured(method, resource, data, params, kw)
+
+    async def _measured(self, method, resource, data, params, kw):
+        if not self.metrics:
+            return await self._send_retrying(method, resource, data, params, kw)
+
+        event = RequestEvent(method, endpoint_template(resource), self.url(resource), request_bytes=body_size(data))
+        started = time.monotonic()
+        try:
+            response = await self._send_retrying(method, resource, data, params, kw, event)
+        except Exception as e:
+            event.error = e
+            raise
+        else:
+            event.status = response.status_code
+            event.response_bytes = len(response.content)
+        finally:
+            event.total = time.monotonic() - started
+            self._emit(event)
+        return response
+
+    async def _send_retrying(self, method, resource, data, params, kw, event=None):
+        import aiohttp
+        attempt = 0
+        while True:
+            if event is not None:
+                event.retries = attempt
+            if self.rate_limiter is not None:
+                wait = self.rate_limiter.reserve()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            try:
+                response = await self._send(method, resource, data, params, event, **kw)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if self.retry is None or not self.retry.should_retry(method, attempt, error=e):
+                    raise
+                await asyncio.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+
+            if self.rate_limiter is not None:
+                self.rate_limiter.update(response.headers)
+            if self.retry is None or not self.retry.should_retry(method, attempt, response=response):
+                return response
+            await asyncio.sleep(self.retry.delay(attempt, response))
+            attempt += 1
+
+    async def _send(self, method, resource, data=None, params=None, event=None, **kw):
+        if event is not None:
+            timings = kw['trace_request_ctx'] = {}
+            started = time.monotonic()
+        async with self._session.request(method, self.url(resource), data=data,
+                                         params=_encode_params(params), **kw) as response:
+            if event is not None:
+                event.ttfb = time.monotonic() - started
+                event.connect = timings.get('connect')
+            content = await response.read()
+            return AsyncResponse(response.status, response.reason, str(response.url), response.headers, content,
+                                 response.charset)
+
+    async def head(self, resource, **kw):
+        return await self._request('HEAD', resource, **kw)
+
+    async def get(self, resource, **kw):
+        return await self._request('GET', resource, **kw)
+
+    async def post(self, resource, data=None, **kw):
+        if data:
+            kw = add_json_headers(kw)
+            data = self.codec.dumps(data)
+        return await self._request('POST', resource, data, **kw)
+
+    async def put(self, resource, data=None, **kw):
+        if data:
+            kw = add_json_headers(kw)
+            data = self.codec.dumps(data)
+        return await self._request('PUT', resource, data, **kw)
+
+    async def delete(self, resource, data=None, **kw):
+        if data:
+            data = self.codec.dumps(data)
+            kw = add_json_headers(kw)
+        return await self._request('DELETE', resource, data, **kw)
@@ -3,6 +3,8 @@ from .repos import Repository
 from .compat import update_doc
 
 class Repos(ResourceBase, IterableResource):
+  __slots__ = ()
+
   def __getitem__(self, item):
     """
     Return a :class:`Repository` object for operations on a specific repository
@@ -0,0 +1,145 @@
+"""
+Concurrent execution of many independent calls, typically single-item mutators.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Operation(object):
+    """
+    One queued call and, once the batch has run, its outcome.
+    """
+    def __init__(self, fn, args, kw):
+        self.fn = fn
+        self.args = args
+        self.kw = kw
+        self.result = None
+        self.error = None
+        self.done = False
+
+    @property
+    def ok(self):
+        return self.done and self.error is None
+
+    @property
+    def name(self):
+        return getattr(self.fn, '__qualname__', None) or repr(self.fn)
+
+    def __repr__(self):
+        status = 'pending' if not self.done else ('ok' if self.error is None else 'failed: %s' % self.error)
+        return '<Operation %s%r %s>' % (self.name, self.args, status)
+
+    def _run(self):
+        try:
+            self.result = self.fn(*self.args, **self.kw)
+        except Exception as e:
+            self.error = e
+        self.done = True
+
+    async def _arun(self, semaphore):
+        async with semaphore:
+            try:
+                self.result = await self.fn(*self.args, **self.kw)
+            except Exception as e:
+                self.error = e
+            self.done = True
+
+
+class BatchReport(object):
+    """
+    The outcome of every operation of a batch, in the order they were added.
+    """
+    def __init__(self, operations):
+        self.operations = list(operations)
+
+    def __iter__(self):
+        return iter(self.operations)
+
+    def __len__(self):
+        return len(self.operations)
+
+    @property
+    def succeeded(self):
+        return [op for op in self.operations if op.ok]
+
+    @property
+    def failed(self):
+        return [op for op in self.operations if not op.ok]
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    def raise_for_errors(self):
+        """
+        Raise the error of the first failed operation, if any.
+        """
+        for op in self.operations:
+            if op.error is not None:
+                raise op.error
+
+
+class Batch(object):
+    """
+    Queue calls and run them concurrently on up to max_workers threads, collecting a
+    success or failure for each call instead of stopping at the first exception::
+
+        with stash.batch(max_workers=16) as batch:
+            for user in users:
+                batch.add(stash.projects[PROJECT].permissions.users.grant, user, 'PROJECT_READ')
+        print(len(batch.report.failed))
+
+    The queued calls run when the with block exits without an exception, or on run().
+    With the asyncio client, use ``async with`` (or ``await batch.arun()``) instead; then
+    max_workers bounds the number of concurrent requests.
+
+    Keep max_workers within the client's pool_maxsize, or the extra connections are
+    opened and discarded for each request.
+    """
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self.operations = []
+        self.report = None
+
+    def add(self, fn, *args, **kw):
+        """
+        Queue fn(*args, **kw), returning the :class:`Operation` that will hold its outcome.
+        """
+        op = Operation(fn, args, kw)
+        self.operations.append(op)
+        return op
+
+    def run(self):
+        """
+        Run the queued operations and return a :class:`BatchReport` of all of them.
+        """
+        operations, self.operations = self.operations, []
+        if operations:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(operations))) as pool:
+                list(pool.map(Operation._run, operations))
+        self.report = BatchReport(operations)
+        return self.report
+
+    async def arun(self):
+        """
+        Run the queued coroutine functions, at most max_workers at a time.
+        """
+        operations, self.operations = self.operations, []
+        semaphore = asyncio.Semaphore(self.max_workers)
+        await asyncio.gather(*[op._arun(semaphore) for op in operations])
+        self.report = BatchReport(operations)
+        return self.report
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.run()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            await self.arun()
@@ -26,6 +26,8 @@ class RestrictionType(Enum):
 
 
 class Restriction(ResourceBase):
+    __slots__ = ('_id',)
+
     def __init__(self, id, url, client, parent):
         super(Restriction, self).__init__(url, client, parent, API_OVERRIDE_PATH)
         self._id = id
@@ -78,6 +80,7 @@ class Restriction(ResourceBase):
 
 
 class Restrictions(ResourceBase, IterableResource):
+    __slots__ = ()
 
     def __init__(self, url, client, parent):
         ResourceBase.__init__(self, url, client, parent, API_OVERRIDE_PATH)
@@ -106,4 +109,5 @@ update_doc(Restrictions.all, """Retrieve list of restrictions for a repo""")
 
 class BranchPermissions(ResourceBase):
     """Simple parent resource for this api, to distinguish restrictions from anything else"""
+    __slots__ = ()
     restrictions = Nested(Restrictions)
@@ -23,6 +23,8 @@ class BuildStates(Enum):
 
 
 class Build(ResourceBase):
+    __slots__ = ('_git_hash',)
+
     def __init__(self, url, client, git_hash):
         super(Build, self).__init__(url, client, None, API_OVERRIDE_PATH(api=API_NAME, version=API_VERSION))
         self._git_hash = git_hash
@@ -0,0 +1,464 @@
+"""
+Response caching and request coalescing for StashClient.
+"""
+import collections
+import copy
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from requests.models import Response
+
+try:
+    from urllib import urlencode
+except ImportError:
+    from urllib.parse import urlencode
+
+
+class LRUStore(object):
+    """
+    A thread-safe least-recently-used mapping bounded by entry count and total size in bytes.
+    """
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+            return None
+
+    def put(self, key, value, size):
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.size += size
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+def cache_key(url, params):
+    if not params:
+        return url
+    items = params.items() if hasattr(params, 'items') else params
+    return url, tuple(sorted((str(k), str(v)) for k, v in items))
+
+
+def cached_response(response, content=None):
+    """
+    A copy of response that can be handed to a caller without sharing mutable state.
+    """
+    copied = Response()
+    copied.status_code = response.status_code
+    copied.reason = response.reason
+    copied.url = response.url
+    copied.encoding = response.encoding
+    copied.headers = copy.copy(response.headers)
+    copied._content = response.content if content is None else content
+    copied._content_consumed = True
+    copied.request = response.request
+    copied.elapsed = response.elapsed
+    return copied
+
+
+class ConditionalCache(object):
+    """
+    Revalidating cache for GET responses carrying an ETag or Last-Modified validator.
+
+    Cached responses are always revalidated: the client sends If-None-Match/If-Modified-Since
+    and, when the server answers 304 Not Modified, serves the stored body instead of
+    downloading it again.
+
+    Statistics: hits (304s answered from the cache), misses (requests with nothing cached),
+    stores, and the evictions and size of the underlying store.
+    """
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self._store = LRUStore(max_entries, max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def __len__(self):
+        return len(self._store)
+
+    @property
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, stores=self.stores,
+                    evictions=self._store.evictions, entries=len(self._store), bytes=self._store.size)
+
+    def request_headers(self, key, headers=None):
+        """
+        The headers to send for the request identified by key, with validators added.
+        """
+        entry = self._store.get(key)
+        if entry is None:
+            # counted under the store's lock, as the cache is shared by paging threads
+            with self._store._lock:
+                self.misses += 1
+            return headers
+        headers = dict(headers or {})
+        if 'ETag' in entry.headers:
+            headers['If-None-Match'] = entry.headers['ETag']
+        if 'Last-Modified' in entry.headers:
+            headers['If-Modified-Since'] = entry.headers['Last-Modified']
+        return headers
+
+    def response(self, key, response):
+        """
+        Record response to the request identified by key, returning the response to use.
+        """
+        if response.status_code == 304:
+            entry = self._store.get(key)
+            if entry is not None:
+                with self._store._lock:
+                    self.hits += 1
+                return cached_response(entry)
+            return response
+        if response.status_code == 200 and ('ETag' in response.headers or 'Last-Modified' in response.headers):
+            self._store.put(key, cached_response(response), len(response.content))
+            with self._store._lock:
+                self.stores += 1
+        return response
+
+    def clear(self):
+        self._store.clear()
+
+
+_HASH = re.compile(r'^[0-9a-fA-F]{40}([0-9a-fA-F]{24})?$')
+
+# parameters naming the commits a request is about
+_REF_PARAMS = ('at', 'until', 'since', 'from', 'to', 'sinceId', 'untilId')
+
+# resources whose content is fully determined by the commits they are requested at
+_CONTENT_ENDPOINTS = frozenset(['browse', 'files', 'raw', 'changes', 'diff', 'commits', 'compare'])
+
+_METADATA = re.compile(r'^/?[^/]+/[^/]+/projects/[^/]+(/repos/[^/]+)?/?$')
+
+
+def is_commit_hash(value):
+    return bool(_HASH.match(str(value)))
+
+
+def addressed_by_hash(resource, params):
+    """
+    Whether the request can never return anything else: it reads content of a repository at
+    full commit hashes, or a commit itself by its hash.
+
+    Only resources of a repository, <api>/<version>/projects/<key>/repos/<slug>/..., qualify:
+    e.g. build-status/1.0/commits/<hash> is keyed by a hash but changes as builds run.
+    """
+    segments = [s for s in resource.split('?')[0].split('/') if s]
+    if len(segments) < 7 or segments[2] != 'projects' or segments[4] != 'repos':
+        return False
+    segments = segments[6:]
+    refs = [v for k, v in (params or {}).items() if k in _REF_PARAMS]
+    if not all(is_commit_hash(ref) for ref in refs):
+        return False
+    if 'commits' in segments:
+        index = segments.index('commits')
+        if index + 1 < len(segments) and is_commit_hash(segments[index + 1]):
+            rest = segments[index + 2:]
+            return not rest or rest[0] in ('changes', 'diff')
+    return bool(refs) and bool(_CONTENT_ENDPOINTS.intersection(segments))
+
+
+def is_metadata(resource, params):
+    """
+    Whether the request reads a project or a repository.
+    """
+    return not params and bool(_METADATA.match(resource))
+
+
+class CachePolicy(object):
+    """
+    Caching rule for the GET requests matching a predicate.
+
+    matches: called with the resource path and query parameters.
+    ttl: seconds an entry stays fresh, None for never expiring.
+    """
+    def __init__(self, name, matches, ttl=None):
+        self.name = name
+        self.matches = matches
+        self.ttl = ttl
+
+
+IMMUTABLE = CachePolicy('immutable', addressed_by_hash)
+METADATA = CachePolicy('metadata', is_metadata, ttl=60)
+
+
+def persistent_key(key):
+    if isinstance(key, tuple):
+        url, params = key
+        return url + '?' + urlencode(params)
+    return key
+
+
+class SQLiteStore(object):
+    """
+    A persistent cache of response bodies in a single SQLite file.
+
+    The file can be shared by several processes (it uses write-ahead logging and waits for
+    locks up to timeout seconds). Bodies are stored as blobs and returned as the bytes read
+    from the database, without further copies. Once the stored bodies exceed max_bytes, the
+    least recently read ones are deleted.
+    """
+    def __init__(self, path, max_bytes=1024 * 1024 * 1024, timeout=30):
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._local = threading.local()
+        with self._connection() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, content BLOB, '
+                       'meta TEXT, size INTEGER, accessed REAL)')
+            db.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+            # the total size of the entries, kept by triggers so that it is right whichever
+            # process writes, and so that a put does not have to sum the table
+            db.execute('CREATE TABLE IF NOT EXISTS total (id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER)')
+            db.execute('CREATE TRIGGER IF NOT EXISTS entries_added AFTER INSERT ON entries '
+                       'BEGIN UPDATE total SET size = size + new.size; END')
+            db.execute('CREATE TRIGGER IF NOT EXISTS entries_removed AFTER DELETE ON entries '
+                       'BEGIN UPDATE total SET size = size - old.size; END')
+            db.execute('INSERT OR IGNORE INTO total (id, size) SELECT 0, COALESCE(SUM(size), 0) FROM entries')
+
+    def _connection(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.timeout)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    @property
+    def size(self):
+        return self._connection().execute('SELECT size FROM total').fetchone()[0]
+
+    def get(self, key):
+        """
+        Return (content, meta) for key, or None.
+        """
+        db = self._connection()
+        row = db.execute('SELECT content, meta, accessed FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        content, meta, accessed = row
+        now = time.time()
+        # only record reads at a coarse granularity, to keep reads from contending for the write lock
+        if now - accessed > 60:
+            with db:
+                db.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+        return content, json.loads(meta)
+
+    def put(self, key, content, meta):
+        if len(content) > self.max_bytes:
+            return
+        db = self._connection()
+        with db:
+            # delete rather than replace the old entry, as REPLACE does not fire delete triggers
+            db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            db.execute('INSERT INTO entries (key, content, meta, size, accessed) VALUES (?, ?, ?, ?, ?)',
+                       (key, sqlite3.Binary(content), json.dumps(meta), len(content), time.time()))
+            self._evict(db)
+
+    def _evict(self, db):
+        excess = db.execute('SELECT size FROM total').fetchone()[0] - self.max_bytes
+        while excess > 0:
+            oldest = db.execute('SELECT key, size FROM entries ORDER BY accessed, rowid LIMIT 16').fetchall()
+            if not oldest:
+                return
+            for key, size in oldest:
+                db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                excess -= size
+                if excess <= 0:
+                    return
+
+    def pop(self, key):
+        db = self._connection()
+        with db:
+            db.execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def clear(self):
+        db = self._connection()
+        with db:
+            db.execute('DELETE FROM entries')
+
+
+class ResponseCache(object):
+    """
+    In-memory cache for GET responses, with expiry decided by the first matching policy.
+
+    The default policies keep content addressed by commit hash (commits, diffs, changes,
+    file listings and contents at a hash) forever, and project and repository metadata for
+    a minute. Other requests are not cached. Entries are evicted least recently used first
+    once max_entries or max_bytes is exceeded, and a PUT, POST or DELETE to a cached URL
+    drops its entry.
+
+    persistent: an optional :class:`SQLiteStore` backing the entries that never expire, so
+    that they survive restarts and can be shared between processes.
+
+    Statistics: hits, misses (matching requests not found or expired) and stores, overall
+    and per policy, plus evictions and the size of the store.
+    """
+    def __init__(self, policies=(IMMUTABLE, METADATA), max_entries=4096, max_bytes=128 * 1024 * 1024,
+                 persistent=None):
+        self.policies = list(policies)
+        self.persistent = persistent
+        self._store = LRUStore(max_entries, max_bytes)
+        self._counts = collections.Counter()
+
+    def __len__(self):
+        return len(self._store)
+
+    @property
+    def stats(self):
+        stats = dict(hits=0, persistent_hits=0, misses=0, stores=0, evictions=self._store.evictions,
+                     entries=len(self._store), bytes=self._store.size)
+        with self._store._lock:
+            counts = list(self._counts.items())
+        for (policy, counter), count in counts:
+            stats[counter] += count
+            stats['%s_%s' % (policy, counter)] = count
+        return stats
+
+    def _count(self, policy, counter):
+        # under the store's lock, as the cache is shared by paging threads
+        with self._store._lock:
+            self._counts[policy.name, counter] += 1
+
+    def policy_for(self, resource, params):
+        for policy in self.policies:
+            if policy.matches(resource, params):
+                return policy
+        return None
+
+    def get(self, key, policy):
+        entry = self._store.get(key)
+        if entry is not None:
+            response, expires = entry
+            if expires is None or expires > time.monotonic():
+                self._count(policy, 'hits')
+                return cached_response(response)
+            self._store.pop(key)
+        if policy.ttl is None and self.persistent is not None:
+            stored = self.persistent.get(persistent_key(key))
+            if stored is not None:
+                response = _stored_response(*stored)
+                self._store.put(key, (response, None), len(response.content))
+                self._count(policy, 'persistent_hits')
+                return cached_response(response)
+        self._count(policy, 'misses')
+        return None
+
+    def put(self, key, response, policy):
+        if response.status_code != 200:
+            return
+        expires = None if policy.ttl is None else time.monotonic() + policy.ttl
+        self._store.put(key, (cached_response(response), expires), len(response.content))
+        if policy.ttl is None and self.persistent is not None:
+            self.persistent.put(persistent_key(key), response.content,
+                                dict(url=response.url, encoding=response.encoding,
+                                     headers={'Content-Type': response.headers.get('Content-Type', '')}))
+        self._count(policy, 'stores')
+
+    def invalidate(self, key):
+        self._store.pop(key)
+
+    def clear(self):
+        self._store.clear()
+        if self.persistent is not None:
+            self.persistent.clear()
+
+
+def _stored_response(content, meta):
+    response = Response()
+    response.status_code = 200
+    response.reason = 'OK'
+    response.url = meta['url']
+    response.encoding = meta['encoding']
+    response.headers.update(meta['headers'])
+    response._content = content
+    response._content_consumed = True
+    return response
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent identical requests: while a request for a key is in flight, other
+    callers asking for the same key wait for it instead of sending their own, and each of them
+    gets a separate copy of the response.
+
+    coalesced counts the requests that were answered this way.
+    """
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fetch):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                call.response = fetch()
+                # read the body before anyone copies it
+                call.response.content
+            except BaseException as e:
+                # also KeyboardInterrupt and the like, so that waiters never get a missing response
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            if call.error is not None:
+                raise call.error
+            return call.response
+
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return cached_response(call.response)
@@ -0,0 +1,314 @@
+"""
+Recording and replaying of HTTP interactions.
+
+A client built with a recording cassette sends its requests as usual and keeps each request
+and response; a replaying cassette answers the same requests from memory without touching
+the network::
+
+    with Cassette('nightly-job.cassette', mode='record') as cassette:
+        run_job(stashy.connect(URL, USER, PASSWORD, cassette=cassette))
+
+    stash = stashy.connect(URL, cassette=Cassette('nightly-job.cassette'))
+    run_job(stash)  # same requests, no server, no latency
+
+Requests are matched on method, path (relative to the client's base URL) and query
+parameters. A request made several times gets its recorded responses in order, then the
+last one again. A page request (start/limit) that was not recorded as such is assembled from
+the recorded pages of the same listing, so a job can be replayed with other paging options.
+
+Cassettes are gzipped JSON. Request headers and the Set-Cookie response header are not kept.
+Streamed responses (stream=True) are recorded as their body is read, so recording does not
+buffer them; only the part of the body that was read is kept.
+"""
+import base64
+import gzip
+import json
+import threading
+from datetime import timedelta
+
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib.parse import parse_qsl, urlsplit
+
+from .helpers import DEFAULT_PAGE_SIZE
+
+_SKIPPED_HEADERS = frozenset(['set-cookie', 'content-encoding', 'transfer-encoding', 'content-length'])
+
+
+class CassetteMiss(Exception):
+    """
+    Raised when a replaying cassette has no response for a request.
+    """
+    def __init__(self, method, path, params):
+        super(CassetteMiss, self).__init__('No recorded response for %s %s %s' % (method, path, list(params)))
+        self.method = method
+        self.path = path
+        self.params = params
+
+
+class Interaction(object):
+    """
+    One recorded response, with the request it answered.
+    """
+    def __init__(self, method, path, params, status, headers, body):
+        self.method = method
+        self.path = path
+        self.params = params
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self._page = None
+
+    @property
+    def key(self):
+        return (self.method, self.path, self.params)
+
+    def page(self):
+        """
+        The decoded body if it is a page of a paged resource, None otherwise.
+        """
+        if self._page is None:
+            self._page = False
+            if self.status == 200:
+                try:
+                    data = json.loads(self.body)
+                except ValueError:
+                    data = None
+                if isinstance(data, dict) and isinstance(data.get('values'), list) and 'isLastPage' in data:
+                    self._page = data
+        return self._page or None
+
+    def to_dict(self):
+        try:
+            body, encoding = self.body.decode('utf-8'), 'utf-8'
+        except UnicodeDecodeError:
+            body, encoding = base64.b64encode(self.body).decode('ascii'), 'base64'
+        return {'method': self.method, 'path': self.path, 'params': [list(p) for p in self.params],
+                'status': self.status, 'headers': self.headers, 'body': body, 'encoding': encoding}
+
+    @classmethod
+    def from_dict(cls, data):
+        body = data['body']
+        body = base64.b64decode(body) if data.get('encoding') == 'base64' else body.encode('utf-8')
+        return cls(data['method'], data['path'], tuple(tuple(p) for p in data['params']), data['status'],
+                   data['headers'], body)
+
+
+def _split(url, base_path):
+    parts = urlsplit(url)
+    path = parts.path
+    if base_path and path.startswith(base_path):
+        path = path[len(base_path):]
+    return path, tuple(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+
+
+class Cassette(object):
+    """
+    The interactions of a recording, kept in memory and loaded from or saved to path.
+
+    mode: 'replay' answers requests from the cassette, loading path if it is given;
+        'record' sends requests to the server and adds them to the cassette.
+    """
+    def __init__(self, path=None, mode='replay'):
+        if mode not in ('record', 'replay'):
+            raise ValueError("mode should be 'record' or 'replay'")
+        self.path = path
+        self.mode = mode
+        self.interactions = []
+        self._index = {}
+        self._played = {}
+        self._lock = threading.Lock()
+        if mode == 'replay' and path is not None:
+            self.load(path)
+
+    def load(self, path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        for interaction in data['interactions']:
+            self._add(Interaction.from_dict(interaction))
+
+    def save(self, path=None):
+        path = path or self.path
+        with self._lock:
+            interactions = [interaction.to_dict() for interaction in self.interactions]
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump({'version': 1, 'interactions': interactions}, f, separators=(',', ':'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.mode == 'record' and self.path is not None:
+            self.save()
+
+    def _add(self, interaction):
+        with self._lock:
+            self.interactions.append(interaction)
+            self._index.setdefault(interaction.key, []).append(interaction)
+
+    def add(self, method, path, body=b'', status=200, headers=None, params=None):
+        """
+        Add a response by hand, e.g. to replay fixtures in tests. path is relative to the
+        client's base URL, as in '/rest/api/1.0/projects'.
+        """
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        headers = dict(headers or {})
+        headers.setdefault('Content-Type', 'application/json;charset=UTF-8')
+        params = tuple(sorted((k, str(v)) for k, v in (params or {}).items()))
+        self._add(Interaction(method.upper(), path, params, status, headers, body))
+
+    def record(self, request, response, base_path='', body=None):
+        """
+        Add a response sent by the server, with body as its content if given.
+        """
+        path, params = _split(request.url, base_path)
+        headers = dict((k, v) for k, v in response.headers.items() if k.lower() not in _SKIPPED_HEADERS)
+        interaction = Interaction(request.method, path, params, response.status_code, headers,
+                                  response.content if body is None else body)
+        self._add(interaction)
+        return interaction
+
+    def play(self, method, path, params):
+        """
+        The interaction answering a request, or None.
+        """
+        key = (method, path, params)
+        with self._lock:
+            recorded = self._index.get(key)
+            if recorded:
+                played = self._played.get(key, 0)
+                self._played[key] = played + 1
+                return recorded[min(played, len(recorded) - 1)]
+            if method == 'GET':
+                return self._assemble_page(path, params)
+        return None
+
+    def _assemble_page(self, path, params):
+        query = dict(params)
+        start = int(query.pop('start', 0))
+        limit = int(query.pop('limit', DEFAULT_PAGE_SIZE))
+        rest = tuple(sorted(query.items()))
+
+        pages = []
+        for (method, other_path, other_params), recorded in self._index.items():
+            if method != 'GET' or other_path != path:
+                continue
+            other = dict(other_params)
+            other.pop('limit', None)
+            page_start = int(other.pop('start', 0))
+            if tuple(sorted(other.items())) == rest:
+                page = recorded[-1].page()
+                if page is not None:
+                    pages.append((page_start, page))
+
+        values = []
+        position, last = start, False
+        while len(values) < limit and not last:
+            for page_start, page in pages:
+                end = page_start + len(page['values'])
+                if page_start <= position < end or (position >= end and page['isLastPage']):
+                    break
+            else:
+                return None
+            taken = page['values'][position - page_start:][:limit - len(values)]
+            values.extend(taken)
+            position += len(taken)
+            last = page['isLastPage'] and position >= end
+
+        body = {'size': len(values), 'limit': limit, 'start': start, 'values': values, 'isLastPage': last}
+        if not last:
+            body['nextPageStart'] = position
+        return Interaction('GET', path, params, 200, {'Content-Type': 'application/json;charset=UTF-8'},
+                           json.dumps(body).encode('utf-8'))
+
+    def adapter(self, base_path='', transport=None):
+        """
+        A requests transport adapter recording to or replaying from this cassette.
+        """
+        return CassetteAdapter(self, base_path, transport)
+
+
+class _RecordingBody(object):
+    """
+    The raw body of a streamed response, setting the body of interaction to the bytes read
+    once it is read to the end or closed.
+    """
+    def __init__(self, raw, interaction):
+        self._raw = raw
+        self._interaction = interaction
+        self._chunks = []
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        for chunk in self._raw.stream(amt, decode_content=decode_content):
+            self._chunks.append(chunk)
+            yield chunk
+        self._finish()
+
+    def read(self, amt=None, *args, **kw):
+        data = self._raw.read(amt, *args, **kw)
+        if data:
+            self._chunks.append(data)
+        if not data or amt is None:
+            self._finish()
+        return data
+
+    def close(self):
+        self._finish()
+        self._raw.close()
+
+    def _finish(self):
+        if self._interaction is not None:
+            self._interaction.body = b''.join(self._chunks)
+            self._interaction = None
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class CassetteAdapter(BaseAdapter):
+    """
+    Records through transport, or replays without it, depending on the cassette's mode.
+    """
+    def __init__(self, cassette, base_path='', transport=None):
+        super(CassetteAdapter, self).__init__()
+        self.cassette = cassette
+        self.base_path = base_path.rstrip('/')
+        self.transport = transport
+
+    def send(self, request, **kw):
+        if self.cassette.mode == 'record':
+            response = self.transport.send(request, **kw)
+            if kw.get('stream'):
+                # reading the content here would buffer the response the caller streams
+                interaction = self.cassette.record(request, response, self.base_path, body=b'')
+                response.raw = _RecordingBody(response.raw, interaction)
+            else:
+                self.cassette.record(request, response, self.base_path)
+            return response
+
+        path, params = _split(request.url, self.base_path)
+        interaction = self.cassette.play(request.method, path, params)
+        if interaction is None:
+            raise CassetteMiss(request.method, path, params)
+
+        response = Response()
+        response.status_code = interaction.status
+        response.headers = CaseInsensitiveDict(interaction.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = interaction.body
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.reason = 'Replayed'
+        response.elapsed = timedelta(0)
+        response.connection = self
+        return response
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
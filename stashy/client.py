@@ -1,5 +1,10 @@
-import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
 import requests
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
 
 from .helpers import Nested, add_json_headers
 from .admin import Admin
@@ -7,14 +12,42 @@ from .projects import Projects
 from .ssh import Keys
 from .compat import basestring
 from .allrepos import Repos
+from .batch import Batch
 from .builds import Build
 from .users import Users
+from .retry import RateLimiter, RetryPolicy
+from .codec import default_codec
+from .metrics import RequestEvent, body_size, endpoint_template
+from .cache import ConditionalCache, ResponseCache, SingleFlight, SQLiteStore, cache_key
+
+
+def _hooks(hooks):
+    if hooks is None:
+        return []
+    if callable(hooks):
+        return [hooks]
+    return list(hooks)
+
+
+def _response_bytes(response, stream):
+    if not stream:
+        return len(response.content)
+    length = response.headers.get('Content-Length')
+    return int(length) if length and length.isdigit() else None
+
 
 class Stash(object):
     _url = "/"
+    _children = None
 
-    def __init__(self, base_url, username=None, password=None, oauth=None, verify=True, token=None, session=None, requests_auth=None):
-        self._client = StashClient(base_url, username, password, oauth, verify, token, session=session, requests_auth=requests_auth)
+    def __init__(self, base_url, username=None, password=None, oauth=None, verify=True, token=None, session=None, requests_auth=None,
+                 **options):
+        """
+        Any other keyword arguments (paging defaults, connection pool settings, ...) are
+        passed through to :class:`StashClient`.
+        """
+        self._client = StashClient(base_url, username, password, oauth, verify, token, session=session, requests_auth=requests_auth,
+                                   **options)
 
     admin = Nested(Admin)
     projects = Nested(Projects)
@@ -34,9 +67,53 @@ class Stash(object):
         """
         return Build("", self._client, git_hash)
 
+    def batch(self, max_workers=8):
+        """
+        Return a :class:`stashy.batch.Batch` to run many calls concurrently and collect their outcomes.
+        """
+        return Batch(max_workers)
+
+    def connect(self):
+        """
+        Contact the server up front; otherwise this happens on the first request.
+        """
+        return self._client.connect()
+
+    def warm_up(self, connections):
+        """
+        Open connections to the server ahead of a bulk job, see :meth:`StashClient.warm_up`.
+        """
+        return self._client.warm_up(connections)
+
 
 class StashClient(object):
 
+    # resources return awaitables instead of results when this is set
+    is_async = False
+
+    # default number of pages paginate reads ahead of the consumer
+    prefetch = 0
+
+    # default number of pages paginate requests concurrently at consecutive offsets
+    workers = 0
+
+    # default limit requested per page, None leaves it to the server
+    page_size = None
+
+    # whether paginate tunes the limit between pages by default, and its bounds
+    adaptive_paging = False
+    max_page_size = 1000
+    slow_page_seconds = 5.0
+
+    # whether paginate decodes pages incrementally by default
+    stream_pages = False
+
+    # how long warm_up waits for all of its connections to open
+    warm_up_timeout = 30
+
+    # connections kept per host by the pool of the session, requests' default unless configured
+    pool_maxsize = DEFAULT_POOLSIZE
+
     # the core api path will be used as an overridable default
     core_api_name = 'api'
     core_api_version = '1.0'
@@ -58,15 +135,41 @@ class StashClient(object):
     keys_api_version = '1.0'
     keys_api_path = '{0}/{1}'.format(keys_api_name, keys_api_version)
 
-    def __init__(self, base_url, username=None, password=None, oauth=None, verify=True, token=None, session=None, requests_auth=None):
-        assert isinstance(base_url, basestring)
-
-        if base_url.endswith("/"):
-            self._base_url = base_url[:-1]
-        else:
-            self._base_url = base_url
-
-        self._api_base = self._base_url + "/rest"
+    def __init__(self, base_url, username=None, password=None, oauth=None, verify=True, token=None, session=None, requests_auth=None,
+                 prefetch=0, workers=0, page_size=None, adaptive_paging=False, max_page_size=1000, stream_pages=False,
+                 pool_connections=None, pool_maxsize=None, pool_block=None, keep_alive=True,
+                 retry=None, rate_limit=False, http_cache=None, cache=None, cache_path=None, coalesce=False,
+                 codec=None, metrics=None, tracer=None, cassette=None):
+        """
+        pool_connections, pool_maxsize, pool_block: if any is given, the session gets an HTTPAdapter
+            with these settings (requests defaults for the others): the number of per-host pools to
+            cache, the number of connections kept per host, and whether to wait for a free connection
+            instead of opening a throwaway one when the pool is exhausted.
+        keep_alive: set to False to close each connection after its response.
+        retry: a :class:`stashy.retry.RetryPolicy`, or True for the default policy, to retry
+            throttled, unavailable and failed requests with backoff.
+        rate_limit: a :class:`stashy.retry.RateLimiter`, or True for a default one, to pace
+            requests by the server's X-RateLimit-* headers.
+        http_cache: a :class:`stashy.cache.ConditionalCache`, or True for a default one, to
+            revalidate repeated GETs with ETag/Last-Modified instead of downloading them again.
+        cache: a :class:`stashy.cache.ResponseCache`, or True for a default one, to answer GETs
+            for immutable and slow-changing resources from memory.
+        cache_path: file for a persistent :class:`stashy.cache.SQLiteStore` behind the default
+            cache, keeping content addressed by commit hash across restarts.
+        coalesce: share one request between threads issuing identical GETs at the same time.
+        codec: the :class:`stashy.codec.JSONCodec` encoding request bodies and decoding responses,
+            by default orjson when it is installed and the standard library otherwise.
+        metrics: a callable, or a list of them, called with a :class:`stashy.metrics.RequestEvent`
+            after each request, e.g. a :class:`stashy.metrics.MetricsAggregator`.
+        tracer: a :class:`stashy.tracing.Tracer` recording spans for resource calls, paginated
+            walks and requests.
+        cassette: a :class:`stashy.cassette.Cassette` recording the requests sent through the
+            session, or answering them without a server.
+        """
+        self._setup(base_url, prefetch=prefetch, workers=workers, page_size=page_size,
+                    adaptive_paging=adaptive_paging, max_page_size=max_page_size, stream_pages=stream_pages,
+                    retry=retry, rate_limit=rate_limit, http_cache=http_cache, cache=cache, cache_path=cache_path,
+                    coalesce=coalesce, codec=codec, metrics=metrics, tracer=tracer)
 
         if session is None:
             session = requests.Session()
@@ -74,6 +177,20 @@ class StashClient(object):
         self._session = session
         self._session.verify = verify
 
+        if pool_connections is not None or pool_maxsize is not None or pool_block is not None:
+            self.pool_maxsize = pool_maxsize or DEFAULT_POOLSIZE
+            adapter = HTTPAdapter(pool_connections=pool_connections or DEFAULT_POOLSIZE,
+                                  pool_maxsize=pool_maxsize or DEFAULT_POOLSIZE,
+                                  pool_block=bool(pool_block))
+            self._session.mount('https://', adapter)
+            self._session.mount('http://', adapter)
+        if not keep_alive:
+            self._session.headers['Connection'] = 'close'
+        self.cassette = cassette
+        if cassette is not None:
+            transport = self._session.get_adapter(self._base_url)
+            self._session.mount(self._base_url, cassette.adapter(urlsplit(self._base_url).path, transport))
+
         if oauth is not None:
             self._create_oauth_session(oauth)
         elif username is not None or password is not None:
@@ -83,9 +200,47 @@ class StashClient(object):
         elif requests_auth is not None:
             self._session.auth = requests_auth
 
-        self._session.cookies = self._session.head(self.url("")).cookies
+        # no request is made here: cookies are collected by the session on the first real request,
+        # or up front by calling connect()
         self._session.headers.update({'Content-Type': 'application/json'})
 
+    def _setup(self, base_url, prefetch=0, workers=0, page_size=None, adaptive_paging=False, max_page_size=1000,
+               stream_pages=False, retry=None, rate_limit=False, http_cache=None, cache=None, cache_path=None,
+               coalesce=False, codec=None, metrics=None, tracer=None):
+        # the settings that do not depend on the HTTP library, shared with AsyncStashClient
+        assert isinstance(base_url, basestring)
+
+        if retry is True:
+            retry = RetryPolicy()
+        if rate_limit is True:
+            rate_limit = RateLimiter()
+        self.retry = retry or None
+        self.rate_limiter = rate_limit or None
+        if http_cache is True:
+            http_cache = ConditionalCache()
+        self.http_cache = http_cache
+        if cache is True or (cache is None and cache_path is not None):
+            cache = ResponseCache(persistent=SQLiteStore(cache_path) if cache_path is not None else None)
+        self.cache = cache
+        self.single_flight = SingleFlight() if coalesce else None
+        self.codec = codec or default_codec()
+        self.metrics = _hooks(metrics)
+        self.tracer = tracer
+
+        self.prefetch = prefetch
+        self.workers = workers
+        self.page_size = page_size
+        self.adaptive_paging = adaptive_paging
+        self.max_page_size = max_page_size
+        self.stream_pages = stream_pages
+
+        if base_url.endswith("/"):
+            self._base_url = base_url[:-1]
+        else:
+            self._base_url = base_url
+
+        self._api_base = self._base_url + "/rest"
+
     def _create_oauth_session(self, oauth):
         from requests_oauthlib import OAuth1
         from oauthlib.oauth1 import SIGNATURE_RSA
@@ -99,34 +254,159 @@ class StashClient(object):
         )
         self._session.auth = oauth
 
+    def connect(self):
+        """
+        Send a HEAD request to the API root, so that the session picks up its cookies and a
+        connection is opened before the first real request.
+        """
+        return self.head("")
+
+    def warm_up(self, connections):
+        """
+        Open up to the given number of connections at once, so that the TCP and TLS handshakes are
+        done before a parallel job starts. No more connections than the pool keeps
+        (pool_maxsize) are opened.
+
+        Returns the number of connections that were opened successfully.
+        """
+        # with pool_block the connections beyond the pool would wait for one to be returned
+        connections = min(connections, self.pool_maxsize)
+        if connections <= 0:
+            return 0
+        barrier = threading.Barrier(connections)
+
+        def connect():
+            try:
+                response = self._session.head(self.url(""), stream=True)
+            except BaseException:
+                # release the connections waiting for this one
+                barrier.abort()
+                raise
+            try:
+                # hold on to the connection until all of them are open so none gets reused
+                barrier.wait(timeout=self.warm_up_timeout)
+            except threading.BrokenBarrierError:
+                pass
+            response.content
+            return response
+
+        with ThreadPoolExecutor(max_workers=connections) as pool:
+            futures = [pool.submit(connect) for _ in range(connections)]
+        return len([f for f in futures if f.exception() is None])
+
     def url(self, resource_path):
         assert isinstance(resource_path, basestring)
         if not resource_path.startswith("/"):
             resource_path = "/" + resource_path
         return self._api_base + resource_path
 
+    def _request(self, method, resource, **kw):
+        url = self.url(resource)
+        if method != 'GET' and self.cache is not None:
+            self.cache.invalidate(cache_key(url, None))
+        if self.tracer is not None:
+            with self.tracer.span('%s %s' % (method, endpoint_template(resource)), url=url) as span:
+                response = self._measured(method, resource, url, kw)
+                span.set(status=response.status_code)
+                return response
+        return self._measured(method, resource, url, kw)
+
+    def _measured(self, method, resource, url, kw):
+        if not self.metrics:
+            return self._send_retrying(method, url, kw)
+
+        event = RequestEvent(method, endpoint_template(resource), url, request_bytes=body_size(kw.get('data')))
+        started = time.monotonic()
+        try:
+            response = self._send_retrying(method, url, kw, event)
+        except Exception as e:
+            event.error = e
+            raise
+        else:
+            event.status = response.status_code
+            event.ttfb = response.elapsed.total_seconds()
+            event.response_bytes = _response_bytes(response, kw.get('stream'))
+        finally:
+            event.total = time.monotonic() - started
+            self._emit(event)
+        return response
+
+    def _emit(self, event):
+        for hook in self.metrics:
+            hook(event)
+
+    def _send_retrying(self, method, url, kw, event=None):
+        attempt = 0
+        while True:
+            if event is not None:
+                event.retries = attempt
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                response = self._session.request(method, url, **kw)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if self.retry is None or not self.retry.should_retry(method, attempt, error=e):
+                    raise
+                time.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+
+            if self.rate_limiter is not None:
+                self.rate_limiter.update(response.headers)
+            if self.retry is None or not self.retry.should_retry(method, attempt, response=response):
+                return response
+            response.close()
+            time.sleep(self.retry.delay(attempt, response))
+            attempt += 1
+
     def head(self, resource, **kw):
-        return self._session.head(self.url(resource), **kw)
+        kw.setdefault('allow_redirects', False)
+        return self._request('HEAD', resource, **kw)
 
     def get(self, resource, **kw):
-        return self._session.get(self.url(resource), **kw)
+        if kw.get('stream') or (self.cache is None and self.http_cache is None and self.single_flight is None):
+            return self._request('GET', resource, **kw)
+        key = cache_key(self.url(resource), kw.get('params'))
+
+        policy = None
+        if self.cache is not None:
+            policy = self.cache.policy_for(resource, kw.get('params'))
+            if policy is not None:
+                response = self.cache.get(key, policy)
+                if response is not None:
+                    return response
+
+        if self.single_flight is None:
+            response = self._fetch(resource, key, kw)
+        else:
+            headers = kw.get('headers')
+            flight_key = (key, tuple(sorted(headers.items()))) if headers else key
+            response = self.single_flight.do(flight_key, lambda: self._fetch(resource, key, kw))
+
+        if policy is not None:
+            self.cache.put(key, response, policy)
+        return response
+
+    def _fetch(self, resource, key, kw):
+        if self.http_cache is None:
+            return self._request('GET', resource, **kw)
+        kw['headers'] = self.http_cache.request_headers(key, kw.get('headers'))
+        return self.http_cache.response(key, self._request('GET', resource, **kw))
 
     def post(self, resource, data=None, **kw):
         if data:
             kw = add_json_headers(kw)
-            data = json.dumps(data)
-        return self._session.post(self.url(resource), data, **kw)
+            data = self.codec.dumps(data)
+        return self._request('POST', resource, data=data, **kw)
 
     def put(self, resource, data=None, **kw):
         if data:
             kw = add_json_headers(kw)
-            data = json.dumps(data)
-        return self._session.put(self.url(resource), data, **kw)
+            data = self.codec.dumps(data)
+        return self._request('PUT', resource, data=data, **kw)
 
     def delete(self, resource, data=None,**kw):
         if data:
-            data = json.dumps(data)
+            data = self.codec.dumps(data)
             kw = add_json_headers(kw)
-            return self._session.request(method='DELETE', url=self.url(
-                resource), data=data, **kw)
-        return self._session.delete(self.url(resource), **kw)
+        return self._request('DELETE', resource, data=data, **kw)
@@ -0,0 +1,61 @@
+"""
+JSON encoding and decoding used for request and response bodies.
+"""
+import json
+
+
+class JSONCodec(object):
+    """
+    The standard library json module. Decodes UTF-8 bytes directly.
+    """
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj)
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    """
+    orjson, falling back to the standard library for the values orjson refuses to encode
+    (e.g. integers over 64 bits or non-string keys). Decoding errors are ValueErrors, as
+    with the standard library.
+
+    The encoding is not the same as JSONCodec's: dumps returns compact bytes instead of a
+    str, and datetimes, dataclasses and UUIDs are encoded where the standard library raises
+    TypeError.
+    """
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def dumps(self, obj):
+        try:
+            return self._orjson.dumps(obj)
+        except TypeError:
+            return json.dumps(obj)
+
+    def loads(self, data):
+        return self._orjson.loads(data)
+
+
+def default_codec():
+    """
+    The fastest available codec: orjson if it is installed, the standard library otherwise.
+    """
+    try:
+        return OrjsonCodec()
+    except ImportError:
+        return JSONCodec()
+
+
+def loads_for(resource):
+    """
+    The decoding function of the client a resource belongs to.
+    """
+    codec = getattr(getattr(resource, '_client', None), 'codec', None)
+    return json.loads if codec is None else codec.loads
@@ -8,6 +8,8 @@ API_OVERRIDE_PATH = '{0}/{1}'.format(API_NAME, API_VERSION)
 
 
 class Condition(ResourceBase):
+    __slots__ = ()
+
     def __init__(self, url, client, parent):
         super(Condition, self).__init__(url, client, parent, API_OVERRIDE_PATH)
 
@@ -90,6 +92,7 @@ class Condition(ResourceBase):
 
 
 class Conditions(ResourceBase, IterableResource):
+    __slots__ = ()
 
     def __init__(self, url, client, parent):
         ResourceBase.__init__(self, url, client, parent, API_OVERRIDE_PATH)
@@ -110,5 +113,6 @@ update_doc(Conditions.all,
 
 
 class DefaultReviewers(ResourceBase):
+    __slots__ = ()
     conditions = Nested(Conditions)
     condition = Nested(Condition)
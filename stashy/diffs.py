@@ -1,23 +1,93 @@
 from .fileinfo import FileInfo
+from .hunks import ADDED, REMOVED, Hunk, LineIndex
+
+
+class FileStats(object):
+    """
+    Line counts of the diff of one file, counted from its decoded JSON without building
+    objects for its lines.
+
+    path: the path of the file after the change, or before it if the file was deleted.
+    src_path: the path before the change if it differs, None otherwise.
+    """
+    __slots__ = ('path', 'src_path', 'hunks', 'added', 'removed', 'context', 'binary', 'truncated')
+
+    def __init__(self, diff_file):
+        source = diff_file.get("source")
+        destination = diff_file.get("destination")
+        self.path = (destination or source or {}).get("toString")
+        src_path = source.get("toString") if source else None
+        self.src_path = src_path if src_path != self.path else None
+        self.binary = diff_file.get("binary", False)
+        self.truncated = diff_file.get("truncated", False)
+        hunks = diff_file.get("hunks") or ()
+        self.hunks = len(hunks)
+        added = removed = context = 0
+        for hunk in hunks:
+            if hunk.get("truncated"):
+                self.truncated = True
+            for segment in hunk.get("segments", ()):
+                count = len(segment.get("lines", ()))
+                kind = segment["type"]
+                if kind == ADDED:
+                    added += count
+                elif kind == REMOVED:
+                    removed += count
+                else:
+                    context += count
+        self.added, self.removed, self.context = added, removed, context
+
+    @property
+    def changed(self):
+        return self.added + self.removed
+
+    def __repr__(self):
+        return '<FileStats %s +%d -%d>' % (self.path, self.added, self.removed)
+
+
+class DiffStats(object):
+    """
+    Line counts of a diff of several files: the FileStats of each file, and their totals.
+    """
+    __slots__ = ('files', 'hunks', 'added', 'removed', 'context', 'truncated')
+
+    def __init__(self, diff_files=()):
+        self.files = []
+        self.hunks = self.added = self.removed = self.context = 0
+        self.truncated = False
+        for diff_file in diff_files:
+            self.add(diff_file if isinstance(diff_file, FileStats) else FileStats(diff_file))
+
+    def add(self, stats):
+        self.files.append(stats)
+        self.hunks += stats.hunks
+        self.added += stats.added
+        self.removed += stats.removed
+        self.context += stats.context
+        self.truncated = self.truncated or stats.truncated
+
+    @property
+    def changed(self):
+        return self.added + self.removed
+
+    def __repr__(self):
+        return '<DiffStats %d files +%d -%d>' % (len(self.files), self.added, self.removed)
 
 
 class Diff:
+    """
+    The diff of one file, reading its fields from the decoded JSON it was created with.
+    """
+    __slots__ = ('_data', '_source', '_destination', '_structured_hunks', '_index')
+
     def __init__(self, diff_file):
+        self._data = diff_file
+        self._structured_hunks = None
+        self._index = None
         source_detail = diff_file.get("source", None)
-        if source_detail is not None:
-            self.source = FileInfo(diff_file["source"])
-        else:
-            self.source = None
-
+        self._source = FileInfo(source_detail) if source_detail is not None else None
         dest_detail = diff_file.get("destination", None)
-        if dest_detail is not None:
-            self.destination = FileInfo(diff_file["destination"])
-        else:
-            self.destination = None
-
-        self.hunks = diff_file.get("hunks", [])
-        self.truncated = diff_file.get("truncated", [])
-        self.line_comments = diff_file.get("lineComments", [])
+        self._destination = FileInfo(dest_detail) if dest_detail is not None else None
 
     def _get_source(self):
         return self._source
@@ -32,22 +102,71 @@ class Diff:
         self._destination = value
 
     def _get_hunks(self):
-        return self._hunks
+        return self._data.setdefault("hunks", [])
 
     def _set_hunks(self, value):
-        self._hunks = value
+        self._data["hunks"] = value
+        self._structured_hunks = None
+        self._index = None
 
     def _get_truncated(self):
-        return self._truncated
+        return self._data.get("truncated", [])
 
     def _set_truncated(self, value):
-        self._truncated = value
+        self._data["truncated"] = value
 
     def _get_line_comments(self):
-        return self._line_comments
+        return self._data.setdefault("lineComments", [])
 
     def _set_line_comments(self, value):
-        self._line_comments = value
+        self._data["lineComments"] = value
+
+    @property
+    def stats(self):
+        """
+        The FileStats of this file.
+        """
+        return FileStats(self._data)
+
+    @property
+    def structured_hunks(self):
+        """
+        The hunks as Hunk objects, built on first use.
+        """
+        if self._structured_hunks is None:
+            self._structured_hunks = [Hunk(hunk) for hunk in self.hunks]
+        return self._structured_hunks
+
+    @property
+    def index(self):
+        """
+        A LineIndex of the lines in the diff, built on first use.
+        """
+        if self._index is None:
+            self._index = LineIndex(self.structured_hunks)
+        return self._index
+
+    def anchor(self, line, fileType="TO"):
+        """
+        The comment anchor of a line of the file, as keyword arguments of PullRequest.comment(),
+        or None if the line is not part of the diff.
+
+        fileType: TO if line is a line number in the destination, FROM in the source.
+        """
+        if fileType == "TO":
+            lineType = self.index.destination(line)
+        else:
+            lineType = self.index.source(line)
+        if lineType is None:
+            return None
+        path = self._destination if self._destination is not None else self._source
+        return dict(srcPath=path.toString, fileLine=line, lineType=lineType, fileType=fileType)
+
+    def anchors(self, lines, fileType="TO"):
+        """
+        The anchors of several lines, see anchor().
+        """
+        return [self.anchor(line, fileType) for line in lines]
 
     source = property(_get_source, _set_source, doc="The source of a file in the diff.")
 
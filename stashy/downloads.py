@@ -0,0 +1,307 @@
+"""
+Streaming downloads of file content and repository archives.
+
+Responses are read in chunks of DOWNLOAD_CHUNK_SIZE and written out as they arrive, so that
+memory use does not depend on the size of the file.
+"""
+import os
+import re
+from urllib.parse import quote
+
+import requests
+
+from .errors import GenericException, maybe_throw, then
+from .helpers import ResourceBase
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+# errors of a response body that stopped arriving, after which a download can be resumed
+_INTERRUPTED = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+# bytes <first>-<last>/<total> in partial responses, bytes */<total> in 416 responses
+_CONTENT_RANGE = re.compile(r'^bytes (?:(\d+)-\d+|\*)/(\d+|\*)$')
+
+
+class DownloadSizeMismatch(Exception):
+    """
+    Raised when a download ends with another number of bytes than expected. The bytes
+    received are left in the partial file.
+    """
+    def __init__(self, path, expected, received):
+        super(DownloadSizeMismatch, self).__init__('%s: expected %d bytes, received %d' % (path, expected, received))
+        self.path = path
+        self.expected = expected
+        self.received = received
+
+
+def range_headers(start=None, end=None):
+    """
+    The headers requesting bytes start (inclusive) to end (exclusive); either may be None.
+
+    Ranges count bytes of the response as sent, so compression is turned off for them.
+    """
+    if start is None and end is None:
+        return {}
+    if end is None:
+        spec = 'bytes=%d-' % start
+    elif end <= (start or 0):
+        raise ValueError("end must be greater than start")
+    else:
+        spec = 'bytes=%d-%d' % (start or 0, end - 1)
+    return {'Range': spec, 'Accept-Encoding': 'identity'}
+
+
+def _sliced(chunks, start, end):
+    # for a server that ignored the Range header and sent the whole content
+    position = 0
+    for chunk in chunks:
+        chunk_start, position = position, position + len(chunk)
+        if start is not None and position <= start:
+            continue
+        if end is not None and chunk_start >= end:
+            return
+        yield chunk[max(0, (start or 0) - chunk_start):None if end is None else end - chunk_start]
+
+
+def ranged_chunks(response, start=None, end=None, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """
+    The chunks of the body of a response to a request for range_headers(start, end).
+    """
+    if response.status_code == 416:
+        # the range starts past the end of the content
+        return
+    maybe_throw(response)
+    chunks = response.iter_content(chunk_size)
+    if response.status_code != 206 and (start or end is not None):
+        chunks = _sliced(chunks, start, end)
+    for chunk in chunks:
+        if chunk:
+            yield chunk
+
+
+def ranged_content(response, start=None, end=None):
+    if response.status_code == 416:
+        return b''
+    maybe_throw(response)
+    if response.status_code != 206 and (start or end is not None):
+        return response.content[start:end]
+    return response.content
+
+
+def write_chunks(chunks, target, mode='wb'):
+    """
+    Write chunks to target, a path or a binary file object, returning the number of bytes
+    written. A file object is left open.
+    """
+    if hasattr(target, 'write'):
+        return _write(chunks, target)
+    with open(target, mode) as f:
+        return _write(chunks, f)
+
+
+def _write(chunks, f):
+    written = 0
+    for chunk in chunks:
+        f.write(chunk)
+        written += len(chunk)
+    return written
+
+
+class RawFile(ResourceBase):
+    """
+    The raw content of a file in a repository, downloaded when it is used.
+
+    With the asyncio client the content is read in one piece: read() and save() then return
+    awaitables, and chunks() is not supported.
+    """
+    __slots__ = ('_at',)
+
+    def __init__(self, path, at, url, client, parent):
+        super(RawFile, self).__init__(url + '/raw/' + quote(path.lstrip('/')), client, parent)
+        self._at = at
+
+    def _get(self, start=None, end=None, stream=False):
+        params = dict(at=self._at) if self._at is not None else None
+        kw = dict(stream=True) if stream else {}
+        return self._client.get(self.url(), params=params, headers=range_headers(start, end), **kw)
+
+    def chunks(self, start=None, end=None, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """
+        Iterate over the content in chunks of up to chunk_size bytes as they are received.
+
+        start, end: read only the bytes from start (inclusive) to end (exclusive), as in a
+            slice; requested with a Range header. A range starting past the end of the file
+            is empty.
+        """
+        if self._client.is_async:
+            raise TypeError("chunks() is not supported by the asyncio client, use read() or save()")
+        response = self._get(start, end, stream=True)
+        try:
+            for chunk in ranged_chunks(response, start, end, chunk_size):
+                yield chunk
+        finally:
+            response.close()
+
+    def __iter__(self):
+        return self.chunks()
+
+    def read(self, start=None, end=None):
+        """
+        The content, or the bytes from start to end, as bytes.
+        """
+        if self._client.is_async:
+            return then(self._get(start, end), lambda response: ranged_content(response, start, end))
+        return b''.join(self.chunks(start, end))
+
+    def save(self, target, start=None, end=None, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """
+        Write the content, or the bytes from start to end, to target (a path or a binary
+        file object) while it is received. Returns the number of bytes written.
+        """
+        if self._client.is_async:
+            return then(self.read(start, end), lambda content: write_chunks([content], target))
+        return write_chunks(self.chunks(start, end, chunk_size), target)
+
+
+def _content_range(response):
+    """
+    (first byte, total size) of a response, either None if not given, or None if it has no
+    valid Content-Range.
+    """
+    match = _CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+    if match is None:
+        return None
+    first, total = match.groups()
+    return None if first is None else int(first), None if total == '*' else int(total)
+
+
+def _content_length(response):
+    length = response.headers.get('Content-Length')
+    if length and length.isdigit() and not response.headers.get('Content-Encoding'):
+        return int(length)
+    return None
+
+
+class Archive(ResourceBase):
+    """
+    An archive of a repository as generated by the server, downloaded when it is used.
+
+    With the asyncio client save() returns an awaitable, reads the archive in one piece and
+    does not resume; chunks() is not supported.
+    """
+    __slots__ = ('_params',)
+
+    def __init__(self, url, client, parent, at=None, format=None, prefix=None, paths=None):
+        super(Archive, self).__init__(url + '/archive', client, parent)
+        params = dict(at=at, format=format, prefix=prefix, path=list(paths) if paths else None)
+        self._params = dict((key, value) for key, value in params.items() if value is not None)
+
+    def _get(self, headers, stream=True):
+        # compression would make the bytes received differ from the byte offsets of ranges
+        headers = dict(headers, **{'Accept-Encoding': 'identity'})
+        kw = dict(stream=True) if stream else {}
+        return self._client.get(self.url(), params=self._params, headers=headers, **kw)
+
+    def chunks(self, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """
+        Iterate over the archive in chunks of up to chunk_size bytes as they are received.
+        """
+        if self._client.is_async:
+            raise TypeError("chunks() is not supported by the asyncio client, use save()")
+        response = self._get({})
+        try:
+            for chunk in ranged_chunks(response, chunk_size=chunk_size):
+                yield chunk
+        finally:
+            response.close()
+
+    def __iter__(self):
+        return self.chunks()
+
+    def save(self, path, size=None, resume=True, attempts=5, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """
+        Download the archive to path, returning its size.
+
+        The archive is written to path + '.part' as it is received, and renamed to path once
+        complete. If the download is interrupted, it is resumed from the bytes received so
+        far with a Range request, up to attempts times; with resume, a .part file left by an
+        earlier call is resumed as well. A server sending the whole archive again instead of
+        the range restarts the download. Resuming relies on the archive being generated
+        identically, so at should be a commit rather than a branch.
+
+        size: the expected size in bytes. Otherwise the size announced by the server, if
+            any, is checked. A different size raises DownloadSizeMismatch.
+        """
+        if self._client.is_async:
+            return then(self._get({}, stream=False), lambda response: self._write_whole(response, path, size))
+
+        part = path + '.part'
+        written = os.path.getsize(part) if resume and os.path.exists(part) else 0
+        total = etag = None
+        failures = 0
+        # set when the server answered a range with other bytes, to ask for the whole archive
+        whole = False
+        with open(part, 'ab' if written else 'wb') as f:
+            while True:
+                headers = {}
+                if written and not whole:
+                    headers.update(range_headers(written))
+                    if etag is not None:
+                        headers['If-Range'] = etag
+                response = None
+                try:
+                    response = self._get(headers)
+                    if response.status_code == 416 and written:
+                        total = (_content_range(response) or (None, None))[1]
+                        if total == written:
+                            # the .part file already holds the whole archive
+                            break
+                        # the .part file is longer than the archive, or its size is unknown
+                        f.seek(0)
+                        f.truncate()
+                        written = 0
+                        continue
+                    maybe_throw(response)
+                    if response.status_code == 206:
+                        content_range = _content_range(response)
+                        if content_range is None or content_range[0] != written:
+                            if not written:
+                                # partial content that was not asked for
+                                raise GenericException(response)
+                            # not the bytes asked for: start over without a range
+                            f.seek(0)
+                            f.truncate()
+                            written = 0
+                            whole = True
+                            continue
+                        total = content_range[1]
+                    else:
+                        f.seek(0)
+                        f.truncate()
+                        written = 0
+                        total = _content_length(response)
+                    whole = False
+                    etag = response.headers.get('ETag', etag)
+                    for chunk in response.iter_content(chunk_size):
+                        f.write(chunk)
+                        written += len(chunk)
+                    break
+                except _INTERRUPTED:
+                    failures += 1
+                    if not resume or failures >= attempts:
+                        raise
+                finally:
+                    if response is not None:
+                        response.close()
+
+        expected = size if size is not None else total
+        if expected is not None and written != expected:
+            raise DownloadSizeMismatch(part, expected, written)
+        os.replace(part, path)
+        return written
+
+    def _write_whole(self, response, path, size):
+        maybe_throw(response)
+        if size is not None and len(response.content) != size:
+            raise DownloadSizeMismatch(path, size, len(response.content))
+        return write_chunks([response.content], path)
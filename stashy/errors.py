@@ -1,6 +1,10 @@
+import inspect
 from functools import wraps
 from decorator import decorator
 
+from .codec import loads_for
+from .tracing import call
+
 class NotFoundException(Exception):
     def __init__(self, response):
         try:
@@ -50,18 +54,55 @@ def maybe_throw(response):
             raise e
 
 
-@decorator
-def ok_or_error(fn, *args, **kw):
-    response = fn(*args, **kw)
+def then(result, callback):
+    """
+    Apply callback to result, or to what result resolves to if it is awaitable.
+
+    This lets the same resource code run against both the blocking and the asyncio client.
+    """
+    if inspect.isawaitable(result):
+        return _then(result, callback)
+    return callback(result)
+
+
+async def _then(result, callback):
+    value = callback(await result)
+    if inspect.isawaitable(value):
+        value = await value
+    return value
+
+
+def _ok(response):
     maybe_throw(response)
     return response.ok
 
 
+def _json_or_text(loads):
+    def decode(response):
+        maybe_throw(response)
+        try:
+            return loads(response.content)
+        except ValueError:
+            return response.text
+    return decode
+
+
+@decorator
+def ok_or_error(fn, *args, **kw):
+    return then(call(args[0] if args else None, fn, args, kw), _ok)
+
+
 @decorator
 def response_or_error(fn, *args, **kw):
-    response = fn(*args, **kw)
-    maybe_throw(response)
-    try:
-        return response.json()
-    except ValueError:
-        return response.text
+    resource = args[0] if args else None
+    return then(call(resource, fn, args, kw), _json_or_text(loads_for(resource)))
+
+
+@decorator
+def json_content(fn, *args, **kw):
+    """
+    Decode the response body as JSON without checking the status code.
+    """
+    resource = args[0] if args else None
+    loads = loads_for(resource)
+    return then(call(resource, fn, args, kw), lambda response: loads(response.content))
@@ -1,40 +1,41 @@
 class FileInfo:
+    """
+    A file of a diff, reading its fields from the decoded JSON it was created with.
+    """
+    __slots__ = ('_data',)
+
     def __init__(self, file_info):
-        self.components = file_info["components"]
-        self.parent = file_info["parent"]
-        self.name = file_info["name"]
-        self.extension = file_info.get("extension","")
-        self.toString = file_info["toString"]
+        self._data = file_info
 
     def _get_components(self):
-        return self._components
+        return self._data["components"]
 
     def _set_components(self, value):
-        self._components = value
+        self._data["components"] = value
 
     def _get_parent(self):
-        return self._parent
+        return self._data["parent"]
 
     def _set_parent(self, value):
-        self._parent = value
+        self._data["parent"] = value
 
     def _get_name(self):
-        return self._name
+        return self._data["name"]
 
     def _set_name(self, value):
-        self._name = value
+        self._data["name"] = value
 
     def _get_extension(self):
-        return self._extension
+        return self._data.get("extension", "")
 
     def _set_extension(self, value):
-        self._extension = value
+        self._data["extension"] = value
 
     def _get_to_string(self):
-        return self._toString
+        return self._data["toString"]
 
     def _set_to_string(self, value):
-        self._toString = value
+        self._data["toString"] = value
 
     components = property(_get_components, _set_components, doc="The components the file reside in.")
 
@@ -1,4 +1,19 @@
+import asyncio
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from .errors import maybe_throw
+from .metrics import endpoint_template
+from .streaming import StreamingPage
+
+# page size Bitbucket Server uses when no limit is requested
+DEFAULT_PAGE_SIZE = 25
+
+# bytes read at a time from the response when streaming pages
+STREAM_CHUNK_SIZE = 16 * 1024
 
 
 def add_json_headers(kw):
@@ -14,153 +29,529 @@ def add_json_headers(kw):
 
 
 class ResourceBase(object):
+    # resource handles are created on every navigation step, so they are kept small: the URL
+    # variants of the other APIs are derived from _tail when needed instead of being stored
+    __slots__ = ('_client', '_parent', '_url', '_tail', '_api_paths', '_children')
+
     def __init__(self, url, client, parent, api_path=None,
                  branches_api_path=None, git_api_path=None, sync_api_path=None, keys_api_path=None):
         self._client = client
         self._parent = parent
+        # created when the first nested resource is cached, see Nested
+        self._children = None
+        core_api_path = client.core_api_path
         if api_path is None:
-            api_path = self._client.core_api_path
-            branches_api_path = self._client.branches_api_path
-            git_api_path = self._client.git_api_path
-            sync_api_path = self._client.sync_api_path
-            keys_api_path = self._client.keys_api_path
-        if branches_api_path is None:
-            branches_api_path = self._client.branches_api_path
-        if git_api_path is None:
-            git_api_path = self._client.git_api_path
-        if sync_api_path is None:
-            sync_api_path = self._client.sync_api_path
-        if keys_api_path is None:
-            keys_api_path = self._client.keys_api_path
+            api_path = core_api_path
+            self._api_paths = None
+        elif branches_api_path is None and git_api_path is None and sync_api_path is None and keys_api_path is None:
+            self._api_paths = None
+        else:
+            self._api_paths = (branches_api_path, git_api_path, sync_api_path, keys_api_path)
 
         # make sure we're only prefixing with one api path
         if url.startswith(api_path):
-            self._url = url
-            self._branchesurl = url.replace(api_path, branches_api_path)
-            self._giturl = url.replace(api_path, git_api_path)
-            self._syncurl = url.replace(api_path, sync_api_path)
-            self._keysurl = url.replace(api_path, keys_api_path)
-        elif url.startswith(self._client.core_api_path):
-            self._url = url.replace(self._client.core_api_path, api_path)
-            self._branchesurl = url.replace(self._client.core_api_path,
-                                            branches_api_path)
-            self._giturl = url.replace(self._client.core_api_path,
-                                            git_api_path)
-            self._syncurl = url.replace(self._client.core_api_path, sync_api_path)
-            self._keysurl = url.replace(self._client.core_api_path, keys_api_path)
-
+            tail = url[len(api_path):]
+        elif url.startswith(core_api_path):
+            tail = url[len(core_api_path):]
+        elif url.startswith('/'):
+            tail = url
         else:
-            if url.startswith('/'):
-                url = url[1:]
-            self._url = '{0}/{1}'.format(api_path, url)
-            self._branchesurl = '{0}/{1}'.format(branches_api_path, url)
-            self._giturl = '{0}/{1}'.format(git_api_path, url)
-            self._syncurl = '{0}/{1}'.format(sync_api_path, url)
-            self._keysurl = '{0}/{1}'.format(keys_api_path, url)
+            tail = '/' + url
+        self._tail = tail
+        self._url = api_path + tail
 
+    def _variant_url(self, index, default):
+        api_path = self._api_paths[index] if self._api_paths is not None else None
+        return (api_path or default) + self._tail
 
+    @property
+    def _branchesurl(self):
+        return self._variant_url(0, self._client.branches_api_path)
 
+    @property
+    def _giturl(self):
+        return self._variant_url(1, self._client.git_api_path)
+
+    @property
+    def _syncurl(self):
+        return self._variant_url(2, self._client.sync_api_path)
+
+    @property
+    def _keysurl(self):
+        return self._variant_url(3, self._client.keys_api_path)
 
     def url(self, resource_url="", is_branches=False, is_git=False, is_sync=False, is_keys=False):
         if resource_url and not resource_url.startswith("/"):
             resource_url = "/" + resource_url
         if is_branches:
-            if self._url.endswith("/"):
-                url = self._branchesurl[:-1]
-            else :
-                url = self._branchesurl
+            url = self._branchesurl
         elif is_git:
-            if self._url.endswith("/"):
-                url = self._giturl[:-1]
-            else :
-                url = self._giturl
+            url = self._giturl
         elif is_sync:
-            if self._url.endswith("/"):
-                url = self._syncurl[:-1]
-            else :
-                url = self._syncurl
+            url = self._syncurl
         elif is_keys:
-            if self._url.endswith("/"):
-                url = self._keysurl[:-1]
-            else :
-                url = self._keysurl
+            url = self._keysurl
         else:
-            if self._url.endswith("/"):
-                url = self._url[:-1]
-            else :
-                url = self._url
+            url = self._url
+        if self._url.endswith("/"):
+            url = url[:-1]
 
         return url + resource_url
 
     def paginate(self, resource_url, params=None, values_key='values',
-                 is_branches=False, is_git=False, is_keys=False):
+                 is_branches=False, is_git=False, is_keys=False, prefetch=None, workers=None,
+                 limit=None, adaptive=None, stream=None):
+        """
+        Iterate over the items of a paged resource, following nextPageStart.
+
+        The paging options default to the corresponding client settings.
+
+        limit: number of items to request per page. Defaults to params['limit'], then to the
+            client's page_size, then to the server default.
+        adaptive: tune the limit from page to page, starting at limit: it grows towards the
+            client's max_page_size while the latency per item improves, and shrinks when pages
+            get slow or the server caps it. Ignored when workers is set or pages are streamed.
+        prefetch: number of pages to read ahead in the background while the current page
+            is being consumed.
+        workers: number of pages to request concurrently at consecutive start offsets, using
+            limit (or the server default of 25) as the page size. Items are still returned in
+            order. Only suitable for resources paged by plain offsets. Takes precedence over
+            prefetch.
+        stream: decode each page incrementally while it downloads, so that the first item is
+            available early and only about one item is held in memory at a time. Pages are then
+            read strictly one after the other: prefetch and workers are ignored. Not supported
+            by the asyncio client.
+        """
         url = self.url(resource_url, is_branches=is_branches, is_git=is_git, is_keys=is_keys)
-
+        params = dict(params) if params else {}
+        if limit is None:
+            limit = params.get('limit') or self._client.page_size
+        if adaptive is None:
+            adaptive = self._client.adaptive_paging
+        if prefetch is None:
+            prefetch = self._client.prefetch
+        if workers is None:
+            workers = self._client.workers
+        if stream is None:
+            stream = self._client.stream_pages
+        streamed = stream and not self._client.is_async
+        if streamed:
+            prefetch = workers = 0
+
+        # a streamed page is still being read when the next one is requested, so its latency
+        # can't size the next: streamed walks use the fixed limit
+        sizer = None
+        if adaptive and not workers and not streamed:
+            sizer = AdaptivePageSize(int(limit or DEFAULT_PAGE_SIZE), self._client.max_page_size,
+                                     self._client.slow_page_seconds)
+        elif limit:
+            params['limit'] = limit
+
+        if self._client.is_async:
+            return self._apaginate(url, params, values_key, prefetch, workers, sizer)
+        return self._paginate(url, params, values_key, prefetch, workers, sizer, stream)
+
+    def _page_kw(self, params, start):
+        kw = {}
+        if params:
+            kw['params'] = dict(params)
+        if start is not None:
+            kw.setdefault('params', {})
+            kw['params']['start'] = start
+        return kw
+
+    def _start_walk(self, url):
+        tracer = self._client.tracer
+        if tracer is None:
+            return None
+        return tracer.start('paginate %s' % endpoint_template(url), resource=type(self).__name__, path=url)
+
+    def _fetch_page(self, url, params, start, walk=None):
+        if walk is not None:
+            with walk.tracer.span('page', parent=walk, start=start) as span:
+                data = self._fetch_page(url, params, start)
+                span.set(size=data.get('size'))
+                return data
+        response = self._client.get(url, **self._page_kw(params, start))
+        maybe_throw(response)
+        return self._client.codec.loads(response.content)
+
+    def _stream_page(self, url, params, start, values_key, walk=None):
+        if walk is not None:
+            # the span ends once the headers are in; the body is decoded as the items are consumed
+            with walk.tracer.span('page', parent=walk, start=start, stream=True):
+                return self._stream_page(url, params, start, values_key)
+        response = self._client.get(url, stream=True, **self._page_kw(params, start))
+        maybe_throw(response)
+        return response, StreamingPage(response.iter_content(STREAM_CHUNK_SIZE), values_key,
+                                       self._client.codec.loads)
+
+    def _streamed_pages(self, url, params, values_key, walk=None):
         more = True
         start = None
         while more:
-            kw = {}
-            if params:
-                kw['params'] = params
-            if start is not None:
-                kw.setdefault('params', {})
-                kw['params']['start'] = start
-
-            response = self._client.get(url, **kw)
-            maybe_throw(response)
+            response, data = self._stream_page(url, params, start, values_key, walk)
+            try:
+                yield data
+
+                if not values_key in data or data['isLastPage'] or data['nextPageStart'] == None:
+                    more = False
+                else:
+                    more = True
+                    start = data['nextPageStart']
+            finally:
+                response.close()
+
+    def _pages(self, url, params, values_key, sizer=None, walk=None):
+        more = True
+        start = None
+        while more:
+            if sizer is None:
+                data = self._fetch_page(url, params, start, walk)
+            else:
+                params['limit'] = requested = sizer.limit
+                started = time.monotonic()
+                data = self._fetch_page(url, params, start, walk)
+                sizer.update(requested, data, time.monotonic() - started, values_key)
+            yield data
 
-            data = response.json()
+            if not values_key in data or data['isLastPage'] or data['nextPageStart'] == None:
+                more = False
+            else:
+                more = True
+                start = data['nextPageStart']
 
-            if not values_key in data:
-                return
-            for item in data[values_key]:
-                yield item
+    def _parallel_pages(self, url, params, values_key, workers, walk=None):
+        offsets = _Offsets(params)
+        pending = collections.deque()
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            while True:
+                while len(pending) < workers:
+                    start = offsets.next()
+                    pending.append((start, pool.submit(self._fetch_page, url, offsets.params, start, walk)))
+
+                start, future = pending.popleft()
+                data = future.result()
+                yield data
+
+                if not values_key in data or data['isLastPage'] or data['nextPageStart'] == None:
+                    return
+                if not offsets.follows(start, data['nextPageStart']):
+                    for _, future in pending:
+                        future.cancel()
+                    pending.clear()
+        finally:
+            for _, future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    def _paginate(self, url, params, values_key, prefetch, workers, sizer, stream=False):
+        walk = self._start_walk(url)
+        if stream:
+            pages = self._streamed_pages(url, params, values_key, walk)
+        elif workers:
+            pages = self._parallel_pages(url, params, values_key, workers, walk)
+        else:
+            pages = self._pages(url, params, values_key, sizer, walk)
+            if prefetch:
+                pages = read_ahead(pages, prefetch)
+
+        error = None
+        try:
+            for data in pages:
+                if not values_key in data:
+                    return
+                for item in data[values_key]:
+                    yield item
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if walk is not None:
+                walk.finish(error)
+
+    async def _afetch_page(self, url, params, start, walk=None):
+        if walk is not None:
+            with walk.tracer.span('page', parent=walk, start=start) as span:
+                data = await self._afetch_page(url, params, start)
+                span.set(size=data.get('size'))
+                return data
+        response = await self._client.get(url, **self._page_kw(params, start))
+        maybe_throw(response)
+        return self._client.codec.loads(response.content)
+
+    async def _apages(self, url, params, values_key, sizer=None, walk=None):
+        more = True
+        start = None
+        while more:
+            if sizer is None:
+                data = await self._afetch_page(url, params, start, walk)
+            else:
+                params['limit'] = requested = sizer.limit
+                started = time.monotonic()
+                data = await self._afetch_page(url, params, start, walk)
+                sizer.update(requested, data, time.monotonic() - started, values_key)
+            yield data
 
-            if data['isLastPage'] or data['nextPageStart'] == None:
+            if not values_key in data or data['isLastPage'] or data['nextPageStart'] == None:
                 more = False
             else:
                 more = True
                 start = data['nextPageStart']
 
+    async def _aparallel_pages(self, url, params, values_key, workers, walk=None):
+        offsets = _Offsets(params)
+        pending = collections.deque()
+        try:
+            while True:
+                while len(pending) < workers:
+                    start = offsets.next()
+                    pending.append((start, asyncio.ensure_future(self._afetch_page(url, offsets.params, start, walk))))
+
+                start, task = pending.popleft()
+                data = await task
+                yield data
+
+                if not values_key in data or data['isLastPage'] or data['nextPageStart'] == None:
+                    return
+                if not offsets.follows(start, data['nextPageStart']):
+                    for _, task in pending:
+                        task.cancel()
+                    pending.clear()
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+    async def _apaginate(self, url, params, values_key, prefetch, workers, sizer):
+        walk = self._start_walk(url)
+        if workers:
+            pages = self._aparallel_pages(url, params, values_key, workers, walk)
+        else:
+            pages = self._apages(url, params, values_key, sizer, walk)
+            if prefetch:
+                pages = aread_ahead(pages, prefetch)
+
+        error = None
+        try:
+            async for data in pages:
+                if not values_key in data:
+                    return
+                for item in data[values_key]:
+                    yield item
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if walk is not None:
+                walk.finish(error)
+
+
+class AdaptivePageSize(object):
+    """
+    Chooses the limit for each page request from the latency of the previous ones.
+
+    The limit doubles, up to maximum, while the time per item keeps improving, and halves
+    when a page takes longer than slow seconds. If the server applies a smaller limit than
+    requested, that becomes the new maximum.
+    """
+    def __init__(self, limit, maximum, slow):
+        self.maximum = maximum
+        self.limit = min(limit, maximum)
+        self.slow = slow
+        self._best = None
+
+    def update(self, requested, data, elapsed, values_key='values'):
+        returned = len(data.get(values_key) or ())
+        applied = data.get('limit')
+        if applied is None and returned < requested and not data.get('isLastPage', True):
+            applied = returned
+        if applied and applied < requested:
+            self.maximum = self.limit = applied
+            return
+
+        if elapsed > self.slow:
+            self.limit = max(1, self.limit // 2)
+        elif returned == requested:
+            per_item = elapsed / returned
+            if self._best is None or per_item < self._best:
+                self._best = per_item
+                self.limit = min(self.maximum, self.limit * 2)
+
+
+class _Offsets(object):
+    """
+    Start offsets for fetching pages of a fixed size ahead of the responses.
+
+    If the server answers with a nextPageStart other than the expected one (e.g. because it
+    capped the requested limit), the offsets are re-based on what the server returned and
+    any pages requested in the meantime must be discarded.
+    """
+    def __init__(self, params):
+        self.params = dict(params or {})
+        self.limit = int(self.params.get('limit') or DEFAULT_PAGE_SIZE)
+        self.params['limit'] = self.limit
+        self._next = int(self.params.pop('start', 0))
+
+    def next(self):
+        start = self._next
+        self._next += self.limit
+        return start
+
+    def follows(self, start, next_page_start):
+        if next_page_start == start + self.limit:
+            return True
+        if next_page_start > start:
+            self.limit = next_page_start - start
+            self.params['limit'] = self.limit
+        self._next = next_page_start
+        return False
+
+
+_DONE = object()
+
+
+def read_ahead(iterator, depth):
+    """
+    Advance iterator on a background thread, buffering at most depth items ahead of the consumer.
+
+    Exceptions raised by the iterator are re-raised in the consumer. Closing the returned
+    generator stops the background thread once its current step finishes.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    return
+            put((_DONE, None))
+        except Exception as e:
+            put((_DONE, e))
+
+    producer = threading.Thread(target=produce)
+    producer.daemon = True
+    producer.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+async def aread_ahead(iterator, depth):
+    """
+    asyncio counterpart of read_ahead, advancing an async iterator in a separate task.
+    """
+    buffer = asyncio.Queue(maxsize=depth)
+
+    async def produce():
+        try:
+            async for item in iterator:
+                await buffer.put((item, None))
+            await buffer.put((_DONE, None))
+        except Exception as e:
+            await buffer.put((_DONE, e))
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            item, error = await buffer.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        producer.cancel()
+
+
+def collect(items):
+    """
+    Return the elements of a paginated iterator as a list.
+
+    With the asyncio client paginate returns an async iterator, in which case this
+    returns an awaitable that resolves to the list.
+    """
+    if hasattr(items, '__aiter__'):
+        return _acollect(items)
+    return list(items)
+
+
+async def _acollect(items):
+    return [item async for item in items]
+
 
 class IterableResource(object):
+    __slots__ = ()
+
     def __iter__(self):
         """
         Convenience method around self.all()
         """
         return self.all()
 
-    def all(self, params = None):
+    def __aiter__(self):
+        """
+        Convenience method around self.all() for the asyncio client
+        """
+        return self.all()
+
+    def all(self, params = None, **paging):
         """
         Retrieve all the resources.
+
+        paging: options passed through to paginate, e.g. prefetch=2
         """
-        return self.paginate("", params = params)
+        return self.paginate("", params = params, **paging)
 
-    def list(self, params = None):
+    def list(self, params = None, **paging):
         """
         Convenience method to return a list (rather than iterable) of all elements
         """
-        return list(self.all(params=params))
+        return collect(self.all(params=params, **paging))
 
 
 class FilteredIterableResource(IterableResource):
-    def all(self, filter=None):
+    __slots__ = ()
+
+    def all(self, filter=None, **paging):
         """
         Retrieve all the resources, optionally modified by filter.
         """
         params = {}
         if filter:
             params['filter'] = filter
-        return self.paginate("", params)
+        return self.paginate("", params, **paging)
 
-    def list(self, filter=None):
+    def list(self, filter=None, **paging):
         """
         Convenience method to return a list (rather than iterable) of all elements
         """
-        return list(self.all(filter))
+        return collect(self.all(filter, **paging))
 
 
 class Nested(object):
+    """
+    A child resource, created on first access and then kept by its parent.
+    """
+    __slots__ = ('cls', 'relative_path')
+
     def __init__(self, cls, relative_path=''):
 
         # nested object for clarity of usage, no effect on resource url
@@ -179,10 +570,18 @@ class Nested(object):
         self.cls = cls
 
     def __get__(self, instance, kind):
-        parent_url = instance._url
-        if parent_url.endswith("/"):
-            parent_url = parent_url[:-1]
-
-        url = parent_url + self.relative_path
-        return self.cls(url=url, client=instance._client, parent=instance)
+        if instance is None:
+            return self
+        children = instance._children
+        if children is None:
+            children = instance._children = {}
+        child = children.get(self)
+        if child is None:
+            parent_url = instance._url
+            if parent_url.endswith("/"):
+                parent_url = parent_url[:-1]
+
+            url = parent_url + self.relative_path
+            child = children[self] = self.cls(url=url, client=instance._client, parent=instance)
+        return child
 
@@ -0,0 +1,180 @@
+"""
+A compact model of the hunks of a file diff.
+
+Bitbucket returns hunks as nested JSON: each hunk has segments of ADDED, REMOVED or CONTEXT
+lines, each line a dict with its source and destination line numbers and its text. A Hunk
+keeps the line numbers in arrays and the type once per segment; Segment and Line objects are
+views created when asked for. A LineIndex answers whether a line of either version of the
+file is part of the diff, and as which type, by bisecting those arrays.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+
+ADDED = 'ADDED'
+REMOVED = 'REMOVED'
+CONTEXT = 'CONTEXT'
+
+SEGMENT_TYPES = (CONTEXT, ADDED, REMOVED)
+_CODES = dict((segment_type, code) for code, segment_type in enumerate(SEGMENT_TYPES))
+_ADDED, _REMOVED = _CODES[ADDED], _CODES[REMOVED]
+
+
+class Line(object):
+    """
+    A line of a segment. source and destination are its line numbers in the two versions of
+    the file; for an added line source is where it would be in the source, and vice versa.
+    """
+    __slots__ = ('source', 'destination', 'type', 'text')
+
+    def __init__(self, source, destination, type, text=None):
+        self.source = source
+        self.destination = destination
+        self.type = type
+        self.text = text
+
+    def __repr__(self):
+        return '<Line %s %s/%s>' % (self.type, self.source, self.destination)
+
+
+class Segment(object):
+    """
+    A run of lines of the same type within a hunk.
+    """
+    __slots__ = ('hunk', '_index')
+
+    def __init__(self, hunk, index):
+        self.hunk = hunk
+        self._index = index
+
+    @property
+    def type(self):
+        return SEGMENT_TYPES[self.hunk._segment_types[self._index]]
+
+    @property
+    def start(self):
+        """
+        The position of the segment's first line in the hunk.
+        """
+        return self.hunk._segment_starts[self._index]
+
+    @property
+    def end(self):
+        starts = self.hunk._segment_starts
+        return starts[self._index + 1] if self._index + 1 < len(starts) else len(self.hunk.sources)
+
+    @property
+    def truncated(self):
+        return self._index in self.hunk._truncated_segments
+
+    def __len__(self):
+        return self.end - self.start
+
+    @property
+    def lines(self):
+        return [self.hunk.line(i) for i in range(self.start, self.end)]
+
+    def __repr__(self):
+        return '<Segment %s %d lines>' % (self.type, len(self))
+
+
+class Hunk(object):
+    """
+    A hunk of a file diff, built from its decoded JSON.
+
+    sources, destinations: arrays of the line numbers of each line, in order.
+    texts: the text of each line, or None if the hunk was built with text=False.
+    """
+    __slots__ = ('source_line', 'source_span', 'destination_line', 'destination_span', 'truncated',
+                 'sources', 'destinations', 'texts', '_segment_starts', '_segment_types', '_truncated_segments')
+
+    def __init__(self, hunk, text=True):
+        self.source_line = hunk.get('sourceLine')
+        self.source_span = hunk.get('sourceSpan')
+        self.destination_line = hunk.get('destinationLine')
+        self.destination_span = hunk.get('destinationSpan')
+        self.truncated = hunk.get('truncated', False)
+        self.sources = sources = array('i')
+        self.destinations = destinations = array('i')
+        self.texts = texts = [] if text else None
+        self._segment_starts = starts = array('i')
+        self._segment_types = types = array('b')
+        self._truncated_segments = truncated = set()
+        for segment in hunk.get('segments', ()):
+            lines = segment.get('lines', ())
+            if segment.get('truncated'):
+                truncated.add(len(starts))
+            starts.append(len(sources))
+            types.append(_CODES[segment['type']])
+            sources.extend([line['source'] for line in lines])
+            destinations.extend([line['destination'] for line in lines])
+            if texts is not None:
+                texts.extend([line.get('line') for line in lines])
+
+    def __len__(self):
+        return len(self.sources)
+
+    @property
+    def segments(self):
+        return [Segment(self, i) for i in range(len(self._segment_starts))]
+
+    def type_at(self, position):
+        """
+        The type of the line at position in the hunk.
+        """
+        return SEGMENT_TYPES[self._segment_types[bisect_right(self._segment_starts, position) - 1]]
+
+    def line(self, position):
+        return Line(self.sources[position], self.destinations[position], self.type_at(position),
+                    self.texts[position] if self.texts is not None else None)
+
+    @property
+    def lines(self):
+        return [self.line(i) for i in range(len(self))]
+
+    def __repr__(self):
+        return '<Hunk -%s,%s +%s,%s>' % (self.source_line, self.source_span, self.destination_line,
+                                         self.destination_span)
+
+
+class LineIndex(object):
+    """
+    The lines of a file diff by their number in each version of the file.
+
+    Added and context lines exist in the destination, removed and context lines in the
+    source; within a diff their numbers increase, so they are found by bisection.
+    """
+    __slots__ = ('_destinations', '_destination_types', '_sources', '_source_types')
+
+    def __init__(self, hunks):
+        self._destinations, self._destination_types = array('i'), array('b')
+        self._sources, self._source_types = array('i'), array('b')
+        for hunk in hunks:
+            starts, types = hunk._segment_starts, hunk._segment_types
+            for i, code in enumerate(types):
+                start = starts[i]
+                end = starts[i + 1] if i + 1 < len(starts) else len(hunk.sources)
+                if code != _REMOVED:
+                    self._destinations.extend(hunk.destinations[start:end])
+                    self._destination_types.extend(array('b', [code]) * (end - start))
+                if code != _ADDED:
+                    self._sources.extend(hunk.sources[start:end])
+                    self._source_types.extend(array('b', [code]) * (end - start))
+
+    @staticmethod
+    def _find(numbers, types, line):
+        i = bisect_left(numbers, line)
+        if i < len(numbers) and numbers[i] == line:
+            return SEGMENT_TYPES[types[i]]
+        return None
+
+    def destination(self, line):
+        """
+        The type (ADDED or CONTEXT) of destination line number line, or None if it is not in the diff.
+        """
+        return self._find(self._destinations, self._destination_types, line)
+
+    def source(self, line):
+        """
+        The type (REMOVED or CONTEXT) of source line number line, or None if it is not in the diff.
+        """
+        return self._find(self._sources, self._source_types, line)
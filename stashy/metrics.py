@@ -0,0 +1,301 @@
+"""
+Per-request instrumentation for StashClient.
+
+Every request sent by a client built with ``metrics=hook`` calls hook(event) with a
+:class:`RequestEvent` once the request has completed or failed. :class:`MetricsAggregator`
+is such a hook, keeping latency histograms per endpoint in memory and exporting them in
+the Prometheus text format::
+
+    metrics = MetricsAggregator()
+    stash = stashy.connect(URL, USER, PASSWORD, metrics=metrics)
+    ...
+    for row in metrics.summary()[:10]:
+        print(row)
+    open('stashy.prom', 'w').write(metrics.prometheus())
+"""
+import bisect
+import re
+import threading
+
+# the identifier following each of these path segments is replaced by the placeholder
+IDENTIFIERS = {
+    'projects': '{key}',
+    'repos': '{slug}',
+    'pull-requests': '{id}',
+    'commits': '{hash}',
+    'comments': '{id}',
+    'tasks': '{id}',
+    'users': '{user}',
+    'participants': '{user}',
+    'reviewers': '{user}',
+    'groups': '{group}',
+    'hooks': '{hook}',
+    'webhooks': '{id}',
+    'keys': '{id}',
+    'ssh': '{id}',
+    'restrictions': '{id}',
+    'condition': '{id}',
+    'tags': '{name}',
+}
+
+# segments of the API naming actions or sub-listings, kept when they follow one of IDENTIFIERS:
+# admin/groups/add-user is not the group "add-user"
+ACTIONS = frozenset([
+    'add-group', 'add-groups', 'add-user', 'add-users', 'remove-group', 'remove-user',
+    'more-members', 'more-non-members', 'credentials', 'rename', 'none', 'status', 'count',
+    'enabled', 'settings', 'default', 'search',
+])
+
+# everything following these segments is a single identifier that may contain slashes
+PATHS = {
+    'browse': '{path}',
+    'raw': '{path}',
+    'files': '{path}',
+    'diff': '{path}',
+    'info': '{ref}',
+}
+
+_COMMIT_HASH = re.compile(r'^[0-9a-f]{7,40}$')
+
+
+def endpoint_template(resource):
+    """
+    The path of a request with its identifiers replaced by placeholders, grouping requests
+    by endpoint: ``/api/1.0/projects/PRJ/repos/r/pull-requests/7`` becomes
+    ``api/1.0/projects/{key}/repos/{slug}/pull-requests/{id}``.
+    """
+    segments = resource.split('?', 1)[0].strip('/').split('/')
+    template = []
+    i = 0
+    while i < len(segments):
+        segment = segments[i]
+        template.append(segment)
+        i += 1
+        if i == len(segments):
+            break
+        if segment in PATHS and i > 2:
+            template.append(PATHS[segment])
+            break
+        placeholder = IDENTIFIERS.get(segment)
+        if placeholder is not None and i > 2 and segments[i] not in ACTIONS:
+            template.append(placeholder)
+            i += 1
+        elif segments[i].isdigit():
+            template.append('{id}')
+            i += 1
+        elif _COMMIT_HASH.match(segments[i]):
+            template.append('{hash}')
+            i += 1
+    return '/'.join(template)
+
+
+class RequestEvent(object):
+    """
+    What happened to one request.
+
+    endpoint: the request path with identifiers replaced, see :func:`endpoint_template`.
+    status: the response status code, or None if no response was received.
+    error: the exception that ended the request, if any.
+    connect: seconds spent opening a new connection, 0 if one was reused. Only the asyncio
+        client measures it; requests does not report connection setup, so it is None for
+        events of StashClient.
+    ttfb: seconds from sending the request until its response headers were received.
+    total: seconds until the body was read, including retries and the waits between them.
+    request_bytes, response_bytes: body sizes; response_bytes is None for streamed responses
+        without a Content-Length.
+    retries: number of attempts made after the first one.
+    """
+    def __init__(self, method, endpoint, url, status=None, error=None, connect=None, ttfb=None, total=None,
+                 request_bytes=0, response_bytes=None, retries=0):
+        self.method = method
+        self.endpoint = endpoint
+        self.url = url
+        self.status = status
+        self.error = error
+        self.connect = connect
+        self.ttfb = ttfb
+        self.total = total
+        self.request_bytes = request_bytes
+        self.response_bytes = response_bytes
+        self.retries = retries
+
+    def __repr__(self):
+        return '<RequestEvent %s %s %s %.3fs>' % (self.method, self.endpoint, self.status or self.error,
+                                                  self.total or 0)
+
+
+def body_size(data):
+    if data is None:
+        return 0
+    if isinstance(data, str):
+        return len(data.encode('utf-8'))
+    try:
+        return len(data)
+    except TypeError:
+        return None
+
+
+# seconds; requests to Bitbucket range from milliseconds for metadata to minutes for large diffs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram(object):
+    """
+    Counts of observations by upper bound, as in a Prometheus histogram.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        """
+        (upper bound, count of observations <= bound) pairs, ending with +Inf.
+        """
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, q):
+        """
+        Estimate the q-quantile by interpolating within its bucket.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        lower, seen = 0.0, 0
+        for bound, count in zip(self.buckets, self.counts):
+            if seen + count >= rank:
+                estimate = lower + (bound - lower) * (rank - seen) / count if count else lower
+                return min(estimate, self.max)
+            lower, seen = bound, seen + count
+        return self.max
+
+
+class EndpointStats(object):
+    """
+    The aggregated events of one method, endpoint and status.
+    """
+    def __init__(self, buckets):
+        self.total = Histogram(buckets)
+        self.ttfb = Histogram(buckets)
+        self.connect = Histogram(buckets)
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.retries = 0
+
+    @property
+    def count(self):
+        return self.total.count
+
+    def add(self, event):
+        if event.total is not None:
+            self.total.observe(event.total)
+        if event.ttfb is not None:
+            self.ttfb.observe(event.ttfb)
+        if event.connect is not None:
+            self.connect.observe(event.connect)
+        self.request_bytes += event.request_bytes or 0
+        self.response_bytes += event.response_bytes or 0
+        self.retries += event.retries
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _bound(value):
+    return '+Inf' if value == float('inf') else repr(float(value))
+
+
+class MetricsAggregator(object):
+    """
+    A metrics hook keeping per-endpoint histograms in memory. Thread safe.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        status = event.status if event.status is not None else type(event.error).__name__
+        key = (event.method, event.endpoint, str(status))
+        with self._lock:
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = self.endpoints[key] = EndpointStats(self.buckets)
+            stats.add(event)
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+
+    def summary(self):
+        """
+        One dict per method, endpoint and status, the ones taking the most time in total first.
+        """
+        with self._lock:
+            items = list(self.endpoints.items())
+        rows = []
+        for (method, endpoint, status), stats in items:
+            rows.append({
+                'method': method,
+                'endpoint': endpoint,
+                'status': status,
+                'count': stats.count,
+                'total_seconds': stats.total.sum,
+                'mean_seconds': stats.total.sum / stats.count if stats.count else None,
+                'p50_seconds': stats.total.quantile(0.5),
+                'p95_seconds': stats.total.quantile(0.95),
+                'max_seconds': stats.total.max,
+                'mean_ttfb_seconds': stats.ttfb.sum / stats.ttfb.count if stats.ttfb.count else None,
+                'response_bytes': stats.response_bytes,
+                'retries': stats.retries,
+            })
+        rows.sort(key=lambda row: row['total_seconds'], reverse=True)
+        return rows
+
+    def prometheus(self, prefix='stashy'):
+        """
+        The metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            items = sorted(self.endpoints.items())
+        lines = []
+
+        def histogram(name, help, attr):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help))
+            lines.append('# TYPE %s_%s histogram' % (prefix, name))
+            for key, stats in items:
+                hist = getattr(stats, attr)
+                if not hist.count:
+                    continue
+                labels = 'method="%s",endpoint="%s",status="%s"' % tuple(_label(v) for v in key)
+                for bound, count in hist.cumulative():
+                    lines.append('%s_%s_bucket{%s,le="%s"} %d' % (prefix, name, labels, _bound(bound), count))
+                lines.append('%s_%s_sum{%s} %r' % (prefix, name, labels, hist.sum))
+                lines.append('%s_%s_count{%s} %d' % (prefix, name, labels, hist.count))
+
+        def counter(name, help, attr):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help))
+            lines.append('# TYPE %s_%s counter' % (prefix, name))
+            for key, stats in items:
+                labels = 'method="%s",endpoint="%s",status="%s"' % tuple(_label(v) for v in key)
+                lines.append('%s_%s{%s} %d' % (prefix, name, labels, getattr(stats, attr)))
+
+        histogram('request_duration_seconds', 'Time until the response body was read, including retries.', 'total')
+        histogram('request_ttfb_seconds', 'Time until the response headers were received.', 'ttfb')
+        histogram('request_connect_seconds', 'Time spent opening new connections.', 'connect')
+        counter('request_bytes_total', 'Request body bytes sent.', 'request_bytes')
+        counter('response_bytes_total', 'Response body bytes received.', 'response_bytes')
+        counter('request_retries_total', 'Requests sent again after a failed attempt.', 'retries')
+        return '\n'.join(lines) + '\n'
@@ -3,7 +3,9 @@ from .errors import ok_or_error
 from .compat import update_doc
 
 class Groups(ResourceBase, FilteredIterableResource):
-    def none(self, filter=None):
+    __slots__ = ()
+
+    def none(self, filter=None, **paging):
         """
         Retrieve groups that have no granted permissions.
 
@@ -12,7 +14,7 @@ class Groups(ResourceBase, FilteredIterableResource):
         params = {}
         if filter:
             params['filter'] = filter
-        return self.paginate("/none", params)
+        return self.paginate("/none", params, **paging)
 
     @ok_or_error
     def grant(self, group, permission):
@@ -44,7 +46,9 @@ class Groups(ResourceBase, FilteredIterableResource):
 
 
 class Users(ResourceBase, FilteredIterableResource):
-    def none(self, filter=None):
+    __slots__ = ()
+
+    def none(self, filter=None, **paging):
         """
         Retrieve users that have no granted permissions.
 
@@ -53,7 +57,7 @@ class Users(ResourceBase, FilteredIterableResource):
         params = {}
         if filter:
             params['filter'] = filter
-        return self.paginate("/none", params)
+        return self.paginate("/none", params, **paging)
 
     @ok_or_error
     def grant(self, user, permission):
@@ -92,11 +96,14 @@ class Users(ResourceBase, FilteredIterableResource):
 
 
 class Permissions(ResourceBase):
+    __slots__ = ()
     groups = Nested(Groups)
     users = Nested(Users)
 
 
 class ProjectPermissions(Permissions):
+    __slots__ = ()
+
     def _url_for(self, permission):
         return self.url().rstrip("/") + "/" + permission + "/all"
 
@@ -178,6 +185,8 @@ class ProjectPermissions(Permissions):
 
 
 class RepositoryPermissions(Permissions):
+    __slots__ = ()
+
     def _url_for(self):
         return self.url().rstrip("/") + "/users"
 
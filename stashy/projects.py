@@ -2,12 +2,14 @@ from .branch_permissions import BranchPermissions
 from .default_reviewers import DefaultReviewers
 from .compat import update_doc
 from .errors import ok_or_error, response_or_error
-from .helpers import Nested, ResourceBase, IterableResource
+from .helpers import Nested, ResourceBase, IterableResource, collect
 from .permissions import ProjectPermissions
 from .repos import Repos
 from .settings import Settings
 
 class Hook(ResourceBase):
+    __slots__ = ('_key',)
+
     def __init__(self, key, url, client, parent):
         super(Hook, self).__init__(url, client, parent)
         self._key = key
@@ -49,7 +51,9 @@ class Hook(ResourceBase):
 
 
 class Hooks(ResourceBase, IterableResource):
-    def all(self, type=None, params = None):
+    __slots__ = ()
+
+    def all(self, type=None, params = None, **paging):
         """
         Retrieve hooks for this repository, optionally filtered by type.
 
@@ -59,9 +63,9 @@ class Hooks(ResourceBase, IterableResource):
         
         # the below condition is to just ensure the params doesnt contain type.
         if type is not None and type not in params: params.update(dict(type=type))
-        return self.paginate("", params=params)
+        return self.paginate("", params=params, **paging)
 
-    def list(self, type=None, params = None):
+    def list(self, type=None, params = None, **paging):
         """
         Convenience method to return a list (rather than iterable) of all elements
         """
@@ -69,7 +73,7 @@ class Hooks(ResourceBase, IterableResource):
         
         # the below condition is to just ensure the params doesnt contain type.
         if type is not None and type not in params: params.update(dict(type=type))
-        return list(self.all(type=type))
+        return collect(self.all(type=type, **paging))
 
     def __getitem__(self, item):
         """
@@ -79,9 +83,12 @@ class Hooks(ResourceBase, IterableResource):
 
 
 class Settings(ResourceBase):
+    __slots__ = ()
     hooks = Nested(Hooks)
 
 class Project(ResourceBase):
+    __slots__ = ('_key',)
+
     def __init__(self, key, url, client, parent):
         super(Project, self).__init__(url, client, parent)
         self._key = key
@@ -118,11 +125,11 @@ class Project(ResourceBase):
     def get(self):
         return self._client.get(self.url())
 
-    def keys(self):
+    def keys(self, **paging):
         """
         Retrieve the access keys associated with the project
         """
-        return self.paginate('/ssh', is_keys=True)
+        return self.paginate('/ssh', is_keys=True, **paging)
 
     @ok_or_error
     def add_key(self, key_text, permission):
@@ -139,6 +146,8 @@ class Project(ResourceBase):
 
 
 class Projects(ResourceBase, IterableResource):
+    __slots__ = ()
+
     @response_or_error
     def get(self, project):
         """
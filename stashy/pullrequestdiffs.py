@@ -1,6 +1,11 @@
-from .diffs import Diff
-from .helpers import ResourceBase
-from .errors import response_or_error
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from .diffs import Diff, DiffStats
+from .helpers import ResourceBase, STREAM_CHUNK_SIZE
+from .errors import maybe_throw, response_or_error, then
+from .streaming import StreamingPage
 
 
 class PullRequestDiffRef(object):
@@ -17,20 +22,21 @@ class PullRequestDiffRef(object):
 
 
 class PullRequestDiff(ResourceBase):
-    def __init__(self, url, client, parent):
+    __slots__ = ('_from_hash', '_to_hash', '_context_lines', '_whitespace', '_diffs')
+
+    def __init__(self, url, client, parent, response=None, params=None):
         super(PullRequestDiff, self).__init__(url, client, parent)
-        response = self.get()
+        if response is None:
+            response = self.get(params)
         self.from_hash = response["fromHash"]
         self.to_hash = response["toHash"]
         self.context_lines = response["contextLines"]
         self.whitespace = response["whitespace"]
-        self.diffs = []
-        for value in list(response["diffs"]):
-            self.diffs.append(Diff(value))
+        self.diffs = [Diff(value) for value in response["diffs"]]
 
     @response_or_error
-    def get(self):
-        return self._client.get(self.url())
+    def get(self, params=None):
+        return self._client.get(self.url(), params=params)
 
     def _get_from_hash(self):
         return self._from_hash
@@ -71,3 +77,165 @@ class PullRequestDiff(ResourceBase):
     context_lines = property(_get_context_lines, _set_context_lines)
 
     whitespace = property(_get_whitespace, _set_whitespace)
+
+    @property
+    def stats(self):
+        """
+        The DiffStats of the diff: the line counts of each file and their totals.
+        """
+        return DiffStats(diff.stats for diff in self.diffs)
+
+
+def stream_diff_files(client, url, params=None):
+    """
+    Request a diff and yield the decoded JSON of each of its files while it downloads.
+    """
+    response = client.get(url, params=params, stream=True)
+    try:
+        maybe_throw(response)
+        page = StreamingPage(response.iter_content(STREAM_CHUNK_SIZE), "diffs", client.codec.loads)
+        if "diffs" in page:
+            for value in page["diffs"]:
+                yield value
+    finally:
+        response.close()
+
+
+async def _adiff_files(client, url, params):
+    response = await client.get(url, params=params)
+    maybe_throw(response)
+    return client.codec.loads(response.content).get("diffs", ())
+
+
+def diff_stats(client, url, params=None):
+    """
+    The DiffStats of a diff, counting the lines of each file as it is decoded and then
+    dropping it, so that the text of the lines is never held all at once.
+    """
+    if client.is_async:
+        async def stats():
+            return DiffStats(await _adiff_files(client, url, params))
+        return stats()
+    return DiffStats(stream_diff_files(client, url, params))
+
+
+def _diff_params(contextLines=None, whitespace=None, srcPath=None):
+    params = dict(contextLines=contextLines, whitespace=whitespace, srcPath=srcPath)
+    return dict((key, value) for key, value in params.items() if value is not None)
+
+
+def _first_diff(response):
+    diffs = response.get("diffs")
+    return Diff(diffs[0]) if diffs else None
+
+
+def _change_paths(change):
+    if isinstance(change, dict):
+        src = change.get("srcPath")
+        return change["path"]["toString"], src["toString"] if src else None
+    return change, None
+
+
+class LazyPullRequestDiff(ResourceBase):
+    """
+    The diff of a pull request, requested only when it is used.
+
+    Iterating it streams the whole diff and yields a Diff for each file as soon as it has
+    been decoded, so only about one file is held in memory at a time. file() requests the diff
+    of a single path, and changes() the list of changed files without their content, whose
+    entries can be passed to files() to diff a selection of them concurrently::
+
+        diff = pull_request.lazy_diff(contextLines=3)
+        python = [change for change in diff.changes() if change['path'].get('extension') == 'py']
+        for file_diff in diff.files(python):
+            ...
+
+    contextLines: number of lines of context around each change; the server default if None.
+    whitespace: 'ignore-all' to ignore whitespace changes.
+    srcPath: the previous path of a file that was moved or copied, used by file().
+
+    With the asyncio client, iterate with ``async for`` (the diff is then read in one piece
+    before the files are decoded) and await file() and files().
+    """
+    __slots__ = ('_params',)
+
+    def __init__(self, url, client, parent, contextLines=None, whitespace=None, srcPath=None):
+        super(LazyPullRequestDiff, self).__init__(url, client, parent)
+        self._params = _diff_params(contextLines, whitespace, srcPath)
+
+    def _whole_diff_params(self):
+        return dict((key, value) for key, value in self._params.items() if key != 'srcPath')
+
+    def __iter__(self):
+        for value in stream_diff_files(self._client, self.url(), self._whole_diff_params()):
+            yield Diff(value)
+
+    def __aiter__(self):
+        return self._aiter()
+
+    async def _aiter(self):
+        for value in await _adiff_files(self._client, self.url(), self._whole_diff_params()):
+            yield Diff(value)
+
+    def diff_stats(self):
+        """
+        Request the DiffStats of the whole diff, without keeping the files or the text of their
+        lines. Named like PullRequest.diff_stats(), as unlike the stats property of a diff that
+        has been read it sends a request.
+        """
+        return diff_stats(self._client, self.url(), self._whole_diff_params())
+
+    def get(self):
+        """
+        Retrieve the whole diff at once, as PullRequest.diff() does.
+        """
+        return self._parent.diff(**self._whole_diff_params())
+
+    @response_or_error
+    def _get_file(self, path, params):
+        return self._client.get(self.url('/' + quote(path.lstrip('/'))), params=params)
+
+    def file(self, path, srcPath=None):
+        """
+        Retrieve the Diff of a single file, or None if the pull request does not change it.
+
+        srcPath: the previous path of the file if it was moved or copied. Defaults to the
+            srcPath this diff was created with.
+        """
+        params = dict(self._params)
+        if srcPath is not None:
+            params['srcPath'] = srcPath
+        return then(self._get_file(path, params), _first_diff)
+
+    def changes(self, **paging):
+        """
+        Iterate over the files changed by the pull request, without their diffs.
+
+        Each change has the file's path and, if it was moved or copied, its srcPath.
+        """
+        return self._parent.changes(**paging)
+
+    def files(self, paths, workers=4):
+        """
+        Retrieve the diffs of several files concurrently, returned in the order of paths.
+
+        paths: file paths, or changes as returned by changes(), which also provide the
+            srcPath of moved and copied files.
+        workers: number of diffs requested at a time.
+        """
+        selected = [_change_paths(path) for path in paths]
+        if self._client.is_async:
+            return self._afiles(selected, workers)
+        if not selected:
+            return []
+        with ThreadPoolExecutor(max_workers=min(workers, len(selected))) as pool:
+            return list(pool.map(lambda item: self.file(*item), selected))
+
+    async def _afiles(self, selected, workers):
+        semaphore = asyncio.Semaphore(workers)
+
+        async def fetch(path, srcPath):
+            async with semaphore:
+                return await self.file(path, srcPath)
+
+        return list(await asyncio.gather(*[fetch(path, srcPath) for path, srcPath in selected]))
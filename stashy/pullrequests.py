@@ -1,7 +1,7 @@
 from .helpers import ResourceBase, IterableResource
-from .errors import ok_or_error, response_or_error
+from .errors import ok_or_error, response_or_error, then
 from .compat import basestring
-from .pullrequestdiffs import PullRequestDiff
+from .pullrequestdiffs import LazyPullRequestDiff, PullRequestDiff, _diff_params
 import json
 
 
@@ -19,6 +19,8 @@ class PullRequestRef(object):
 
 
 class PullRequest(ResourceBase):
+    __slots__ = ('_id',)
+
     def __init__(self, id, url, client, parent):
         super(PullRequest, self).__init__(url, client, parent)
         self._id = id
@@ -33,6 +35,8 @@ class PullRequest(ResourceBase):
 
     def _make_ref(self, ref, refName):
         if isinstance(ref, basestring):
+            if self._client.is_async:
+                raise ValueError(refName + " should be either a dict or a PullRequestRef when using the asyncio client")
             repo = self.get()[refName]['repository']
             return PullRequestRef(repo['project']['key'], repo['slug'], ref).to_dict()
         elif isinstance(ref, PullRequestRef):
@@ -67,7 +71,7 @@ class PullRequest(ResourceBase):
             data['fromRef'] = self._make_ref(fromRef, "fromRef")
         return self._client.put(self.url(), data=data)
 
-    def activities(self, fromId=None, fromType=None):
+    def activities(self, fromId=None, fromType=None, **paging):
         """
         Retrieve a page of activity associated with a pull request.
 
@@ -85,7 +89,7 @@ class PullRequest(ResourceBase):
                 raise ValueError("fromType is required when fromId is supplied")
             params['fromId'] = fromId
             params['fromType'] = fromType
-        return self.paginate("/activities", params=params)
+        return self.paginate("/activities", params=params, **paging)
 
     @ok_or_error
     def decline(self, version=-1):
@@ -101,8 +105,7 @@ class PullRequest(ResourceBase):
             * there are conflicts that need to be manually resolved before merging; and/or
             * one or more merge checks have vetoed the merge.
         """
-        res = self.merge_info()
-        return res['canMerge'] and not res['conflicted']
+        return then(self.merge_info(), lambda res: res['canMerge'] and not res['conflicted'])
 
     @response_or_error
     def merge_info(self):
@@ -175,26 +178,26 @@ class PullRequest(ResourceBase):
         """
         return self._client.delete(self.url("/watch"))
 
-    def changes(self):
+    def changes(self, **paging):
         """
         Gets changes for the specified PullRequest.
 
         Note: This resource is currently not paged. The server will return at most one page.
         The server will truncate the number of changes to an internal maximum.
         """
-        return self.paginate("/changes")
+        return self.paginate("/changes", **paging)
 
-    def commits(self):
+    def commits(self, **paging):
         """
         Retrieve changesets for the specified pull request.
         """
-        return self.paginate('/commits')
+        return self.paginate('/commits', **paging)
 
-    def comments(self, srcPath='/'):
+    def comments(self, srcPath='/', **paging):
         """
         Retrieve comments for the specified file in a  pull request.
         """
-        return self.paginate('/comments?path=%s' % srcPath)
+        return self.paginate('/comments?path=%s' % srcPath, **paging)
 
     @ok_or_error
     def delete_comment(self, commentId, commentVersion):
@@ -240,18 +243,44 @@ class PullRequest(ResourceBase):
             return self._client.post(self.url("/blocker-comments"), data=data)
         return self._client.post(self.url("/comments"), data=data)
 
-    def diff(self):
+    def diff(self, contextLines=None, whitespace=None):
         """
         Retrieve the diff for the specified pull request.
+
+        contextLines: number of lines of context around each change; the server default if None.
+        whitespace: 'ignore-all' to ignore whitespace changes.
+        """
+        return then(self._diff(contextLines, whitespace),
+                    lambda data: PullRequestDiff(self.url('/diff'), self._client, self, data))
+
+    @response_or_error
+    def _diff(self, contextLines=None, whitespace=None):
+        return self._client.get(self.url('/diff'), params=_diff_params(contextLines, whitespace))
+
+    def diff_stats(self, contextLines=None, whitespace=None):
         """
-        return PullRequestDiff(self.url('/diff'), self._client, self)
+        The line counts of the diff for the specified pull request, per file and in total,
+        as a DiffStats. The diff is streamed and its line text is not kept.
+
+        contextLines: pass 0 if the number of context lines is not needed, to download less.
+        """
+        return self.lazy_diff(contextLines, whitespace).diff_stats()
+
+    def lazy_diff(self, contextLines=None, whitespace=None, srcPath=None):
+        """
+        The diff of the pull request as a LazyPullRequestDiff, which sends no request until it
+        is iterated, and can stream the diff file by file or retrieve single files.
+        """
+        return LazyPullRequestDiff(self.url('/diff'), self._client, self, contextLines, whitespace, srcPath)
 
 
 class PullRequests(ResourceBase, IterableResource):
+    __slots__ = ()
+
     def __init__(self, url, client, parent):
         super(PullRequests, self).__init__(url, client, parent)
 
-    def all(self, direction='INCOMING', at=None, state='OPEN', order=None, author=None):
+    def all(self, direction='INCOMING', at=None, state='OPEN', order=None, author=None, **paging):
         """
         Retrieve pull requests to or from the specified repository.
 
@@ -277,10 +306,12 @@ class PullRequests(ResourceBase, IterableResource):
             params['role.1'] = 'AUTHOR'
             params['username.1'] = author
 
-        return self.paginate("", params=params)
+        return self.paginate("", params=params, **paging)
 
     def _make_ref(self, ref, refName="the ref"):
         if isinstance(ref, basestring):
+            if self._client.is_async:
+                raise ValueError(refName + " should be either a dict or a PullRequestRef when using the asyncio client")
             repo = self._parent.get()
             return PullRequestRef(repo['project']['key'], repo['slug'], ref).to_dict()
         elif isinstance(ref, PullRequestRef):
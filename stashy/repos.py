@@ -1,16 +1,18 @@
-import json
-
 from .branch_permissions import BranchPermissions
 from .default_reviewers import DefaultReviewers
+from .downloads import Archive, RawFile
 from .compat import update_doc
-from .errors import ok_or_error, response_or_error
-from .helpers import Nested, ResourceBase, IterableResource
+from .errors import ok_or_error, response_or_error, json_content
+from .helpers import Nested, ResourceBase, IterableResource, collect
 from .permissions import Permissions, RepositoryPermissions
+from .pullrequestdiffs import diff_stats
 from .pullrequests import PullRequests
 from .settings import Settings
 
 
 class Webhook(ResourceBase):
+    __slots__ = ('_key',)
+
     def __init__(self, key, url, client, parent):
         super(Webhook, self).__init__(url, client, parent)
         self._key = key
@@ -52,7 +54,9 @@ class Webhook(ResourceBase):
 
 
 class Webhooks(ResourceBase, IterableResource):
-    def all(self, type=None, params = None):
+    __slots__ = ()
+
+    def all(self, type=None, params = None, **paging):
         """
         Retrieve webhooks for this repository, optionally filtered by type.
 
@@ -64,7 +68,7 @@ class Webhooks(ResourceBase, IterableResource):
         
         # the below condition is to just ensure the params doesnt contain type.
         if type is not None and type not in kw: kw.update(dict(type=type))
-        return self.paginate("", params=kw)
+        return self.paginate("", params=kw, **paging)
 
     @response_or_error
     def create(self, name, url, events=["repo:refs_changed"], active=True):
@@ -77,7 +81,7 @@ class Webhooks(ResourceBase, IterableResource):
                                                    "url": url
                                                    })
 
-    def list(self, type=None, params=None):
+    def list(self, type=None, params=None, **paging):
         """
         Convenience method to return a list (rather than iterable) of all elements
         
@@ -88,7 +92,7 @@ class Webhooks(ResourceBase, IterableResource):
         
         # the below condition is to just ensure the params doesnt contain type. 
         if type is not None and type not in kw: kw.update(dict(type=type))
-        return list(self.all(type=type, params=kw))
+        return collect(self.all(type=type, params=kw, **paging))
 
     def __getitem__(self, item):
         """
@@ -98,6 +102,8 @@ class Webhooks(ResourceBase, IterableResource):
 
 
 class Repository(ResourceBase):
+    __slots__ = ('_slug',)
+
     def __init__(self, slug, url, client, parent):
         super(Repository, self).__init__(url, client, parent)
         self._slug = slug
@@ -156,17 +162,17 @@ class Repository(ResourceBase):
 
         return self._client.post(self.url(), data=data)
 
-    def forks(self):
+    def forks(self, **paging):
         """
         Retrieve repositories which have been forked from this one.
         """
-        return self.paginate('/forks')
+        return self.paginate('/forks', **paging)
 
-    def keys(self):
+    def keys(self, **paging):
         """
         Retrieve the access keys associated with the repo
         """
-        return self.paginate('/ssh', is_keys=True)
+        return self.paginate('/ssh', is_keys=True, **paging)
 
     @ok_or_error
     def add_key(self, key_text, permission):
@@ -174,7 +180,7 @@ class Repository(ResourceBase):
                                  data=dict(key=dict(text=key_text),
                                            permission=permission))
 
-    def tags(self, filterText=None, orderBy=None):
+    def tags(self, filterText=None, orderBy=None, **paging):
         """
         Retrieve the tags matching the supplied filterText param.
         """
@@ -183,7 +189,7 @@ class Repository(ResourceBase):
             params['filterText'] = filterText
         if orderBy is not None:
             params['orderBy'] = orderBy
-        return self.paginate('/tags', params=params)
+        return self.paginate('/tags', params=params, **paging)
 
     @ok_or_error
     def create_tag(self, name, startPoint, force='true', message='no message', type='ANNOTATED'):
@@ -256,7 +262,7 @@ class Repository(ResourceBase):
         return self._client.get(self.url('/branches/info/%s' % changesetId,
                                          is_branches=True))
 
-    def branches(self, filterText=None, orderBy=None, details=None, params=None):
+    def branches(self, filterText=None, orderBy=None, details=None, params=None, **paging):
         """
         Retrieve the branches matching the supplied filterText param.
         
@@ -271,10 +277,11 @@ class Repository(ResourceBase):
             kw['orderBy'] = orderBy
         if details is not None:
             kw['details'] = details
-        return self.paginate('/branches', params=kw)
+        return self.paginate('/branches', params=kw, **paging)
 
     default_branch = property(_get_default_branch, _set_default_branch, doc="Get or set the default branch")
 
+    @json_content
     def get_all_branches(self, items):
         """Return list of all branches in this project and the repository
 
@@ -284,9 +291,9 @@ class Repository(ResourceBase):
             The JSON result, converted to a Python data structure.
 
         """
-        branches = self._client.get(self.url('/branches?limit={}'.format(items)))
-        return json.loads(branches.content)
+        return self._client.get(self.url('/branches?limit={}'.format(items)))
 
+    @json_content
     def get_all_tags(self, items):
         """Return list of all tags in this project and the repository
 
@@ -296,9 +303,9 @@ class Repository(ResourceBase):
             The JSON result, converted to a Python data structure.
 
         """
-        tags = self._client.get(self.url('/tags?limit={}'.format(items)))
-        return json.loads(tags.content)
+        return self._client.get(self.url('/tags?limit={}'.format(items)))
 
+    @json_content
     def get_commit(self, commit):
         """Get detailed information about a given commit
 
@@ -309,9 +316,9 @@ class Repository(ResourceBase):
             The JSON result, converted to a Python data structure.
 
         """
-        res = self._client.get(self.url('/commits/{}'.format(commit)))
-        return json.loads(res.content)
+        return self._client.get(self.url('/commits/{}'.format(commit)))
 
+    @json_content
     def get_commit_pull_requests(self, commit):
         """Returns list of pull requests that "commit" is a part of
 
@@ -322,10 +329,9 @@ class Repository(ResourceBase):
             The JSON result, converted to a Python data structure.
 
         """
-        res = self._client.get(self.url('/commits/{}/pull-requests'.format(commit)))
-        return json.loads(res.content)
+        return self._client.get(self.url('/commits/{}/pull-requests'.format(commit)))
 
-    def files(self, path='', at=None):
+    def files(self, path='', at=None, **paging):
         """
         Retrieve a page of files from particular directory of a repository. The search is done
         recursively, so all files from any sub-directory of the specified directory will be returned.
@@ -333,9 +339,39 @@ class Repository(ResourceBase):
         params = {}
         if at is not None:
             params['at'] = at
-        return self.paginate('/files/' + path, params)
+        return self.paginate('/files/' + path, params, **paging)
+
+    def raw(self, path, at=None):
+        """
+        The raw content of a file as a RawFile, which downloads it in chunks when it is
+        iterated, read or saved, without the JSON paging of browse(). Binary files are
+        returned unchanged.
+
+        path: the path of the file
+        at: the commit, branch or tag to read the file at; the default branch if None.
+        """
+        return RawFile(path, at, self.url(), self._client, self)
 
-    def browse(self, path='', at=None, type=False, blame='', noContent=''):
+    def archive(self, at=None, format=None, path=None, prefix=None, paths=None, size=None):
+        """
+        An archive of the repository, streamed from the server.
+
+        at: the commit, branch or tag to archive; the default branch if None. Use a commit
+            for a download that may have to be resumed.
+        format: zip (the server default), tar, tar.gz or tgz.
+        path: the file to save the archive to. If given, the archive is downloaded, resuming
+            after interruptions, and its size returned; see Archive.save(). Otherwise an
+            Archive is returned, to save or iterate later.
+        prefix: a directory to put the files of the archive in.
+        paths: only archive these paths of the repository.
+        size: the expected size in bytes, checked when the archive is saved to path.
+        """
+        archive = Archive(self.url(), self._client, self, at, format, prefix, paths)
+        if path is None:
+            return archive
+        return archive.save(path, size=size)
+
+    def browse(self, path='', at=None, type=False, blame='', noContent='', **paging):
         """
         Retrieve a page of content for a file path at a specified revision.
         """
@@ -344,16 +380,20 @@ class Repository(ResourceBase):
             params['at'] = at
         if type:
             params['type'] = type
-            return response_or_error(lambda: self._client.get(self.url('/browse/' + path), params=params))()
+            return self._browse_typed(path, params)
         else:
             if blame:
                 params['blame'] = blame
             if noContent:
                 params['noContent'] = noContent
 
-            return self.paginate("/browse/" + path, params=params, values_key='lines')
+            return self.paginate("/browse/" + path, params=params, values_key='lines', **paging)
 
-    def changes(self, until, since=None, params=None):
+    @response_or_error
+    def _browse_typed(self, path, params):
+        return self._client.get(self.url('/browse/' + path), params=params)
+
+    def changes(self, until, since=None, params=None, **paging):
         """
         Retrieve a page of changes made in a specified commit.
 
@@ -371,9 +411,9 @@ class Repository(ResourceBase):
         
         if since is not None:
             params['since'] = since
-        return self.paginate('/changes', params=kw)
+        return self.paginate('/changes', params=kw, **paging)
 
-    def commits(self, until, since=None, path=None, params=None):
+    def commits(self, until, since=None, path=None, params=None, **paging):
         """Retrieve a page of changesets from a given starting commit or between two commits.
         The commits may be identified by hash, branch or tag name.
 
@@ -403,23 +443,29 @@ class Repository(ResourceBase):
         if path is not None:
             kw['path'] = path
 
-        return self.paginate('/commits', params=kw)
+        return self.paginate('/commits', params=kw, **paging)
 
-    def diff(self, from_branch, to_branch):
+    def diff(self, from_branch, to_branch, stats_only=False):
         """
-        Retrieve a diff between two branches.
+        Retrieve a diff between two branches. DiffStats(diff['diffs']) counts its lines.
 
         from_branch: source branch
         to_branch: target branch
+        stats_only: instead of the diff, return the line counts of its files and their
+            totals as a DiffStats. The diff is then streamed and its line text is not kept.
         """
         params = {
             'from': from_branch,
             'to': to_branch,
         }
 
-        diff = self._client.get(self.url('/compare/diff'), params=params)
+        if stats_only:
+            return diff_stats(self._client, self.url('/compare/diff'), params)
+        return self._compare_diff(params)
 
-        return json.loads(diff.content)
+    @json_content
+    def _compare_diff(self, params):
+        return self._client.get(self.url('/compare/diff'), params=params)
 
     permissions = Nested(Permissions)
     repo_permissions = Nested(RepositoryPermissions,
@@ -476,6 +522,8 @@ class Repository(ResourceBase):
     forkable = property(_get_forkable, _set_forkable, doc="Get or set the allow_forks option")
 
 class Repos(ResourceBase, IterableResource):
+    __slots__ = ()
+
     @response_or_error
     def create(self, name, scmId="git", forkable=True):
         """
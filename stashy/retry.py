@@ -0,0 +1,140 @@
+"""
+Retry and client-side rate limiting for StashClient.
+"""
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+class RetryPolicy(object):
+    """
+    Decides whether a failed request is sent again, and how long to wait before doing so.
+
+    total: maximum number of retries for one request.
+    backoff: base delay in seconds; the n-th retry waits a random time between 0 and
+        backoff * 2 ** n, capped at max_backoff ("full jitter").
+    statuses: response codes that are retried for idempotent methods.
+    methods: methods considered idempotent. 429 responses are retried for any method, since
+        the server refused the request without processing it.
+    respect_retry_after: wait as long as the Retry-After header asks, up to max_retry_after.
+    """
+    def __init__(self, total=3, backoff=0.5, max_backoff=30, statuses=(429, 502, 503, 504),
+                 methods=('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'), respect_retry_after=True,
+                 max_retry_after=300):
+        self.total = total
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(m.upper() for m in methods)
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+
+    def should_retry(self, method, attempt, response=None, error=None):
+        """
+        Whether to retry after the given attempt (0 for the first one), which either got
+        response or failed to connect with error.
+        """
+        if attempt >= self.total:
+            return False
+        if error is not None:
+            return method.upper() in self.methods
+        if response.status_code == 429:
+            return True
+        return response.status_code in self.statuses and method.upper() in self.methods
+
+    def delay(self, attempt, response=None):
+        """
+        Seconds to wait before the retry following the given attempt.
+        """
+        if response is not None and self.respect_retry_after:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                return min(retry_after, self.max_retry_after)
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+
+def parse_retry_after(value):
+    """
+    Seconds to wait according to a Retry-After header, given either as seconds or as an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class RateLimiter(object):
+    """
+    A client-side token bucket following the one Bitbucket Data Center advertises in its
+    X-RateLimit-* response headers.
+
+    Until the server sends these headers requests are not throttled. Afterwards each request
+    takes a token, and once the bucket is empty requests are spaced at the server's fill rate,
+    so the client slows down before the server starts answering with 429.
+
+    reserve: number of tokens to leave in the bucket as a safety margin.
+    """
+    def __init__(self, reserve=0):
+        self.reserve_tokens = reserve
+        self.capacity = None
+        self.rate = None
+        self.tokens = None
+        self._updated = None
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take a token for a request, returning the number of seconds to wait before sending it.
+        """
+        with self._lock:
+            if self.tokens is None or not self.rate:
+                return 0.0
+            self._refill()
+            self.tokens -= 1
+            if self.tokens >= self.reserve_tokens:
+                return 0.0
+            return (self.reserve_tokens - self.tokens) / self.rate
+
+    def acquire(self):
+        """
+        Take a token for a request, sleeping until it is available.
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def update(self, headers):
+        """
+        Synchronize the bucket with the X-RateLimit-* headers of a response.
+        """
+        remaining = headers.get('X-RateLimit-Remaining')
+        if remaining is None:
+            return
+        limit = headers.get('X-RateLimit-Limit')
+        interval = headers.get('X-RateLimit-Interval-Seconds')
+        fill_rate = headers.get('X-RateLimit-Fill-Rate')
+        try:
+            with self._lock:
+                if limit is not None:
+                    self.capacity = float(limit)
+                if interval is not None and fill_rate is not None and float(interval) > 0:
+                    self.rate = float(fill_rate) / float(interval)
+                self.tokens = float(remaining)
+                self._updated = time.monotonic()
+        except ValueError:
+            pass
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens += (now - self._updated) * self.rate
+        if self.capacity is not None:
+            self.tokens = min(self.tokens, self.capacity)
+        self._updated = now
@@ -1,9 +1,11 @@
 from .errors import response_or_error
-from .helpers import Nested, ResourceBase, IterableResource
+from .helpers import Nested, ResourceBase, IterableResource, collect
 from .pullrequests import PullRequests
 
 
 class Hook(ResourceBase):
+    __slots__ = ('_key',)
+
     def __init__(self, key, url, client, parent):
         super(Hook, self).__init__(url, client, parent)
         self._key = key
@@ -45,7 +47,9 @@ class Hook(ResourceBase):
 
 
 class Hooks(ResourceBase, IterableResource):
-    def all(self, type=None):
+    __slots__ = ()
+
+    def all(self, type=None, **paging):
         """
         Retrieve hooks for this repository, optionally filtered by type.
 
@@ -54,13 +58,13 @@ class Hooks(ResourceBase, IterableResource):
         params = None
         if type is not None:
             params = dict(type=type)
-        return self.paginate("", params=params)
+        return self.paginate("", params=params, **paging)
 
-    def list(self, type=None):
+    def list(self, type=None, **paging):
         """
         Convenience method to return a list (rather than iterable) of all elements
         """
-        return list(self.all(type=type))
+        return collect(self.all(type=type, **paging))
 
     def __getitem__(self, item):
         """
@@ -70,5 +74,6 @@ class Hooks(ResourceBase, IterableResource):
 
 
 class Settings(ResourceBase):
+    __slots__ = ()
     hooks = Nested(Hooks)
     pullrequests = Nested(PullRequests, relative_path="/pull-requests")
@@ -1,28 +1,32 @@
 # from .helpers import Nested, ResourceBase, IterableResource
-from .helpers import ResourceBase, IterableResource
+from .helpers import ResourceBase, IterableResource, collect
 from .errors import ok_or_error, response_or_error
 from .compat import update_doc
 
 
 class SshFilteredIterableResource(IterableResource):
-    def all(self, user=None):
+    __slots__ = ()
+
+    def all(self, user=None, **paging):
         """
         Retrieve all the resources, optionally modified by filter.
         """
         params = {}
         if user:
             params['user'] = user
-        return self.paginate("", params)
+        return self.paginate("", params, **paging)
 
-    def list(self, user=None):
+    def list(self, user=None, **paging):
         """
         Convenience method to return a list (rather than iterable) of all
         elements
         """
-        return list(self.all(user))
+        return collect(self.all(user, **paging))
 
 
 class Key(ResourceBase):
+    __slots__ = ()
+
     def __init__(self, url, client, parent):
         super(Keys, self).__init__(url, client, parent)
         self._url = 'ssh/1.0/keys'
@@ -32,6 +36,8 @@ class Key(ResourceBase):
 
 
 class Keys(ResourceBase, SshFilteredIterableResource):
+    __slots__ = ()
+
     def __init__(self, url, client, parent):
         super(Keys, self).__init__(url, client, parent)
         self._url = 'ssh/1.0/keys'
@@ -0,0 +1,242 @@
+"""
+Incremental decoding of paged JSON responses.
+
+The standard library can only decode complete documents, so a page of results is normally
+downloaded, decoded into text and turned into Python objects before its first item can be
+used. StreamingPage instead reads the top-level object of a page from an iterable of byte
+chunks and decodes the items of its values array one at a time, as the bytes arrive.
+"""
+import json
+import re
+
+_WHITESPACE = b' \t\r\n'
+_QUOTE, _BACKSLASH = ord('"'), ord('\\')
+_COMMA, _COLON = ord(','), ord(':')
+_LBRACE, _RBRACE, _LBRACKET, _RBRACKET = ord('{'), ord('}'), ord('['), ord(']')
+_OPENING = (_LBRACE, _LBRACKET)
+
+# a complete string; a run of anything but brackets and complete strings; a complete object
+# or array without nested ones. The patterns have a single way to match, so that failing to
+# find a closing bracket (within a nested container, or past the end of the buffer) does
+# not backtrack.
+_STRING = br'"[^"\\]*(?:\\.[^"\\]*)*"'
+_RUN = br'[^\[\]{}"]*'
+_FLAT = br'(?:\{%s(?:%s%s)*\}|\[%s(?:%s%s)*\])' % (_RUN, _STRING, _RUN, _RUN, _STRING, _RUN)
+# what can be skipped within a container without changing its depth: matched in one call,
+# so that only the brackets of nested containers are looked at one by one
+_SKIP = re.compile(br'%s(?:(?:%s|%s)%s)*' % (_RUN, _STRING, _FLAT, _RUN), re.DOTALL)
+_STRING_SPECIAL = re.compile(br'["\\]')
+_SCALAR_END = re.compile(br'[,}\]\s]')
+
+# consumed bytes are dropped from the buffer once they exceed this size
+_COMPACT_AT = 64 * 1024
+
+
+class _Reader(object):
+    """
+    Splits a stream of JSON bytes into the raw bytes of consecutive values and punctuation.
+    """
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buf = bytearray()
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        for chunk in self._chunks:
+            if chunk:
+                self._buf += chunk
+                return True
+        self._eof = True
+        return False
+
+    def peek(self):
+        """
+        Skip whitespace and return the next byte without consuming it.
+        """
+        while True:
+            buf, i = self._buf, self._pos
+            n = len(buf)
+            while i < n and buf[i] in _WHITESPACE:
+                i += 1
+            self._pos = i
+            if i < n:
+                return buf[i]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON document")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError("Expected %r at position %d of JSON document" % (chr(char), self._pos))
+        self._pos += 1
+
+    def skip(self):
+        self._pos += 1
+
+    def take(self):
+        """
+        Consume the next complete value and return its raw bytes.
+        """
+        self.peek()
+        start = self._pos
+        end = self._scan(start)
+        value = bytes(self._buf[start:end])
+        self._pos = end
+        if end > _COMPACT_AT:
+            del self._buf[:end]
+            self._pos = 0
+        return value
+
+    def _scan(self, start):
+        # every loop below resumes where the previous pass stopped once _fill() has added a
+        # chunk, so that each byte is looked at a bounded number of times however the value
+        # is split into chunks
+        buf = self._buf
+        first = buf[start]
+        if first not in _OPENING and first != _QUOTE:
+            i = start
+            while True:
+                match = _SCALAR_END.search(buf, i)
+                if match is not None:
+                    return match.start()
+                i = len(buf)
+                if not self._fill():
+                    return len(buf)
+
+        if first == _QUOTE:
+            return self._string_end(start + 1)
+
+        # the opening bracket is counted here: the value itself may be a flat container
+        depth = 1
+        i = start + 1
+        while True:
+            i = _SKIP.match(buf, i).end()
+            if i < len(buf):
+                if buf[i] == _QUOTE:
+                    # a string continuing past the end of the buffer
+                    i = self._string_end(i + 1)
+                    continue
+                # anything else stopping the match is a bracket
+                if buf[i] in _OPENING:
+                    depth += 1
+                else:
+                    depth -= 1
+                i += 1
+                if depth == 0:
+                    return i
+            elif not self._fill():
+                raise ValueError("Unexpected end of JSON document")
+
+    def _string_end(self, i):
+        """
+        The position after the closing quote of the string whose content starts at i.
+        """
+        buf = self._buf
+        while True:
+            match = _STRING_SPECIAL.search(buf, i)
+            if match is None:
+                i = len(buf)
+            else:
+                j = match.start()
+                if buf[j] == _QUOTE:
+                    return j + 1
+                if j + 1 < len(buf):
+                    # skip the escaped character
+                    i = j + 2
+                    continue
+                # a backslash ending the buffer: look at it again once the next chunk is in
+                i = j
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON document")
+
+
+class StreamingPage(object):
+    """
+    A page of a paged resource, decoded lazily from byte chunks.
+
+    Indexing with values_key returns an iterator decoding the items one by one; it can be
+    consumed only once. Other fields are decoded when first looked up. Looking up a field
+    that comes after the values array before the items have been consumed buffers the
+    remaining items in a list.
+    """
+    def __init__(self, chunks, values_key='values', loads=json.loads):
+        self._reader = _Reader(chunks)
+        self._values_key = values_key
+        self._loads = loads
+        self._fields = {}
+        self._values = None
+        self._state = 'start'
+
+    def _next_field(self):
+        reader = self._reader
+        if self._state == 'start':
+            reader.expect(_LBRACE)
+            if reader.peek() == _RBRACE:
+                reader.skip()
+                self._state = 'done'
+                return
+        else:
+            char = reader.peek()
+            reader.skip()
+            if char == _RBRACE:
+                self._state = 'done'
+                return
+            if char != _COMMA:
+                raise ValueError("Expected ',' or '}' in JSON object")
+
+        key = self._loads(reader.take())
+        reader.expect(_COLON)
+        if key == self._values_key and reader.peek() == _LBRACKET:
+            self._state = 'values'
+        else:
+            self._fields[key] = self._loads(reader.take())
+            self._state = 'fields'
+
+    def _iter_values(self):
+        reader = self._reader
+        reader.expect(_LBRACKET)
+        self._state = 'streaming'
+        if reader.peek() == _RBRACKET:
+            reader.skip()
+        else:
+            while True:
+                yield self._loads(reader.take())
+                char = reader.peek()
+                reader.skip()
+                if char == _RBRACKET:
+                    break
+                if char != _COMMA:
+                    raise ValueError("Expected ',' or ']' in JSON array")
+        self._state = 'fields'
+
+    def _advance_to(self, key):
+        while key not in self._fields and self._state != 'done':
+            if self._state == 'values':
+                if key == self._values_key:
+                    return
+                self._values = list(self._iter_values())
+            elif self._state == 'streaming':
+                raise ValueError("The items of this page are still being consumed")
+            else:
+                self._next_field()
+
+    def __contains__(self, key):
+        if key == self._values_key and (self._values is not None or self._state in ('values', 'streaming')):
+            return True
+        self._advance_to(key)
+        return key in self._fields or (key == self._values_key and self._state == 'values')
+
+    def __getitem__(self, key):
+        if key == self._values_key:
+            if self._values is not None:
+                return iter(self._values)
+            self._advance_to(key)
+            if self._state == 'values':
+                self._values = ()
+                return self._iter_values()
+        else:
+            self._advance_to(key)
+        return self._fields[key]
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
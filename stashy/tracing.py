@@ -0,0 +1,209 @@
+"""
+Span tracing of logical calls, paginated walks and the requests they send.
+
+A client built with ``tracer=Tracer()`` records a span for every decorated resource method
+(e.g. ``PullRequest.merge``), for every paginated walk and each of its pages, and for every
+HTTP request, nested by the call that caused them. The spans export to the Chrome trace
+event format, which chrome://tracing, Perfetto and speedscope load as a flame chart::
+
+    tracer = Tracer()
+    stash = stashy.connect(URL, USER, PASSWORD, tracer=tracer)
+    with tracer.span('audit'):
+        for project in stash.projects:
+            for repo in stash.projects[project['key']].repos:
+                ...
+    tracer.export('stashy-trace.json')
+
+Spans started in your own code with :meth:`Tracer.span` become the parents of the spans
+of the calls made inside them.
+"""
+import asyncio
+import contextvars
+import inspect
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar('stashy_span', default=None)
+
+_ACTIVE = object()
+
+
+def _track():
+    # spans of concurrent asyncio tasks overlap on one thread, so tasks get a track of their own
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return id(task) if task is not None else threading.get_ident()
+
+
+class Span(object):
+    """
+    A timed operation. Spans are recorded by their tracer when they finish.
+    """
+    def __init__(self, tracer, span_id, name, parent_id, attrs):
+        self.tracer = tracer
+        self.id = span_id
+        self.name = name
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.track = _track()
+        self.start = time.perf_counter()
+        self.end = None
+
+    @property
+    def duration(self):
+        return None if self.end is None else self.end - self.start
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self, error=None):
+        if self.end is not None:
+            return
+        self.end = time.perf_counter()
+        if error is not None:
+            self.attrs['error'] = repr(error)
+        self.tracer._record(self)
+
+    def __repr__(self):
+        return '<Span %s %s>' % (self.name, self.attrs)
+
+
+class Tracer(object):
+    """
+    Collects the spans of one or more clients. Thread and task safe.
+    """
+    def __init__(self):
+        self.spans = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._epoch = time.perf_counter()
+
+    def current(self):
+        """
+        The active span of this tracer in the calling thread or task, if any.
+        """
+        span = _current.get()
+        return span if span is not None and span.tracer is self else None
+
+    def start(self, name, parent=_ACTIVE, **attrs):
+        """
+        Start a span, by default as a child of the active one. It is not made active.
+        """
+        if parent is _ACTIVE:
+            parent = self.current()
+        return Span(self, next(self._ids), name, parent.id if parent is not None else None, attrs)
+
+    @contextmanager
+    def activate(self, span):
+        """
+        Make span the parent of the spans started in the block.
+        """
+        token = _current.set(span)
+        try:
+            yield span
+        finally:
+            _current.reset(token)
+
+    @contextmanager
+    def span(self, name, parent=_ACTIVE, **attrs):
+        """
+        Time the block as a span, which is active while the block runs.
+        """
+        span = self.start(name, parent, **attrs)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.finish(e)
+            raise
+        finally:
+            _current.reset(token)
+            span.finish()
+
+    def call(self, name, fn, args, kw, **attrs):
+        """
+        Call fn(*args, **kw) in a span. If it returns an awaitable, the span lasts until
+        that is awaited.
+        """
+        span = self.start(name, **attrs)
+        token = _current.set(span)
+        try:
+            result = fn(*args, **kw)
+        except BaseException as e:
+            span.finish(e)
+            raise
+        finally:
+            _current.reset(token)
+        if inspect.isawaitable(result):
+            return self._finish_after(span, result)
+        span.finish()
+        return result
+
+    async def _finish_after(self, span, awaitable):
+        token = _current.set(span)
+        try:
+            result = await awaitable
+        except BaseException as e:
+            span.finish(e)
+            raise
+        finally:
+            _current.reset(token)
+        span.finish()
+        return result
+
+    def _record(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self):
+        with self._lock:
+            self.spans = []
+
+    def chrome_trace(self):
+        """
+        The finished spans as a Chrome trace event document.
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        pid = os.getpid()
+        events = []
+        for span in spans:
+            args = dict(span.attrs, span_id=span.id)
+            if span.parent_id is not None:
+                args['parent_id'] = span.parent_id
+            events.append({
+                'name': span.name,
+                'cat': 'stashy',
+                'ph': 'X',
+                'ts': (span.start - self._epoch) * 1e6,
+                'dur': (span.end - span.start) * 1e6,
+                'pid': pid,
+                'tid': span.track,
+                'args': {key: value if isinstance(value, (int, float, bool)) or value is None else str(value)
+                         for key, value in args.items()},
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export(self, path):
+        """
+        Write the finished spans to path as a Chrome trace JSON file.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+
+def call(resource, fn, args, kw):
+    """
+    Call a resource method, in a span if the resource's client has a tracer.
+    """
+    tracer = getattr(getattr(resource, '_client', None), 'tracer', None)
+    if tracer is None:
+        return fn(*args, **kw)
+    return tracer.call(getattr(fn, '__qualname__', fn.__name__), fn, args, kw,
+                       path=getattr(resource, '_url', None))
@@ -5,6 +5,8 @@ from .repos import Repos
 
 
 class User(ResourceBase):
+    __slots__ = ('_key',)
+
     def __init__(self, key, url, client, parent):
         super(User, self).__init__(url, client, parent)
         self._key = key
@@ -17,6 +19,8 @@ class User(ResourceBase):
 
 
 class Users(ResourceBase, IterableResource):
+    __slots__ = ()
+
     @response_or_error
     def get(self, user):
         """
@@ -0,0 +1,13 @@
+from requests.models import Response
+
+
+def response(status_code=200, content=b'{}', headers=None):
+    """
+    A requests Response with the given status, body and headers, as returned by a session.
+    """
+    resp = Response()
+    resp.status_code = status_code
+    resp.headers.update(headers or {})
+    resp._content = content
+    resp._content_consumed = True
+    return resp
@@ -0,0 +1,43 @@
+import asyncio
+import json
+from unittest import TestCase
+from mock import patch
+
+from stashy.aio import AsyncResponse, AsyncStash
+
+
+def fake_request(pages):
+    async def _request(client, method, resource, data=None, params=None, **kw):
+        start = (params or {}).get('start', 0)
+        body = json.dumps(pages[start]).encode('utf-8')
+        return AsyncResponse(200, 'OK', client.url(resource), {}, body)
+    return _request
+
+
+class TestAsyncStash(TestCase):
+    def setUp(self):
+        self.stash = AsyncStash("http://example.com/stash")
+
+    def test_paginate_follows_next_page_start(self):
+        pages = {0: {'values': [1, 2], 'isLastPage': False, 'nextPageStart': 2},
+                 2: {'values': [3], 'isLastPage': True, 'nextPageStart': None}}
+        with patch('stashy.aio.AsyncStashClient._request', fake_request(pages)):
+            result = asyncio.run(self.stash.projects.list())
+        self.assertEqual([1, 2, 3], result)
+
+    def test_response_or_error_is_awaitable(self):
+        pages = {0: {'canMerge': True, 'conflicted': False}}
+        with patch('stashy.aio.AsyncStashClient._request', fake_request(pages)):
+            result = asyncio.run(self.stash.projects['P'].repos['r'].pull_requests[1].can_merge())
+        self.assertTrue(result)
+
+    def test_lazy_diff_files(self):
+        async def _request(client, method, resource, data=None, params=None, **kw):
+            path = resource.rsplit('/diff/', 1)[1]
+            body = json.dumps({'diffs': [{'destination': {'toString': path}}]}).encode('utf-8')
+            return AsyncResponse(200, 'OK', client.url(resource), {}, body)
+
+        diff = self.stash.projects['P'].repos['r'].pull_requests[1].lazy_diff()
+        with patch('stashy.aio.AsyncStashClient._request', _request):
+            result = asyncio.run(diff.files(['a.py', 'b.py', 'c.py'], workers=2))
+        self.assertEqual(['a.py', 'b.py', 'c.py'], [d.destination.toString for d in result])
@@ -0,0 +1,36 @@
+import asyncio
+from unittest import TestCase
+
+from stashy.batch import Batch
+
+
+class TestBatch(TestCase):
+    def test_collects_results_and_failures(self):
+        def grant(user, permission):
+            if user == 'bob':
+                raise ValueError("no such user")
+            return user, permission
+
+        with Batch(max_workers=4) as batch:
+            for user in ['alice', 'bob', 'carol']:
+                batch.add(grant, user, 'REPO_READ')
+
+        self.assertEqual(3, len(batch.report))
+        self.assertEqual([('alice', 'REPO_READ'), ('carol', 'REPO_READ')],
+                         [op.result for op in batch.report.succeeded])
+        self.assertEqual(['bob'], [op.args[0] for op in batch.report.failed])
+        self.assertRaises(ValueError, batch.report.raise_for_errors)
+
+    def test_async_batch(self):
+        async def grant(user):
+            return user
+
+        async def main():
+            async with Batch(max_workers=2) as batch:
+                for user in ['alice', 'bob', 'carol']:
+                    batch.add(grant, user)
+            return batch.report
+
+        report = asyncio.run(main())
+        self.assertTrue(report.ok)
+        self.assertEqual(['alice', 'bob', 'carol'], [op.result for op in report])
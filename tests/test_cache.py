@@ -0,0 +1,167 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import TestCase
+from mock import patch
+
+from stashy.cache import IMMUTABLE, SingleFlight, SQLiteStore
+from stashy.client import StashClient
+
+from .fakes import response
+
+
+class TestConditionalCache(TestCase):
+    def setUp(self):
+        self.client = StashClient("http://example.com/stash", http_cache=True)
+
+    def test_not_modified_is_served_from_cache(self):
+        responses = [response(200, b'{"id": 1}', {'ETag': '"v1"'}), response(304)]
+        with patch('requests.Session.request', side_effect=lambda *a, **kw: responses.pop(0)) as request:
+            self.assertEqual({'id': 1}, self.client.get('api/1.0/projects/P').json())
+            second = self.client.get('api/1.0/projects/P')
+        self.assertEqual(200, second.status_code)
+        self.assertEqual({'id': 1}, second.json())
+        self.assertEqual('"v1"', request.call_args[1]['headers']['If-None-Match'])
+        self.assertEqual(1, self.client.http_cache.stats['hits'])
+
+    def test_responses_without_validators_are_not_stored(self):
+        with patch('requests.Session.request', return_value=response(200, b'{}')):
+            self.client.get('api/1.0/projects/P')
+        self.assertEqual(0, len(self.client.http_cache))
+
+
+class TestResponseCache(TestCase):
+    def setUp(self):
+        self.client = StashClient("http://example.com/stash", cache=True)
+        self.commit = 'api/1.0/projects/P/repos/r/commits/' + 'a' * 40
+
+    def test_commit_by_hash_is_cached(self):
+        with patch('requests.Session.request', return_value=response(200, b'{"id": 1}')) as request:
+            self.assertEqual({'id': 1}, self.client.get(self.commit).json())
+            self.assertEqual({'id': 1}, self.client.get(self.commit).json())
+        self.assertEqual(1, request.call_count)
+        self.assertEqual(1, self.client.cache.stats['immutable_hits'])
+
+    def test_branch_refs_are_not_cached(self):
+        with patch('requests.Session.request', return_value=response(200, b'{}')) as request:
+            self.client.get('api/1.0/projects/P/repos/r/changes', params=dict(until='master'))
+            self.client.get('api/1.0/projects/P/repos/r/changes', params=dict(until='master'))
+        self.assertEqual(2, request.call_count)
+
+    def test_build_status_is_not_immutable(self):
+        build_status = 'build-status/1.0/commits/' + 'a' * 40
+        self.assertFalse(IMMUTABLE.matches(build_status, None))
+        self.assertNotEqual(IMMUTABLE, self.client.cache.policy_for(build_status, None))
+        with patch('requests.Session.request', return_value=response(200, b'{"values": []}')) as request:
+            self.client.get(build_status)
+            self.client.get(build_status)
+        self.assertEqual(2, request.call_count)
+
+    def test_metadata_is_invalidated_by_writes(self):
+        repo = 'api/1.0/projects/P/repos/r'
+        with patch('requests.Session.request', return_value=response(200, b'{}')) as request:
+            self.client.get(repo)
+            self.client.get(repo)
+            self.client.put(repo, dict(name='renamed'))
+            self.client.get(repo)
+        self.assertEqual(3, request.call_count)
+
+    def test_persistent_store_survives_restarts(self):
+        path = os.path.join(tempfile.mkdtemp(), 'cache.db')
+        with patch('requests.Session.request', return_value=response(200, b'{"id": 1}')) as request:
+            StashClient("http://example.com/stash", cache_path=path).get(self.commit)
+            restarted = StashClient("http://example.com/stash", cache_path=path)
+            self.assertEqual({'id': 1}, restarted.get(self.commit).json())
+        self.assertEqual(1, request.call_count)
+        self.assertEqual(1, restarted.cache.stats['persistent_hits'])
+
+
+class TestSQLiteStore(TestCase):
+    def test_evicts_least_recently_used(self):
+        store = SQLiteStore(os.path.join(tempfile.mkdtemp(), 'cache.db'), max_bytes=10)
+        store.put('a', b'12345', {})
+        store.put('b', b'12345', {})
+        store.put('c', b'12345', {})
+        self.assertIsNone(store.get('a'))
+        self.assertEqual(b'12345', store.get('c')[0])
+        self.assertEqual(10, store.size)
+
+    def test_size_is_kept_across_replacements_and_restarts(self):
+        path = os.path.join(tempfile.mkdtemp(), 'cache.db')
+        store = SQLiteStore(path, max_bytes=100)
+        store.put('a', b'12345', {})
+        store.put('a', b'123', {})
+        store.put('b', b'1234', {})
+        store.pop('b')
+        self.assertEqual(3, store.size)
+        self.assertEqual(3, SQLiteStore(path, max_bytes=100).size)
+        store.clear()
+        self.assertEqual(0, store.size)
+
+
+class TestSingleFlight(TestCase):
+    def test_concurrent_gets_share_one_request(self):
+        client = StashClient("http://example.com/stash", coalesce=True)
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_request(*args, **kw):
+            started.set()
+            release.wait(5)
+            return response(200, b'{"id": 1}')
+
+        results = []
+        with patch('requests.Session.request', side_effect=slow_request) as request:
+            leader = threading.Thread(target=lambda: results.append(client.get('api/1.0/projects/P')))
+            leader.start()
+            started.wait(5)
+            followers = [threading.Thread(target=lambda: results.append(client.get('api/1.0/projects/P')))
+                         for _ in range(3)]
+            for follower in followers:
+                follower.start()
+            deadline = time.monotonic() + 5
+            while client.single_flight.coalesced < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            coalesced = client.single_flight.coalesced
+            release.set()
+            for thread in [leader] + followers:
+                thread.join(5)
+        self.assertEqual(3, coalesced)
+        self.assertEqual(1, request.call_count)
+        self.assertEqual(4, len(set(id(r) for r in results)))
+        self.assertEqual([{'id': 1}] * 4, [r.json() for r in results])
+
+    def test_waiters_get_the_leaders_interruption(self):
+        class Interrupted(BaseException):
+            pass
+
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def interrupted():
+            started.set()
+            release.wait(5)
+            raise Interrupted()
+
+        errors = []
+
+        def wait_for_leader():
+            try:
+                flight.do('key', lambda: response())
+            except Interrupted as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=lambda: self.assertRaises(Interrupted, flight.do, 'key', interrupted))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=wait_for_leader)
+        follower.start()
+        deadline = time.monotonic() + 5
+        while flight.coalesced < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+        self.assertEqual(1, len(errors))
@@ -0,0 +1,79 @@
+import io
+import os
+import tempfile
+from unittest import TestCase
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from urllib3.response import HTTPResponse
+from mock import patch
+
+from stashy.cassette import Cassette, CassetteMiss
+from stashy.client import StashClient
+from stashy.pullrequests import PullRequest
+from stashy.repos import Repos
+
+from .fakes import response
+
+
+def page(values, start, last):
+    return {'values': values, 'start': start, 'size': len(values), 'isLastPage': last,
+            'nextPageStart': None if last else start + len(values)}
+
+
+class TestCassette(TestCase):
+    def test_replay(self):
+        cassette = Cassette()
+        cassette.add('GET', '/rest/api/1.0/merge', {'canMerge': False, 'vetoes': [{'summaryMessage': 'No'}]})
+        client = StashClient("http://example.com/stash", cassette=cassette)
+
+        pr = PullRequest(1, '', client, None)
+        self.assertIs(False, pr.can_merge())
+        self.assertEqual(1, len(pr.merge_info()['vetoes']))
+        self.assertRaises(CassetteMiss, client.get, '/api/1.0/projects')
+
+    def test_pages_are_assembled_for_other_limits(self):
+        cassette = Cassette()
+        path = '/rest/api/1.0/projects/P/repos'
+        cassette.add('GET', path, page([0, 1, 2], 0, False), params={'limit': 3})
+        cassette.add('GET', path, page([3, 4, 5], 3, False), params={'limit': 3, 'start': 3})
+        cassette.add('GET', path, page([6], 6, True), params={'limit': 3, 'start': 6})
+        repos = Repos('projects/P/repos', StashClient("http://example.com/stash", cassette=cassette), None)
+
+        self.assertEqual(list(range(7)), repos.list(limit=3))
+        self.assertEqual(list(range(7)), repos.list(limit=2))
+        self.assertEqual(list(range(7)), repos.list())
+
+    def test_record_and_load(self):
+        recorded = response(content=b'{"key": "P"}', headers={'Set-Cookie': 'secret'})
+        path = os.path.join(tempfile.mkdtemp(), 'job.cassette')
+
+        with Cassette(path, mode='record') as cassette:
+            client = StashClient("http://example.com/stash", cassette=cassette)
+            with patch.object(HTTPAdapter, 'send', return_value=recorded) as send:
+                client.get('/api/1.0/projects/P', params={'avatarSize': 64})
+            self.assertEqual(1, send.call_count)
+
+        client = StashClient("http://example.com/stash", cassette=Cassette(path))
+        replayed = client.get('/api/1.0/projects/P', params={'avatarSize': 64})
+        self.assertEqual({'key': 'P'}, replayed.json())
+        self.assertNotIn('Set-Cookie', replayed.headers)
+
+    def test_streamed_responses_are_recorded_as_they_are_read(self):
+        content = bytes(range(256)) * 4
+        streamed = Response()
+        streamed.status_code = 200
+        streamed.raw = HTTPResponse(body=io.BytesIO(content), preload_content=False)
+        cassette = Cassette(mode='record')
+        client = StashClient("http://example.com/stash", cassette=cassette)
+        with patch.object(HTTPAdapter, 'send', return_value=streamed):
+            received = client.get('/api/1.0/projects/P/repos/r/raw/file', stream=True)
+            chunks = received.iter_content(256)
+            first = next(chunks)
+            # not buffered by the recording
+            self.assertFalse(received._content_consumed)
+            self.assertEqual(b'', cassette.interactions[0].body)
+            self.assertEqual(content, first + b''.join(chunks))
+        self.assertEqual(content, cassette.interactions[0].body)
+
+        cassette.mode = 'replay'
+        self.assertEqual(content, client.get('/api/1.0/projects/P/repos/r/raw/file', stream=True).content)
@@ -1,5 +1,10 @@
+import time
 from unittest import TestCase
-from stashy.client import StashClient
+from mock import patch
+
+from stashy.client import Stash, StashClient
+
+from .fakes import response
 
 
 class TestStashClient(TestCase):
@@ -10,3 +15,36 @@ class TestStashClient(TestCase):
     def test_url_with_slash_prefix(self):
         client = StashClient("http://example.com/stash")
         self.assertEqual("http://example.com/stash/rest/api/1.0/admin/groups", client.url("/api/1.0/admin/groups"))
+
+    def test_construction_makes_no_request(self):
+        with patch('requests.Session.request') as request:
+            Stash("http://example.com/stash", "admin", "admin")
+        self.assertFalse(request.called)
+
+    def test_warm_up_nothing(self):
+        client = StashClient("http://example.com/stash")
+        with patch('requests.Session.head') as head:
+            self.assertEqual(0, client.warm_up(0))
+        self.assertFalse(head.called)
+
+    def test_warm_up_is_capped_at_pool_size(self):
+        client = StashClient("http://example.com/stash", pool_maxsize=2, pool_block=True)
+        client.warm_up_timeout = 5
+        with patch('requests.Session.head') as head:
+            self.assertEqual(2, client.warm_up(8))
+        self.assertEqual(2, head.call_count)
+
+    def test_warm_up_does_not_wait_for_a_failed_connection(self):
+        client = StashClient("http://example.com/stash", pool_maxsize=4)
+        client.warm_up_timeout = 10
+        failures = [ConnectionError("refused")]
+
+        def head(*args, **kw):
+            if failures:
+                raise failures.pop()
+            return response()
+
+        started = time.monotonic()
+        with patch('requests.Session.head', side_effect=head):
+            self.assertEqual(3, client.warm_up(4))
+        self.assertLess(time.monotonic() - started, 5)
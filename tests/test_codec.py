@@ -0,0 +1,54 @@
+import datetime
+from unittest import TestCase
+from mock import patch
+
+import pytest
+
+from stashy.client import StashClient
+from stashy.codec import JSONCodec, OrjsonCodec, default_codec
+from stashy.projects import Projects
+
+from .fakes import response
+
+
+class RecordingCodec(JSONCodec):
+    def __init__(self):
+        self.decoded = []
+
+    def loads(self, data):
+        self.decoded.append(data)
+        return super(RecordingCodec, self).loads(data)
+
+
+class TestCodec(TestCase):
+    def test_default_codec(self):
+        with patch.object(OrjsonCodec, '__init__', side_effect=ImportError):
+            self.assertIs(type(default_codec()), JSONCodec)
+
+    def test_default_codec_prefers_orjson(self):
+        pytest.importorskip('orjson')
+        self.assertIsInstance(default_codec(), OrjsonCodec)
+
+    def test_orjson_codec(self):
+        pytest.importorskip('orjson')
+        codec = OrjsonCodec()
+        self.assertEqual(b'{"key":"A","at":"2020-01-02T00:00:00"}',
+                         codec.dumps({'key': 'A', 'at': datetime.datetime(2020, 1, 2)}))
+        # beyond what orjson encodes
+        self.assertEqual('{"id": 1180591620717411303424}', codec.dumps({'id': 2 ** 70}))
+        self.assertEqual({'values': [1]}, codec.loads(b'{"values": [1]}'))
+        self.assertRaises(ValueError, codec.loads, b'{"values": ')
+
+    def test_pages_are_decoded_from_bytes_by_client_codec(self):
+        codec = RecordingCodec()
+        client = StashClient("http://example.com/stash", codec=codec)
+        page = b'{"values": [{"key": "A"}], "isLastPage": true}'
+        with patch.object(client, 'get', return_value=response(content=page)):
+            self.assertEqual(['A'], [p['key'] for p in Projects('projects', client, None)])
+        self.assertEqual([page], codec.decoded)
+
+    def test_request_bodies_are_encoded_by_client_codec(self):
+        client = StashClient("http://example.com/stash", codec=JSONCodec())
+        with patch.object(client, '_request', return_value=response()) as request:
+            client.post('projects', {'key': 'A'})
+        self.assertEqual('{"key": "A"}', request.call_args[1]['data'])
@@ -0,0 +1,86 @@
+from unittest import TestCase
+
+from stashy.diffs import Diff, DiffStats
+
+
+def file_info(path):
+    components = path.split('/')
+    return {'components': components, 'parent': '/'.join(components[:-1]), 'name': components[-1],
+            'toString': path}
+
+
+class TestDiff(TestCase):
+    def test_fields_read_from_decoded_json(self):
+        data = {'source': file_info('src/a.py'), 'destination': file_info('src/b.py'),
+                'hunks': [{'segments': []}], 'truncated': False}
+        diff = Diff(data)
+
+        self.assertEqual('a.py', diff.source.name)
+        self.assertEqual('src/b.py', diff.destination.toString)
+        self.assertEqual('', diff.destination.extension)
+        self.assertIs(data['hunks'], diff.hunks)
+        self.assertEqual([], diff.line_comments)
+        self.assertFalse(diff.truncated)
+
+    def test_added_file_has_no_source(self):
+        diff = Diff({'destination': file_info('new.txt')})
+        self.assertIsNone(diff.source)
+        self.assertEqual([], diff.hunks)
+        self.assertFalse(hasattr(diff, '__dict__'))
+
+
+def segment(kind, source, destination, count):
+    return {'type': kind, 'lines': [{'source': source + i, 'destination': destination + i, 'line': '%s %d' % (kind, i)}
+                                    for i in range(count)]}
+
+
+class TestHunks(TestCase):
+    def setUp(self):
+        # source lines 10-11 context, 12-13 removed, 14 context; destination 10-11, 12-14 added, 15
+        hunk = {'sourceLine': 10, 'sourceSpan': 5, 'destinationLine': 10, 'destinationSpan': 6, 'segments': [
+            segment('CONTEXT', 10, 10, 2), segment('REMOVED', 12, 12, 2), segment('ADDED', 14, 12, 3),
+            segment('CONTEXT', 14, 15, 1)]}
+        far = {'segments': [segment('ADDED', 100, 90, 1)]}
+        self.diff = Diff({'source': file_info('old.py'), 'destination': file_info('new.py'), 'hunks': [hunk, far]})
+
+    def test_structured_hunks(self):
+        hunk = self.diff.structured_hunks[0]
+        self.assertEqual(8, len(hunk))
+        self.assertEqual(['CONTEXT', 'REMOVED', 'ADDED', 'CONTEXT'], [s.type for s in hunk.segments])
+        self.assertEqual([3, 1], [len(s) for s in hunk.segments[2:]])
+        line = hunk.segments[2].lines[1]
+        self.assertEqual((14 + 1, 13, 'ADDED', 'ADDED 1'), (line.source, line.destination, line.type, line.text))
+        self.assertEqual([10, 11, 12, 13, 12, 13, 14, 15], list(hunk.destinations))
+
+    def test_index(self):
+        index = self.diff.index
+        self.assertEqual(['CONTEXT', 'CONTEXT', 'ADDED', 'ADDED', 'ADDED', 'CONTEXT', None],
+                         [index.destination(n) for n in range(10, 17)])
+        self.assertEqual('ADDED', index.destination(90))
+        self.assertEqual(['CONTEXT', 'REMOVED', 'REMOVED', 'CONTEXT', None], [index.source(n) for n in range(11, 16)])
+        self.assertIsNone(index.destination(9))
+
+    def test_anchors(self):
+        self.assertEqual([dict(srcPath='new.py', fileLine=12, lineType='ADDED', fileType='TO'), None],
+                         self.diff.anchors([12, 50]))
+        self.assertEqual(dict(srcPath='new.py', fileLine=13, lineType='REMOVED', fileType='FROM'),
+                         self.diff.anchor(13, fileType='FROM'))
+
+
+class TestDiffStats(TestCase):
+    def test_counts_lines_per_file_and_in_total(self):
+        moved = {'source': file_info('old.py'), 'destination': file_info('new.py'), 'hunks': [
+            {'segments': [segment('CONTEXT', 1, 1, 3), segment('REMOVED', 4, 4, 2), segment('ADDED', 6, 4, 5)]},
+            {'segments': [segment('ADDED', 20, 22, 1)], 'truncated': True}]}
+        deleted = {'source': file_info('gone.py'), 'hunks': [{'segments': [segment('REMOVED', 1, 0, 4)]}]}
+        binary = {'source': file_info('a.png'), 'destination': file_info('a.png'), 'binary': True}
+
+        stats = DiffStats([moved, deleted, binary])
+
+        self.assertEqual([('new.py', 'old.py', 2, 6, 2, 3, True), ('gone.py', None, 1, 0, 4, 0, False)],
+                         [(f.path, f.src_path, f.hunks, f.added, f.removed, f.context, f.truncated)
+                          for f in stats.files[:2]])
+        self.assertTrue(stats.files[2].binary)
+        self.assertEqual((3, 6, 6, 3, 12, True),
+                         (stats.hunks, stats.added, stats.removed, stats.context, stats.changed, stats.truncated))
+        self.assertEqual(6, Diff(moved).stats.added)
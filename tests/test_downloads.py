@@ -0,0 +1,204 @@
+import io
+import os
+import tempfile
+from unittest import TestCase
+from mock import patch
+from requests.exceptions import ChunkedEncodingError
+from requests.models import Response
+
+import stashy
+from stashy.downloads import DownloadSizeMismatch, range_headers
+
+CONTENT = bytes(range(256)) * 40
+
+
+def fake_get(honour_range=True, calls=None):
+    def get(client, resource, params=None, headers=None, **kw):
+        if calls is not None:
+            calls.append((resource, params, headers))
+        response = Response()
+        response.status_code = 200
+        response._content = CONTENT
+        response._content_consumed = True
+        spec = (headers or {}).get('Range')
+        if spec and honour_range:
+            start, end = spec[len('bytes='):].split('-')
+            start = int(start)
+            if start >= len(CONTENT):
+                response.status_code, response._content = 416, b''
+            else:
+                response.status_code = 206
+                response._content = CONTENT[start:int(end) + 1 if end else None]
+        return response
+    return get
+
+
+class TestRawFile(TestCase):
+    def setUp(self):
+        self.repo = stashy.connect("http://example.com/stash").projects['PRJ'].repos['repo']
+
+    def test_chunks_need_the_blocking_client(self):
+        repo = stashy.AsyncStash("http://example.com/stash").projects['PRJ'].repos['repo']
+        self.assertRaises(TypeError, list, repo.raw('README.md').chunks())
+        self.assertRaises(TypeError, list, repo.archive().chunks())
+
+    def test_range_headers(self):
+        self.assertEqual({}, range_headers())
+        self.assertEqual('bytes=10-', range_headers(10)['Range'])
+        self.assertEqual('bytes=0-9', range_headers(end=10)['Range'])
+        self.assertEqual('bytes=5-9', range_headers(5, 10)['Range'])
+        self.assertRaises(ValueError, range_headers, 5, 5)
+
+    def test_chunks(self):
+        calls = []
+        with patch('stashy.client.StashClient.get', fake_get(calls=calls)):
+            chunks = list(self.repo.raw('/docs/a b.bin', at='master').chunks(chunk_size=1000))
+        self.assertEqual(CONTENT, b''.join(chunks))
+        self.assertEqual(1000, len(chunks[0]))
+        self.assertEqual(('api/1.0/projects/PRJ/repos/repo/raw/docs/a%20b.bin', {'at': 'master'}, {}),
+                         calls[0])
+
+    def test_ranges_with_and_without_server_support(self):
+        for honour_range in (True, False):
+            with patch('stashy.client.StashClient.get', fake_get(honour_range)):
+                raw = self.repo.raw('a.bin')
+                self.assertEqual(CONTENT[1000:5000], b''.join(raw.chunks(1000, 5000, chunk_size=300)))
+                self.assertEqual(CONTENT[:10], raw.read(end=10))
+                self.assertEqual(CONTENT[10000:], raw.read(10000))
+                self.assertEqual(b'', raw.read(len(CONTENT) + 1))
+
+    def test_save_to_path_and_file_object(self):
+        with patch('stashy.client.StashClient.get', fake_get()):
+            raw = self.repo.raw('a.bin')
+            f = io.BytesIO()
+            self.assertEqual(100, raw.save(f, start=50, end=150))
+            self.assertEqual(CONTENT[50:150], f.getvalue())
+
+            fd, path = tempfile.mkstemp()
+            os.close(fd)
+            try:
+                self.assertEqual(len(CONTENT), raw.save(path))
+                with open(path, 'rb') as saved:
+                    self.assertEqual(CONTENT, saved.read())
+            finally:
+                os.remove(path)
+
+
+class InterruptedResponse(Response):
+    """
+    A response whose body stops with a connection error after cut bytes.
+    """
+    def __init__(self, status_code, content, headers, cut=None):
+        super(InterruptedResponse, self).__init__()
+        self.status_code = status_code
+        self._content = content
+        self._content_consumed = True
+        self.headers.update(headers)
+        self.cut = cut
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        sent = 0
+        for i in range(0, len(self._content), 1000):
+            if self.cut is not None and sent >= self.cut:
+                raise ChunkedEncodingError('Connection broken')
+            chunk = self._content[i:i + 1000]
+            sent += len(chunk)
+            yield chunk
+
+
+def fake_archive(cuts, honour_range=True, calls=None):
+    cuts = list(cuts)
+
+    def get(client, resource, params=None, headers=None, **kw):
+        calls.append((params, dict(headers)))
+        cut = cuts.pop(0) if cuts else None
+        spec = headers.get('Range')
+        if spec and honour_range:
+            start = int(spec[len('bytes='):-1])
+            if start >= len(CONTENT):
+                return InterruptedResponse(416, b'', {'Content-Range': 'bytes */%d' % len(CONTENT)})
+            return InterruptedResponse(206, CONTENT[start:], {
+                'Content-Range': 'bytes %d-%d/%d' % (start, len(CONTENT) - 1, len(CONTENT)), 'ETag': '"v1"'}, cut)
+        return InterruptedResponse(200, CONTENT, {'Content-Length': str(len(CONTENT)), 'ETag': '"v1"'}, cut)
+    return get
+
+
+class TestArchive(TestCase):
+    def setUp(self):
+        self.repo = stashy.connect("http://example.com/stash").projects['PRJ'].repos['repo']
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'repo.zip')
+
+    def tearDown(self):
+        for name in os.listdir(self.dir):
+            os.remove(os.path.join(self.dir, name))
+        os.rmdir(self.dir)
+
+    def saved(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def test_resumes_after_interruptions(self):
+        calls = []
+        with patch('stashy.client.StashClient.get', fake_archive([3000, 2000], calls=calls)):
+            size = self.repo.archive(at='abc123', format='tar.gz', path=self.path, prefix='repo/')
+        self.assertEqual(len(CONTENT), size)
+        self.assertEqual(CONTENT, self.saved())
+        self.assertEqual({'at': 'abc123', 'format': 'tar.gz', 'prefix': 'repo/'}, calls[0][0])
+        self.assertEqual([None, 'bytes=3000-', 'bytes=5000-'], [headers.get('Range') for _, headers in calls])
+        self.assertEqual('"v1"', calls[1][1]['If-Range'])
+        self.assertEqual(['repo.zip'], os.listdir(self.dir))
+
+    def test_restarts_when_the_server_ignores_ranges(self):
+        calls = []
+        with patch('stashy.client.StashClient.get', fake_archive([3000], honour_range=False, calls=calls)):
+            self.assertEqual(len(CONTENT), self.repo.archive(path=self.path))
+        self.assertEqual(CONTENT, self.saved())
+
+    def test_resumes_a_partial_file(self):
+        with open(self.path + '.part', 'wb') as f:
+            f.write(CONTENT[:4000])
+        calls = []
+        with patch('stashy.client.StashClient.get', fake_archive([], calls=calls)):
+            self.assertEqual(len(CONTENT), self.repo.archive(path=self.path, size=len(CONTENT)))
+        self.assertEqual(CONTENT, self.saved())
+        self.assertEqual('bytes=4000-', calls[0][1]['Range'])
+
+    def test_complete_partial_file_is_checked(self):
+        for leftover, requests_made in ((CONTENT, 1), (CONTENT + b'garbage', 2)):
+            with open(self.path + '.part', 'wb') as f:
+                f.write(leftover)
+            calls = []
+            with patch('stashy.client.StashClient.get', fake_archive([], calls=calls)):
+                self.assertEqual(len(CONTENT), self.repo.archive(path=self.path))
+            self.assertEqual(CONTENT, self.saved())
+            self.assertEqual(requests_made, len(calls))
+            self.assertEqual('bytes=%d-' % len(leftover), calls[0][1]['Range'])
+
+    def test_restarts_when_a_range_starts_elsewhere(self):
+        with open(self.path + '.part', 'wb') as f:
+            f.write(CONTENT[:4000])
+        calls = []
+        resume = fake_archive([], calls=calls)
+
+        def get(client, resource, params=None, headers=None, **kw):
+            if headers.get('Range'):
+                # a range other than the one requested
+                return resume(client, resource, params, dict(headers, Range='bytes=1000-'), **kw)
+            return resume(client, resource, params, headers, **kw)
+
+        with patch('stashy.client.StashClient.get', get):
+            self.assertEqual(len(CONTENT), self.repo.archive(path=self.path))
+        self.assertEqual(CONTENT, self.saved())
+        self.assertEqual(['bytes=1000-', None], [headers.get('Range') for _, headers in calls])
+
+    def test_gives_up_and_checks_size(self):
+        with patch('stashy.client.StashClient.get', fake_archive([1000] * 5, calls=[])):
+            self.assertRaises(ChunkedEncodingError, self.repo.archive, path=self.path)
+        self.assertEqual(5000, os.path.getsize(self.path + '.part'))
+
+        with patch('stashy.client.StashClient.get', fake_archive([], calls=[])):
+            archive = self.repo.archive()
+            self.assertRaises(DownloadSizeMismatch, archive.save, self.path, size=10, resume=False)
+            self.assertFalse(os.path.exists(self.path))
+            self.assertEqual(CONTENT, b''.join(archive.chunks()))
@@ -0,0 +1,118 @@
+import json
+from unittest import TestCase
+from mock import patch
+
+from stashy.client import StashClient
+from stashy.helpers import AdaptivePageSize, ResourceBase, IterableResource
+from stashy.projects import Project
+
+from .fakes import response
+
+
+class Listing(ResourceBase, IterableResource):
+    pass
+
+
+def fake_pages(total, page_size=25):
+    """
+    A stub StashClient.get() serving total items, page_size at a time.
+    """
+    requested = []
+
+    def get(stash_client, url, params=None, **kw):
+        start = int((params or {}).get('start', 0))
+        requested.append(start)
+        end = min(start + page_size, total)
+        return response(content=json.dumps({'values': list(range(start, end)),
+                                            'size': end - start,
+                                            'isLastPage': end >= total,
+                                            'nextPageStart': None if end >= total else end}).encode('utf-8'))
+    return get, requested
+
+
+class TestPaginate(TestCase):
+    def setUp(self):
+        self.client = StashClient("http://example.com/stash")
+        self.listing = Listing('projects', self.client, None)
+
+    def test_paginate_sequential(self):
+        get, requested = fake_pages(60)
+        with patch('stashy.client.StashClient.get', get):
+            self.assertEqual(list(range(60)), self.listing.list())
+        self.assertEqual([0, 25, 50], requested)
+
+    def test_paginate_prefetch(self):
+        get, requested = fake_pages(60)
+        with patch('stashy.client.StashClient.get', get):
+            self.assertEqual(list(range(60)), self.listing.list(prefetch=2))
+        self.assertEqual([0, 25, 50], requested)
+
+    def test_paginate_parallel(self):
+        get, requested = fake_pages(60)
+        with patch('stashy.client.StashClient.get', get):
+            self.assertEqual(list(range(60)), self.listing.list(workers=4))
+        self.assertEqual([0, 25, 50], sorted(requested)[:3])
+
+    def test_paginate_parallel_rebases_on_capped_limit(self):
+        get, requested = fake_pages(60, page_size=10)
+        with patch('stashy.client.StashClient.get', get):
+            self.assertEqual(list(range(60)), self.listing.list(workers=3))
+
+    def test_paginate_limit(self):
+        get, requested = fake_pages(60, page_size=30)
+        with patch('stashy.client.StashClient.get', get):
+            self.assertEqual(list(range(60)), self.listing.list(limit=30))
+        self.assertEqual([0, 30], requested)
+
+    def test_streamed_adaptive_paging_keeps_page_size(self):
+        client = StashClient("http://example.com/stash", page_size=30, adaptive_paging=True, stream_pages=True)
+        get, requested = fake_pages(60, page_size=30)
+        limits = []
+
+        def recording_get(stash_client, url, params=None, **kw):
+            limits.append((params or {}).get('limit'))
+            return get(stash_client, url, params, **kw)
+
+        with patch('stashy.client.StashClient.get', recording_get):
+            self.assertEqual(list(range(60)), Listing('projects', client, None).list())
+            self.assertEqual(list(range(60)), self.listing.list(stream=True, adaptive=True, limit=30))
+        self.assertEqual([30, 30, 30, 30], limits)
+
+
+class TestAdaptivePageSize(TestCase):
+    def test_grows_while_faster_per_item(self):
+        sizer = AdaptivePageSize(25, 1000, 5.0)
+        sizer.update(25, {'values': [0] * 25, 'isLastPage': False}, 0.5)
+        self.assertEqual(50, sizer.limit)
+        sizer.update(50, {'values': [0] * 50, 'isLastPage': False}, 1.5)
+        self.assertEqual(50, sizer.limit)
+
+    def test_shrinks_when_slow(self):
+        sizer = AdaptivePageSize(400, 1000, 5.0)
+        sizer.update(400, {'values': [0] * 400, 'isLastPage': False}, 6.0)
+        self.assertEqual(200, sizer.limit)
+
+    def test_capped_by_server_limit(self):
+        sizer = AdaptivePageSize(2000, 5000, 5.0)
+        sizer.update(2000, {'values': [0] * 1000, 'limit': 1000, 'isLastPage': False}, 0.5)
+        self.assertEqual(1000, sizer.limit)
+        self.assertEqual(1000, sizer.maximum)
+
+
+class TestResourceBase(TestCase):
+    def setUp(self):
+        self.client = StashClient("http://example.com/stash")
+
+    def test_url_variants(self):
+        project = Project('PRJ', 'projects/PRJ', self.client, None)
+        self.assertEqual('api/1.0/projects/PRJ/repos', project.url('repos'))
+        self.assertEqual('branch-utils/1.0/projects/PRJ/x', project.url('/x', is_branches=True))
+        self.assertEqual('keys/1.0/projects/PRJ', project.url(is_keys=True))
+        self.assertEqual('api/1.0/projects/PRJ', Project('PRJ', 'api/1.0/projects/PRJ', self.client, None).url())
+
+    def test_nested_children_are_kept_by_parent(self):
+        project = Project('PRJ', 'projects/PRJ', self.client, None)
+        self.assertIs(project.repos, project.repos)
+        self.assertIs(project, project.repos._parent)
+        self.assertEqual('api/1.0/projects/PRJ/permissions', project.permissions.url())
+        self.assertFalse(hasattr(project, '__dict__'))
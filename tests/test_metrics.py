@@ -0,0 +1,58 @@
+from unittest import TestCase
+from mock import patch
+
+from stashy.client import StashClient
+from stashy.metrics import MetricsAggregator, endpoint_template
+
+from .fakes import response
+
+
+class TestEndpointTemplate(TestCase):
+    def test_identifiers_are_replaced(self):
+        self.assertEqual('api/1.0/projects/{key}/repos/{slug}/pull-requests/{id}/activities',
+                         endpoint_template('/api/1.0/projects/PRJ/repos/my-repo/pull-requests/12/activities'))
+        self.assertEqual('api/1.0/projects/{key}/repos/{slug}/browse/{path}',
+                         endpoint_template('/api/1.0/projects/PRJ/repos/r/browse/src/main.py'))
+        self.assertEqual('branch-utils/1.0/projects/{key}/repos/{slug}/branches',
+                         endpoint_template('/branch-utils/1.0/projects/PRJ/repos/r/branches'))
+        self.assertEqual('api/1.0/projects', endpoint_template('/api/1.0/projects'))
+
+    def test_actions_are_kept(self):
+        self.assertEqual('api/1.0/admin/groups/more-members', endpoint_template('/api/1.0/admin/groups/more-members'))
+        self.assertEqual('api/1.0/admin/groups/add-user', endpoint_template('/api/1.0/admin/groups/add-user'))
+        self.assertEqual('api/1.0/admin/users/add-groups', endpoint_template('/api/1.0/admin/users/add-groups'))
+        self.assertEqual('api/1.0/projects/{key}/repos/{slug}/pull-requests/{id}/participants/status',
+                         endpoint_template('/api/1.0/projects/P/repos/r/pull-requests/1/participants/status'))
+        self.assertEqual('api/1.0/projects/{key}/repos/{slug}/pull-requests/{id}/participants/{user}',
+                         endpoint_template('/api/1.0/projects/P/repos/r/pull-requests/1/participants/jdoe'))
+
+
+class TestMetrics(TestCase):
+    def test_events_are_aggregated_per_endpoint(self):
+        metrics = MetricsAggregator()
+        events = []
+        client = StashClient("http://example.com/stash", metrics=[metrics, events.append])
+        with patch('requests.Session.request', side_effect=[response(200, b'{"id": 1}'), response(404)]):
+            client.get('/api/1.0/projects/A/repos/r/pull-requests/1')
+            client.get('/api/1.0/projects/B/repos/s/pull-requests/2')
+
+        self.assertEqual([200, 404], [e.status for e in events])
+        self.assertEqual(9, events[0].response_bytes)
+        self.assertIsNone(events[0].connect)
+        rows = metrics.summary()
+        self.assertEqual({'200', '404'}, set(row['status'] for row in rows))
+        self.assertTrue(all(row['endpoint'] == 'api/1.0/projects/{key}/repos/{slug}/pull-requests/{id}'
+                            for row in rows))
+
+        text = metrics.prometheus()
+        self.assertIn('# TYPE stashy_request_duration_seconds histogram', text)
+        self.assertIn('stashy_request_duration_seconds_count{method="GET",'
+                      'endpoint="api/1.0/projects/{key}/repos/{slug}/pull-requests/{id}",status="404"} 1', text)
+
+    def test_failed_requests_are_reported(self):
+        events = []
+        client = StashClient("http://example.com/stash", metrics=events.append)
+        with patch('requests.Session.request', side_effect=IOError('unreachable')):
+            self.assertRaises(IOError, client.get, '/api/1.0/projects')
+        self.assertIsNone(events[0].status)
+        self.assertIsInstance(events[0].error, IOError)
@@ -1,4 +1,3 @@
-import json
 import os
 from unittest import TestCase
 try:
@@ -8,6 +7,7 @@ except ImportError:
 from requests.models import Response
 from mock import patch
 
+import stashy
 from stashy.client import StashClient
 from stashy.pullrequests import PullRequest
 
@@ -24,7 +24,8 @@ def fake_urlopen(stash_client, url):
     # Must return Response
     resp = Response()
     resp.status_code = 200
-    resp.json = lambda: json.loads(open(resource_file, mode='rb').read().decode('utf-8'))
+    with open(resource_file, mode='rb') as f:
+        resp._content = f.read()
     return resp
 
 
@@ -43,3 +44,59 @@ class TestPullRequest(TestCase):
         vetoes = pr.merge_info()
 
         assert len(vetoes['vetoes']) == 1
+
+
+def file_diff(path):
+    info = {'components': path.split('/'), 'name': path.split('/')[-1], 'toString': path}
+    return {'source': info, 'destination': info, 'hunks': [], 'truncated': False}
+
+
+class TestLazyPullRequestDiff(TestCase):
+    PR = '/rest/api/1.0/projects/PRJ/repos/repo/pull-requests/1'
+
+    def setUp(self):
+        from stashy.cassette import Cassette
+        self.cassette = Cassette()
+        self.stash = stashy.connect("http://example.com/stash", cassette=self.cassette)
+        self.pull_request = self.stash.projects['PRJ'].repos['repo'].pull_requests[1]
+
+    def test_streams_files_with_parameters(self):
+        self.cassette.add('GET', self.PR + '/diff', {
+            'fromHash': 'a', 'toHash': 'b', 'contextLines': 3, 'whitespace': 'IGNORE_ALL',
+            'diffs': [file_diff('a.py'), file_diff('b.py')]},
+            params={'contextLines': 3, 'whitespace': 'ignore-all'})
+        diff = self.pull_request.lazy_diff(contextLines=3, whitespace='ignore-all')
+
+        self.assertEqual(['a.py', 'b.py'], [d.destination.toString for d in diff])
+
+    def test_stats_of_the_streamed_diff(self):
+        hunk = {'segments': [{'type': 'ADDED', 'lines': [{'source': 1, 'destination': 1, 'line': 'x'}] * 3}]}
+        self.cassette.add('GET', self.PR + '/diff', {'diffs': [dict(file_diff('a.py'), hunks=[hunk])] * 2},
+                          params={'contextLines': 0})
+
+        stats = self.pull_request.diff_stats(contextLines=0)
+        self.assertEqual((2, 6), (len(stats.files), stats.added))
+
+    def test_file_diffs_a_single_path(self):
+        self.cassette.add('GET', self.PR + '/diff/src/new%20name.py', {'diffs': [file_diff('src/new name.py')]},
+                          params={'srcPath': 'src/old.py'})
+        self.cassette.add('GET', self.PR + '/diff/same.py', {'diffs': []})
+        diff = self.pull_request.lazy_diff()
+
+        self.assertEqual('src/new name.py', diff.file('src/new name.py', srcPath='src/old.py').destination.toString)
+        self.assertIsNone(diff.file('same.py'))
+
+    def test_files_diffs_selected_changes_in_order(self):
+        paths = ['f%d.py' % i for i in range(10)]
+        self.cassette.add('GET', self.PR + '/changes', {
+            'values': [{'path': {'toString': p}, 'type': 'MODIFY'} for p in paths[:-1]] +
+                      [{'path': {'toString': paths[-1]}, 'srcPath': {'toString': 'old.py'}, 'type': 'MOVE'}],
+            'isLastPage': True, 'start': 0, 'size': 10})
+        for path in paths[:-1]:
+            self.cassette.add('GET', self.PR + '/diff/' + path, {'diffs': [file_diff(path)]})
+        self.cassette.add('GET', self.PR + '/diff/f9.py', {'diffs': [file_diff('f9.py')]},
+                          params={'srcPath': 'old.py'})
+        diff = self.pull_request.lazy_diff()
+
+        selected = [change for change in diff.changes() if change['path']['toString'] != 'f0.py']
+        self.assertEqual(paths[1:], [d.destination.toString for d in diff.files(selected, workers=3)])
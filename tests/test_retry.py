@@ -0,0 +1,41 @@
+from unittest import TestCase
+from mock import patch
+
+from stashy.client import StashClient
+from stashy.retry import RateLimiter, RetryPolicy
+
+from .fakes import response
+
+
+class TestRetryPolicy(TestCase):
+    def test_retries_idempotent_methods_only(self):
+        policy = RetryPolicy()
+        self.assertTrue(policy.should_retry('GET', 0, response=response(503)))
+        self.assertFalse(policy.should_retry('POST', 0, response=response(503)))
+        self.assertTrue(policy.should_retry('POST', 0, response=response(429)))
+        self.assertFalse(policy.should_retry('GET', 3, response=response(503)))
+        self.assertFalse(policy.should_retry('GET', 0, response=response(500)))
+
+    def test_delay_respects_retry_after(self):
+        policy = RetryPolicy()
+        self.assertEqual(7, policy.delay(0, response(429, headers={'Retry-After': '7'})))
+        self.assertTrue(0 <= policy.delay(2, response(503)) <= 2.0)
+
+
+class TestRateLimiter(TestCase):
+    def test_waits_once_bucket_is_empty(self):
+        limiter = RateLimiter()
+        self.assertEqual(0, limiter.reserve())
+        limiter.update({'X-RateLimit-Limit': '10', 'X-RateLimit-Remaining': '1',
+                        'X-RateLimit-Interval-Seconds': '1', 'X-RateLimit-Fill-Rate': '2'})
+        self.assertEqual(0, limiter.reserve())
+        self.assertAlmostEqual(0.5, limiter.reserve(), places=2)
+
+
+class TestClientRetry(TestCase):
+    def test_get_is_retried(self):
+        client = StashClient("http://example.com/stash", retry=RetryPolicy(backoff=0))
+        responses = [response(503), response(200)]
+        with patch('requests.Session.request', side_effect=lambda *a, **kw: responses.pop(0)) as request:
+            self.assertEqual(200, client.get('api/1.0/projects').status_code)
+        self.assertEqual(2, request.call_count)
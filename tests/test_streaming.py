@@ -0,0 +1,60 @@
+import json
+from unittest import TestCase
+
+from stashy.streaming import StreamingPage
+
+
+def chunked(document, size):
+    raw = json.dumps(document).encode('utf-8')
+    return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+
+class TestStreamingPage(TestCase):
+    page = {'size': 3, 'limit': 3, 'values': [{'path': 'a "quoted" \\ name'}, [1, [2]], None],
+            'isLastPage': False, 'nextPageStart': 3}
+
+    def test_items_then_fields(self):
+        for size in (1, 2, 7, 1000):
+            page = StreamingPage(chunked(self.page, size))
+            self.assertTrue('values' in page)
+            self.assertEqual(self.page['values'], list(page['values']))
+            self.assertEqual(False, page['isLastPage'])
+            self.assertEqual(3, page['nextPageStart'])
+
+    def test_brackets_and_escapes_within_strings(self):
+        page = {'values': [{'line': 'x = {"a": [1]}  # \\" ]}', 'é': ['[', '}']}, {'hunks': [[{}], []]}],
+                'isLastPage': True}
+        for size in range(1, 8):
+            self.assertEqual(page['values'], list(StreamingPage(chunked(page, size))['values']))
+
+    def test_long_strings_across_chunks(self):
+        page = {'values': [{'line': 'x' * 400000 + '\\"'}, 'y' * 400000], 'isLastPage': True}
+        self.assertEqual(page['values'], list(StreamingPage(chunked(page, 1024))['values']))
+
+    def test_values_are_yielded_before_the_body_is_complete(self):
+        page = {'values': [{'line': 'x' * 100000}, {'line': 'y' * 100000}], 'isLastPage': True}
+        raw = json.dumps(page).encode('utf-8')
+        received = len('{"values": [') + len(json.dumps(page['values'][0])) + 5000
+
+        def body():
+            for i in range(0, received, 1000):
+                yield raw[i:min(i + 1000, received)]
+            # the rest of the body has not arrived
+            raise AssertionError('read %d bytes, past the first value' % received)
+
+        self.assertEqual(page['values'][0], next(StreamingPage(body())['values']))
+
+    def test_fields_before_items_buffers_them(self):
+        page = StreamingPage(chunked(self.page, 5))
+        self.assertEqual(3, page['nextPageStart'])
+        self.assertEqual(self.page['values'], list(page['values']))
+
+    def test_items_are_decoded_lazily(self):
+        chunks = iter(chunked(self.page, 4))
+        page = StreamingPage(chunks)
+        self.assertEqual(self.page['values'][0], next(page['values']))
+        self.assertTrue(len(list(chunks)) > 0)
+
+    def test_missing_values_key(self):
+        page = StreamingPage(chunked({'errors': [{'message': 'nope'}]}, 3), values_key='lines')
+        self.assertFalse('lines' in page)
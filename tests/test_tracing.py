@@ -0,0 +1,50 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+from mock import patch
+
+from stashy.client import StashClient
+from stashy.repos import Repository
+from stashy.tracing import Tracer
+
+from .fakes import response
+from .test_helpers import Listing, fake_pages
+
+
+class TestTracing(TestCase):
+    def setUp(self):
+        self.tracer = Tracer()
+        self.client = StashClient("http://example.com/stash", tracer=self.tracer)
+
+    def spans(self, name):
+        return [span for span in self.tracer.spans if span.name == name]
+
+    def test_walk_has_a_span_per_page(self):
+        get, requested = fake_pages(60)
+        with patch('stashy.client.StashClient.get', get):
+            with self.tracer.span('job') as job:
+                Listing('projects', self.client, None).list()
+
+        walk, = self.spans('paginate api/1.0/projects')
+        self.assertEqual(job.id, walk.parent_id)
+        self.assertEqual('api/1.0/projects', walk.attrs['path'])
+        pages = self.spans('page')
+        self.assertEqual([25, 25, 10], [page.attrs['size'] for page in pages])
+        self.assertTrue(all(page.parent_id == walk.id for page in pages))
+
+    def test_resource_call_is_parent_of_its_request(self):
+        with patch('requests.Session.request', return_value=response(content=b'{"slug": "r"}')):
+            Repository('r', 'projects/P/repos/r', self.client, None).get()
+
+        call, = self.spans('Repository.get')
+        request, = self.spans('GET api/1.0/projects/{key}/repos/{slug}')
+        self.assertEqual(call.id, request.parent_id)
+        self.assertEqual(200, request.attrs['status'])
+
+        path = os.path.join(tempfile.mkdtemp(), 'trace.json')
+        self.tracer.export(path)
+        with open(path) as f:
+            events = json.load(f)['traceEvents']
+        self.assertEqual(['Repository.get', 'GET api/1.0/projects/{key}/repos/{slug}'], [e['name'] for e in events])
+        self.assertEqual('X', events[0]['ph'])